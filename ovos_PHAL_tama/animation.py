@@ -0,0 +1,118 @@
+"""
+Host side eye animations.
+
+The head firmware only shows a static colour per eye and opens or closes
+the eyelids, so effects such as blink, spin, fill and brightness fades are
+rendered here as sequences of ``C`` (and ``T``) frames that the writer
+streams from its ``Timeline``.
+
+Brightness ramps are sampled from a precomputed ease-in-out table and the
+frames of each effect are cached per colour, so replaying a common effect
+encodes nothing. The frame rate is capped so animations use at most
+``LINK_SHARE`` of the serial link, leaving the rest to commands and head
+trajectories.
+"""
+import math
+from functools import lru_cache
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.trajectory import max_rate
+
+LINK_SHARE = 0.25
+
+RAMP_STEPS = 256
+# half cosine ease from 0 to 1
+EASE = tuple((1 - math.cos(math.pi * i / (RAMP_STEPS - 1))) / 2
+             for i in range(RAMP_STEPS))
+
+BLINK_TIME = 0.3
+FADE_TIME = 0.2
+SPIN_PERIOD = 1.0
+NARROW_LEVEL = 0.4
+
+
+def ramp(start, end, count):
+    """``count`` levels easing from ``start`` to ``end``, both included."""
+    if count <= 1:
+        return (end,)
+    step = (RAMP_STEPS - 1) / (count - 1)
+    return tuple(start + (end - start) * EASE[round(i * step)]
+                 for i in range(count))
+
+
+def scale(rgb, level):
+    """``rgb`` dimmed to ``level`` (0 to 1)."""
+    return tuple(int(c * level) for c in rgb)
+
+
+@lru_cache(maxsize=128)
+def render(left, right, levels):
+    """Colour frames for a tuple of (left level, right level) pairs."""
+    return tuple(codec.colour(scale(left, l), scale(right, r))
+                 for l, r in levels)
+
+
+class EyeAnimator:
+    """
+    Renders eye effects into ``(delay, frame)`` keyframes.
+
+    ``left`` and ``right`` are the (r, g, b) colours of the eyes at full
+    brightness and ``alphas`` their current (left, right) brightness.
+
+    Args:
+        fps (float): animation frame rate
+        baudrate (int): serial link speed, caps ``fps`` when given
+    """
+
+    def __init__(self, fps=30.0, baudrate=None):
+        if baudrate:
+            fps = min(fps, max_rate(baudrate, share=LINK_SHARE))
+        self.fps = fps
+        self.period = 1.0 / fps
+
+    @classmethod
+    def from_config(cls, config, baudrate=None):
+        return cls(config.get("fps", 30.0), baudrate)
+
+    def _count(self, duration):
+        return max(1, round(duration * self.fps))
+
+    def _keyframes(self, frames, first=0.0):
+        return [(first if i == 0 else self.period, frame)
+                for i, frame in enumerate(frames)]
+
+    def fade(self, left, right, start, end, duration=FADE_TIME):
+        """Fade the eyes from the ``start`` to the ``end`` alphas."""
+        n = self._count(duration)
+        levels = tuple(zip(ramp(start[0], end[0], n), ramp(start[1], end[1], n)))
+        return self._keyframes(render(tuple(left), tuple(right), levels))
+
+    def blink(self, left, right, alphas, side='b', lids_open=False):
+        """Blink with the eyelids, or by dimming the eyes when the lids are
+        closed or only one eye (side "l" or "r") blinks."""
+        if side == 'b' and lids_open:
+            return [(0, codec.CLOSE_FRAME), (BLINK_TIME, codec.OPEN_FRAME)]
+        closed = (0 if side in ('b', 'l') else alphas[0],
+                  0 if side in ('b', 'r') else alphas[1])
+        down = self.fade(left, right, alphas, closed, BLINK_TIME / 2)
+        up = self.fade(left, right, closed, alphas, BLINK_TIME / 2)
+        return down + [(self.period, frame) for _, frame in up]
+
+    def spin(self, left, right, alphas):
+        """One spin cycle, the light circling from one eye to the other.
+
+        Every keyframe, the first included, comes one period after the
+        previous one so cycles can be played back to back.
+        """
+        n = self._count(SPIN_PERIOD)
+        levels = tuple((alphas[0] * (1 + math.cos(2 * math.pi * i / n)) / 2,
+                        alphas[1] * (1 - math.cos(2 * math.pi * i / n)) / 2)
+                       for i in range(n))
+        return self._keyframes(render(tuple(left), tuple(right), levels),
+                               self.period)
+
+    def fill(self, left, right, alphas, fraction):
+        """Frame lighting ``fraction`` of the eyes, left eye first."""
+        return render(tuple(left), tuple(right),
+                      ((alphas[0] * min(1.0, 2 * fraction),
+                        alphas[1] * max(0.0, 2 * fraction - 1)),))[0]
@@ -13,19 +13,60 @@
 # limitations under the License.
 
 
+import math
 import time
-from queue import Queue
-from threading import Thread
-import sys
-import io
+from functools import partial
+from queue import Empty
+from threading import Thread, Timer
 
 
 from ovos_bus_client.client import MessageBusClient
 from ovos_bus_client import Message
 from ovos_utils.log import LOG
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.animation import NARROW_LEVEL, EyeAnimator, scale
+from ovos_PHAL_tama.capture import CommandCapture
+from ovos_PHAL_tama.choreography import load_choreographies, moves_head
+from ovos_PHAL_tama.commandqueue import CommandQueue, DEFAULT_LEVELS
+from ovos_PHAL_tama.commands import Blink, Brightness, Command, EyePreset, \
+    Eyelids, Fill, Gesture, Home, MoveHead, Narrow, Nudge, Request, \
+    SetColor, SetPixel, Spin, Squint, Stop, parse
+from ovos_PHAL_tama.flow import CreditWindow
+from ovos_PHAL_tama.framing import LineFramer
+from ovos_PHAL_tama.recorder import FlightRecorder
+from ovos_PHAL_tama.shadow import DeviceShadow
+from ovos_PHAL_tama.snapshot import load_state, save_state
+from ovos_PHAL_tama.supervisor import SerialSupervisor
+from ovos_PHAL_tama.timeline import Timeline
+from ovos_PHAL_tama.trajectory import TrajectoryPlanner
 #from ovos_utils.signal import check_for_signal
 
-sys.stdout = io.StringIO()
+# Head gestures preempt each other; HOME and look targets wait for them
+GESTURE_PRIORITY = 1
+
+_EYE_COLOUR = ('eyes', 'eyes', 'eyes')
+_EYE_EFFECT = ('eyes', 'eyes', None)
+_GESTURE = ('eyes', 'head', None)
+
+# Queue routing by opcode: (priority level, device channel, coalescing key).
+# Choreographies (NOD, TALK, ...) are routed by what they move, see
+# ``EnclosureWriter._build_handlers``.
+# Commands with a key only set a target state, so only the newest one of
+# each key stays queued. HOME has a key of its own: a look target must
+# never coalesce away a pending safety command.
+ROUTES = dict(
+    {name: _EYE_COLOUR for name in codec.PRESET_FRAMES},
+    COL=_EYE_COLOUR, SQUINT=_EYE_EFFECT, PIXEL=_EYE_EFFECT,
+    BLINK=_EYE_EFFECT, NARROW=_EYE_EFFECT, SPIN=_EYE_EFFECT,
+    FILL=('eyes', 'eyes', 'fill'), LEVEL=('eyes', 'eyes', 'level'),
+    OPEN=('safety', 'lids', None), CLOSE=('safety', 'lids', None),
+    STOP=('safety', 'head', None), HOME=('safety', 'head', 'home'),
+    AVL=_GESTURE, AVR=_GESTURE,
+    MOVE=('look', 'head', 'head'), NUDGE=('look', 'head', None))
+DEFAULT_ROUTE = ('eyes', None, None)
+
+# Seconds a command may wait in the queue before it is stale, by opcode
+DEADLINES = {'MOVE': 1.0}
 
 
 class EnclosureWriter(Thread):
@@ -41,39 +82,134 @@ class EnclosureWriter(Thread):
         # . ``EnclosureWriter`` removes the next command from the queue
         # . ``EnclosureWriter`` writes the command to Serial port
 
-    Note: A command has to end with a line break
+    Commands are typed objects from ``ovos_PHAL_tama.commands``. Each one is
+    looked up by its type in a handler table built once at construction,
+    encoded into a single binary frame by ``ovos_PHAL_tama.codec`` and sent
+    with one ``serial.write()`` call. New commands are added with
+    ``register_handler``.
+
+    Gestures are scheduled as keyframes on a ``Timeline`` rather than
+    slept through, so eye and eyelid commands interleave with a running
+    gesture; STOP cancels it while HOME and look targets wait until it
+    finishes. Apart from the aversions, gestures and expressions are
+    choreographies compiled at start up from ``choreography.json`` and the
+    optional ``choreography`` config file, queued like the aversions when
+    they move the head and like an eye colour otherwise. Look targets are
+    not jumped to but followed by a ``TrajectoryPlanner`` within the
+    ``trajectory`` config limits. Eye effects (blink, narrow, spin, fill,
+    brightness) are rendered by an ``EyeAnimator`` and streamed the same
+    way at the ``animation`` frame rate; any new eye command cancels the
+    running effect.
+
+    Commands that are ready together (``EnclosureEyes.close``, ``reset``,
+    bursts) are batched: once a second command is ready the writer keeps
+    collecting for up to ``batch_window`` seconds and writes all their
+    frames with one ``serial.write()`` and one ``flush()``.
+
+    ``write`` never blocks. Commands are routed (see ``ROUTES``) to the
+    "safety", "eyes" or "look" level of a ``CommandQueue``, each with its
+    own size and overflow policy (``levels`` config). Only the newest
+    pending head target and eye colour are kept queued and look targets
+    older than their deadline are dropped. The counters are available on
+    ``enclosure.writer.stats.get``.
+
+    Every frame is checked against a ``DeviceShadow`` of the head first
+    and frames that would not change its state are not written. The shadow
+    answers ``enclosure.head.pose.get``; its suppressed-write counters are
+    part of the writer stats.
+
+    With a ``snapshot`` ``path`` the device state (pose, eye colours and
+    brightness, eyelids, aversion) is saved to that file after writes, at
+    most once per ``interval`` seconds, and when the writer stops. With
+    ``restore`` set as well, a writer started with an existing snapshot
+    restores it, so after a restart only the frames that change the head
+    are sent. The restored shadow is trusted as is, so this is only safe
+    when the head keeps its power across restarts of the service.
+
+    When ``serial`` is a ``SerialSupervisor`` the writer leaves commands
+    queued while the link is down and, once it is back, first replays the
+    frames restoring the last known eyes, eyelids and head pose. The
+    outage counters are part of the writer stats.
+
+    Every frame sent is kept in a bounded ``FlightRecorder``, dumped on
+    ``enclosure.recorder.dump``. The commands queued can be captured to a
+    file (``capture`` config or ``enclosure.capture.start``) and replayed
+    later, see ``ovos_PHAL_tama.capture``.
+
+    With the ``flow`` config the head acknowledges every frame and the
+    writer keeps at most ``window`` frames unacknowledged (``CreditWindow``),
+    pacing itself to the head. The ``EnclosureReader`` hands the ``ack:``
+    lines to ``flow``; round trip times are part of the writer stats.
     """
 
-    def __init__(self, serial, bus, size=16):
+    def __init__(self, serial, bus, config=None):
         super(EnclosureWriter, self).__init__(target=self.flush)
         self.alive = True
         self.daemon = True
         self.serial = serial
         self.bus = bus
-        self.commands = Queue(size)
-        self.val = 0
-        self.val0 = 0
-        self.val1 = 1
-        self.valx = 0
-        self.valy = 0
+        self.config = config or {}
+        levels = self.config.get("levels", {})
+        self.commands = CommandQueue([
+            (name, levels.get(name, {}).get("size", size),
+             levels.get(name, {}).get("policy", policy))
+            for name, size, policy in DEFAULT_LEVELS])
+        self.routes = dict(ROUTES)
+        self.deadlines = dict(DEADLINES, **self.config.get("deadlines", {}))
         self.current_pos=[0,20]
-        self.signs=[b'\x01', b'\x01']
         self.eye_alphas=[1.0,1.0]
         self.last_col = 'G'
         self.av = 'N'
-        
-        self.base_colours = {}
-        self.base_colours['R'] = [255,0,0]
-        self.base_colours['G'] = [0,255,0]
-        self.base_colours['B'] = [0,0,255]
-        self.base_colours['Y'] = [200,200,0]
-        self.base_colours['P'] = [200,0,200]
-        self.base_colours['C'] = [0,200,200]
-        self.base_colours['W'] = [200,200,200]
-        self.base_colours['N'] = [0,0,0]
-        self.current_col = self.base_colours[self.last_col]
-        
-        
+        self.current_col = list(codec.BASE_COLOURS[self.last_col])
+        self.eye_cols = [list(self.current_col), list(self.current_col)]
+        self.timeline = Timeline()
+        self.animator = EyeAnimator.from_config(
+            self.config.get("animation", {}), self.config.get("baudrate"))
+        trajectory = self.config.get("trajectory", {})
+        if trajectory is False:
+            self.planner = None
+        else:
+            self.planner = TrajectoryPlanner.from_config(
+                trajectory, self.config.get("baudrate"))
+            self.planner.reset(*self.current_pos)
+        self.shadow = DeviceShadow()
+        self.batch_window = self.config.get("batch_window", 0.002)
+        self.batch_max = self.config.get("batch_max", 16)
+        self.batch_stats = {"batches": 0, "frames": 0, "max_size": 0,
+                            "added_latency": 0.0, "max_added_latency": 0.0}
+        self._batch = []
+        self._batch_start = 0.0
+        flow = self.config.get("flow")
+        self.flow = CreditWindow.from_config(flow) if flow else None
+        self.recorder = FlightRecorder(self.config.get("recorder_size", 256))
+        # the service's HeadRpc and SerialBroker, for the stats
+        self.rpc = None
+        self.broker = None
+        self.capture = None
+        if self.config.get("capture"):
+            self.capture = CommandCapture(self.config["capture"])
+        self.supervised = isinstance(serial, SerialSupervisor)
+        self._generation = serial.generation if self.supervised else 0
+        self.handlers = self._build_handlers()
+        snapshot = self.config.get("snapshot") or {}
+        self.snapshot_path = snapshot.get("path")
+        self.snapshot_interval = snapshot.get("interval", 1.0)
+        self._saved = 0.0
+        self.restored = False
+        if self.snapshot_path and snapshot.get("restore", False):
+            state = load_state(self.snapshot_path)
+            if state:
+                try:
+                    self.restore(state)
+                except (KeyError, TypeError, ValueError) as e:
+                    LOG.warning(f"Ignoring malformed device state, cold "
+                                f"start: {e}")
+
+        self.bus.on('enclosure.writer.stats.get', self.handle_get_stats)
+        self.bus.on('enclosure.recorder.dump', self.handle_recorder_dump)
+        self.bus.on('enclosure.head.pose.get', self.handle_get_pose)
+        self.bus.on('enclosure.capture.start', self.handle_capture_start)
+        self.bus.on('enclosure.capture.stop', self.handle_capture_stop)
         self.start()
 
     def movement(self, x,y, point=False):
@@ -84,542 +220,618 @@ class EnclosureWriter(Thread):
             self.current_pos[0]=self.current_pos[0]+x
             self.current_pos[1]=self.current_pos[1]+y
 
-        if self.current_pos[0]<0:
-            self.signs[0]=b'\x01'
-        else:
-            self.signs[0]=b'\xFF'
+        LOG.info("Movement:" + str(self.current_pos[0]) +" "+ str(self.current_pos[1]) + " " + str(x) + " " +str(y))
 
-        if self.current_pos[1]>0:
-            self.signs[1]=b'\x01'
+    def step(self, x, y, point=False):
+        """Update the head position and return the frame moving it there."""
+        self.movement(x, y, point)
+        return codec.move(self.current_pos[0], self.current_pos[1])
+
+    def set_preset(self, name):
+        """Select a firmware colour preset and return its frame."""
+        frame = codec.preset(name)
+        self.last_col = codec.EYE_PRESETS[name].decode()
+        self.current_col = list(codec.BASE_COLOURS[self.last_col])
+        self.eye_cols = [list(self.current_col), list(self.current_col)]
+        return frame
+
+    def _build_handlers(self):
+        """Map every command type to the method that encodes it."""
+        # aversions depend on the previous one, the other gestures are
+        # data driven, see ``choreography``
+        self.gestures = {
+            'AVL': self._avl,
+            'AVR': self._avr
+        }
+        self.choreographies = load_choreographies(
+            self.config.get("choreography"))
+        for name, cues in self.choreographies.items():
+            if name not in self.gestures:
+                self.routes[name] = _GESTURE if moves_head(cues) \
+                    else _EYE_COLOUR
+        return {
+            EyePreset: self._preset,
+            Eyelids: self._eyelids,
+            Home: self._home,
+            Stop: self._stop,
+            Gesture: self._gesture,
+            SetColor: self._set_color,
+            Squint: self._squint,
+            MoveHead: self._move,
+            Nudge: self._nudge,
+            Blink: self._blink,
+            Narrow: self._narrow,
+            Spin: self._spin,
+            Fill: self._fill,
+            Brightness: self._brightness,
+            SetPixel: self._set_pixel,
+            Request: self._request
+        }
+
+    def register_handler(self, command_type, handler):
+        """Register ``handler(command)`` for commands of ``command_type``.
+
+        The handler returns the frame to write, or None if it has nothing
+        (more) to send.
+        """
+        self.handlers[command_type] = handler
+
+    def _preset(self, cmd):
+        self.timeline.cancel('eyes')
+        return self.set_preset(cmd.name)
+
+    def _eyelids(self, cmd):
+        self.timeline.cancel('lids')
+        return codec.lids(cmd.open)
+
+    def _stop(self, cmd):
+        self.timeline.cancel('head')
+        self.stop_trajectory()
+
+    def _home(self, cmd):
+        if self.timeline.defer('head', partial(self._later, self._home, cmd)):
+            return
+        self.stop_trajectory()
+        self.av = 'N'
+        self.current_pos[0]=0
+        self.current_pos[1]=20
+        return codec.HOME_FRAME
+
+    def stop_trajectory(self):
+        """Abandon the planned head motion, the head stays where it is."""
+        if self.planner:
+            self.timeline.cancel('trajectory')
+            self.planner.reset(*self.current_pos)
+
+    def _trajectory_tick(self):
+        setpoint = self.planner.update()
+        if setpoint:
+            self.current_pos[0], self.current_pos[1] = setpoint
+            self._send('MOVE', codec.move(*setpoint))
+        if self.planner.active:
+            self.timeline.play('trajectory', [(self.planner.period,
+                                               self._trajectory_tick)])
+
+    def gesture(self, opcode, keyframes):
+        """Play ``(delay, (dx, dy))`` head keyframes on the timeline."""
+        self.stop_trajectory()
+        self.timeline.play('head', [(delay, partial(self._keyframe, opcode, dx, dy))
+                                    for delay, (dx, dy) in keyframes],
+                           priority=GESTURE_PRIORITY)
+
+    def _keyframe(self, opcode, dx, dy):
+        self._send(opcode, self.step(dx, dy))
+
+    def _later(self, handler, cmd):
+        """Timeline action re-running a deferred handler."""
+        frame = handler(cmd)
+        if frame:
+            self._send(cmd.opcode, frame)
+
+    def _gesture(self, cmd):
+        if cmd.name in self.gestures:
+            self.gestures[cmd.name]()
+        elif cmd.name in self.choreographies:
+            self.choreograph(cmd.name)
         else:
-            self.signs[1]=b'\xFF'
+            LOG.warning("Unknown gesture: " + cmd.name)
+
+    def choreograph(self, name):
+        """Play a compiled choreography, as a head gesture if it moves the
+        head and as an eye effect otherwise."""
+        cues = self.choreographies[name]
+        keyframes = [(cue.delay, partial(self._cue, name, cue))
+                     for cue in cues]
+        if moves_head(cues):
+            self.stop_trajectory()
+            self.timeline.play('head', keyframes, priority=GESTURE_PRIORITY)
+        else:
+            self.timeline.play('eyes', keyframes)
+
+    def _cue(self, opcode, cue):
+        if cue.eyes:
+            self.eye_cols = [list(rgb) for rgb in cue.colours]
+            if cue.preset:
+                self.last_col = cue.preset
+                self.current_col = list(cue.colours[0])
+            self._send(opcode, cue.eyes)
+        if cue.lids:
+            self._send(opcode, cue.lids)
+        if cue.head:
+            self._send(opcode, self.step(*cue.head))
+
+    def _avl(self):
+        if(self.av == 'N'):
+            self.gesture('AVL', [(0, (30, 30))])
+            self.av = 'L'
+        elif(self.av == 'R'):
+            #then should reverse the R and do L 
+            self.gesture('AVL', [(0, (30, -30)), (0, (30, 30))])
+            self.av = 'L'
+
+    def _avr(self):
+        LOG.info("AVR current av = "+self.av)
+        if(self.av == 'N'):
+            self.gesture('AVR', [(0, (-30, 30))])
+            self.av = 'R'
+        elif(self.av == 'L'):
+            #then should reverse the L and do R
+            self.gesture('AVR', [(0, (-30, -30)), (0, (-30, 30))])
+            self.av = 'R'
+
+    def _set_color(self, cmd):
+        self.timeline.cancel('eyes')
+        self.current_col = [cmd.r, cmd.g, cmd.b]
+        self.eye_cols = [list(self.current_col), list(self.current_col)]
+        return codec.colour(self.current_col)
+
+    def _squint(self, cmd):
+        self.timeline.cancel('eyes')
+        if cmd.eye=='L':
+            LOG.info("L has been selected")
+            self.eye_alphas[0]=cmd.level/100
+        else:
+            LOG.info("R has been selected")
+            self.eye_alphas[1]=cmd.level/100
+        return self.eye_frame()
+
+    def eye_frame(self):
+        """Frame showing the eye colours at their current brightness."""
+        return codec.colour(scale(self.eye_cols[0], self.eye_alphas[0]),
+                            scale(self.eye_cols[1], self.eye_alphas[1]))
+
+    def animate(self, opcode, keyframes, channel='eyes', until=None):
+        """Stream ``(delay, frame)`` keyframes from the timeline.
+
+        Frames that are already a period late when they come due are
+        skipped rather than sent in a burst, the last frame always goes
+        out. With ``until`` (a timeline clock time) the keyframes loop
+        until then, and the eyes then return to their steady colour.
+        """
+        due = self.timeline.clock()
+        last = len(keyframes) - 1
+        actions = []
+        loop = partial(self._loop, opcode, keyframes, channel, until)
+        for i, (delay, frame) in enumerate(keyframes):
+            if until is not None and due + delay > until:
+                actions.append((until - due, loop))
+                break
+            due += delay
+            stale = None if i == last else due + self.animator.period
+            actions.append((delay, partial(self._frame, opcode, frame, stale)))
+        else:
+            if until is not None:
+                actions.append((0, loop))
+        self.timeline.play(channel, actions)
 
-        LOG.info("Movement:" + str(self.current_pos[0]) +" "+ str(self.current_pos[1]) + " " + str(x) + " " +str(y))
-        LOG.info("sign x/y:" + str(self.signs[0]) +" " + str(self.signs[1]))
-    
-    def hsv2rgb(h,s,v):
-        return tuple(round(i * 255) for i in colorsys.hsv_to_rgb(h,s,v))
+    def _frame(self, opcode, frame, stale=None):
+        if stale is None or self.timeline.clock() <= stale:
+            self._send(opcode, frame)
+
+    def _loop(self, opcode, keyframes, channel, until):
+        if self.timeline.clock() < until:
+            self.animate(opcode, keyframes, channel, until)
+        else:
+            self._send(opcode, self.eye_frame())
+
+    def _blink(self, cmd):
+        lids_open = bool(self.shadow.lids)
+        channel = 'lids' if cmd.side == 'b' and lids_open else 'eyes'
+        self.timeline.cancel(channel)
+        self.animate(cmd.opcode, self.animator.blink(
+            self.eye_cols[0], self.eye_cols[1], tuple(self.eye_alphas),
+            cmd.side, lids_open), channel)
+
+    def _fade_to(self, opcode, alphas):
+        self.timeline.cancel('eyes')
+        start = tuple(self.eye_alphas)
+        self.eye_alphas = list(alphas)
+        self.animate(opcode, self.animator.fade(
+            self.eye_cols[0], self.eye_cols[1], start, alphas))
+
+    def _narrow(self, cmd):
+        self._fade_to(cmd.opcode, tuple(min(a, NARROW_LEVEL)
+                                        for a in self.eye_alphas))
+
+    def _brightness(self, cmd):
+        self._fade_to(cmd.opcode, (cmd.level / 30, cmd.level / 30))
+
+    def _spin(self, cmd):
+        self.timeline.cancel('eyes')
+        until = math.inf
+        if cmd.length is not None:
+            until = self.timeline.clock() + cmd.length / 1000
+        self.animate(cmd.opcode, self.animator.spin(
+            self.eye_cols[0], self.eye_cols[1], tuple(self.eye_alphas)),
+            until=until)
+
+    def _fill(self, cmd):
+        self.timeline.cancel('eyes')
+        return self.animator.fill(self.eye_cols[0], self.eye_cols[1],
+                                  tuple(self.eye_alphas), cmd.percentage / 100)
+
+    def _set_pixel(self, cmd):
+        self.timeline.cancel('eyes')
+        self.eye_cols[min(max(cmd.idx, 0), 1)] = [cmd.r, cmd.g, cmd.b]
+        return self.eye_frame()
+
+    def _request(self, cmd):
+        return codec.request(cmd.id, cmd.method)
+
+    def _move(self, cmd):
+        # look targets wait for a running gesture instead of fighting it
+        if self.timeline.defer('head', partial(self._later, self._move, cmd)):
+            return
+        self.av = 'N' #Should cancel any aversion I guess
+        LOG.info(f'Moving to {cmd.x} {cmd.y}')
+        if not self.planner:
+            return self.step(cmd.x, cmd.y, True)
+        self.planner.set_target(cmd.x, cmd.y)
+        if not self.timeline.busy('trajectory'):
+            self.timeline.play('trajectory', [(0, self._trajectory_tick)])
+
+    def _nudge(self, cmd):
+        if self.timeline.defer('head', partial(self._later, self._nudge, cmd)):
+            return
+        self.stop_trajectory()
+        frame = self.step(cmd.dx, cmd.dy)
+        LOG.info("Current position " + str(self.current_pos))
+        return frame
+
+    def _send(self, opcode, frame, wait=0.0):
+        """Add a frame to the batch written at the end of the flush cycle."""
+        if not self.shadow.update(frame):
+            return
+        if not self._batch:
+            self._batch_start = self.commands.clock()
+        self._batch.append((opcode, frame, wait))
+
+    def _write(self, buf, frames):
+        if not buf:
+            return
+        self.serial.write(buf)
+        now = time.time()
+        for opcode, frame, wait in frames:
+            self.recorder.record(opcode, frame, wait, now)
+
+    def _write_batch(self):
+        """Write the pending frames with a single ``serial.write()``.
+
+        With flow control the batch is split wherever the credit window is
+        full, so the head never has more than ``window`` frames to absorb.
+        Text lines take no credit, the head does not acknowledge them.
+        """
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        buf = bytearray()
+        frames = []
+        for opcode, frame, wait in batch:
+            # text lines (RPC requests) are never acknowledged
+            paced = self.flow and frame[0] in codec.FRAME_SIZES
+            if paced and not self.flow.available():
+                self._write(buf, frames)
+                buf, frames = bytearray(), []
+                self.flow.acquire()
+            buf += frame
+            frames.append((opcode, frame, wait))
+            if paced:
+                self.flow.sent(opcode, frame)
+        self._write(buf, frames)
+        if hasattr(self.serial, "flush"):
+            self.serial.flush()
+        self._snapshot_changed()
+        added = self.commands.clock() - self._batch_start
+        stats = self.batch_stats
+        stats["batches"] += 1
+        stats["frames"] += len(batch)
+        stats["max_size"] = max(stats["max_size"], len(batch))
+        stats["added_latency"] += added
+        stats["max_added_latency"] = max(stats["max_added_latency"], added)
+
+    def _dispatch(self, entry):
+        cmd = entry.command
+        handler = self.handlers.get(type(cmd))
+        if handler is None:
+            LOG.debug("No handler for command: " + repr(cmd))
+            return
+        frame = handler(cmd)
+        if frame:
+            self._send(cmd.opcode, frame,
+                       self.commands.clock() - entry.enqueued)
+
+    def _drain(self, timeout):
+        """Dispatch the next command and every command that follows it
+        within the batch window.
+
+        A lone command is dispatched without waiting; once a second one is
+        ready the writer keeps collecting for up to ``batch_window``
+        seconds, or ``batch_max`` frames.
+
+        Returns:
+            int: number of commands taken from the queue
+        """
+        try:
+            entry = self.commands.get(timeout=timeout)
+        except Empty:
+            return 0
+        taken = 0
+        start = self.commands.clock()
+        deadline = start
+        while True:
+            taken += 1
+            try:
+                self._dispatch(entry)
+                # keyframes due now (a gesture's first) keep their place
+                # between the commands
+                for action in self.timeline.pop_due():
+                    action()
+            except Exception as e:
+                LOG.error("Writing error: {0}".format(e))
+            if len(self._batch) >= self.batch_max:
+                return taken
+            try:
+                entry = self.commands.get(
+                    timeout=max(0, deadline - self.commands.clock()))
+            except Empty:
+                return taken
+            deadline = start + self.batch_window
+
+    def _link_ready(self):
+        """False while a supervised link is down, replays the device state
+        once it is back."""
+        if not self.supervised:
+            return True
+        if not self.serial.wait_connected(0.5):
+            return False
+        if self.serial.generation != self._generation:
+            self._generation = self.serial.generation
+            self._replay()
+        return True
+
+    def _replay(self):
+        """Restore the last known state on a head that reconnected."""
+        frames = self.shadow.frames()
+        LOG.info(f"Replaying {len(frames)} frames to the reconnected head")
+        self.shadow.invalidate()
+        for frame in frames:
+            self._send('REPLAY', frame)
 
     def flush(self):
         while self.alive:
+            if not self._link_ready():
+                continue
+            taken = 0
             try:
-                cmd = self.commands.get() + '\n'
-                #self.serial.write(cmd.encode())
-                line = cmd
-                print (line)
-                sys.stdout.flush()
-                if line=='GREEN\n':
-                    #self.values = bytearray(['E','G', 1, 0])
-                    self.serial.write('E'.encode())
-                    self.serial.write('G'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.last_col='G'
-                    self.current_col = self.base_colours[self.last_col]
-                if line=='YELLOW\n':
-                    #self.values = bytearray(['E','Y', 1, 0])
-                    self.serial.write('E'.encode())
-                    self.serial.write('Y'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.last_col='Y'
-                    self.current_col = self.base_colours[self.last_col]
-                if line=='RED\n':
-                    #self.values = bytearray(['E','R', 1, 0])
-                    self.serial.write('E'.encode())
-                    self.serial.write('R'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.last_col='R'
-                    self.current_col = self.base_colours[self.last_col]
-                if line=='BLUE\n':
-                    #self.values = bytearray(['E','B', 1, 0])
-                    self.serial.write('E'.encode())
-                    self.serial.write('B'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.last_col='B'
-                    self.current_col = self.base_colours[self.last_col]
-                if line=='CIAN\n':
-                    #self.values = bytearray(['E','C', 1, 0])
-                    self.serial.write('E'.encode())
-                    self.serial.write('C'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.last_col='C'
-                    self.current_col = self.base_colours[self.last_col]
-                if line=='PINK\n':
-                    #self.values = bytearray(['E','P', 1, 0])
-                    self.serial.write('E'.encode())
-                    self.serial.write('P'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.last_col='P'
-                    self.current_col = self.base_colours[self.last_col]
-                if line=='WHITE\n':
-                    #self.values = bytearray(['E','W', 1, 0])
-                    self.serial.write('E'.encode())
-                    self.serial.write('W'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.last_col='W'
-                    self.current_col = self.base_colours[self.last_col]
-                if line=='NONE\n':
-                    #self.values = bytearray(['E','N', 1, 0])
-                    self.serial.write('E'.encode())
-                    self.serial.write('N'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                    self.last_col='N'
-                    self.current_col = self.base_colours[self.last_col]
-                if line=='OPEN\n':
-                    #self.values = bytearray(['T',1])
-                    self.serial.write('T'.encode())
-                    self.val=1
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                if line=='CLOSE\n':
-                    #self.values = bytearray(['T',0])
-                    self.serial.write('T'.encode())
-                    self.val=0
-                    self.serial.write(self.val.to_bytes(1, 'little'))
-                if line=='HOME\n':
-                    #self.values = bytearray(['M',1,0,1,0,0,0])
-                    self.av = 'N'
-                    self.serial.write('M'.encode())
-                    self.val1=1
-                    self.val0=0
-                    self.current_pos[0]=0
-                    self.current_pos[1]=20
-                    self.signs[0]=b'\xFF'
-                    self.signs[1]=b'\x01'
-                    self.serial.write(self.val1.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val1.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                if line=='AVL\n':
-                    #self.values = bytearray(['M',1,0,1,0,0,0])
-                    if(self.av == 'N'):
-                        self.serial.write('M'.encode())
-                        self.val1=1
-                        self.val0=0
-                        self.movement(30,30)
-                        self.valx=abs(self.current_pos[0])
-                        self.valy=abs(self.current_pos[1])
-                        self.serial.write(self.signs[0])
-                        self.serial.write(self.valx.to_bytes(1, 'little'))
-                        self.serial.write(self.signs[1])
-                        self.serial.write(self.valy.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))
-                        self.av = 'L'
-                    elif(self.av == 'R'):
-                        #then should reverse the R and do L 
-                        self.serial.write('M'.encode())
-                        self.val1=1
-                        self.val0=0
-                        self.movement(30,-30)
-                        self.valx=abs(self.current_pos[0])
-                        self.valy=abs(self.current_pos[1])
-                        self.serial.write(self.signs[0])
-                        self.serial.write(self.valx.to_bytes(1, 'little'))
-                        self.serial.write(self.signs[1])
-                        self.serial.write(self.valy.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))  
-                        self.val1=1
-                        self.val0=0
-                        self.movement(30,30)
-                        self.valx=abs(self.current_pos[0])
-                        self.valy=abs(self.current_pos[1])
-                        self.serial.write(self.signs[0])
-                        self.serial.write(self.valx.to_bytes(1, 'little'))
-                        self.serial.write(self.signs[1])
-                        self.serial.write(self.valy.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))  
-                        self.av = 'L'
-                        
-                if line=='AVR\n':
-                    #self.values = bytearray(['M',1,0,1,0,0,0])
-                    LOG.info("AVR current av = "+self.av)
-                    if(self.av == 'N'):
-                        self.serial.write('M'.encode())
-                        self.val1=1
-                        self.val0=0
-                        self.movement(-30,30)
-                        self.valx=abs(self.current_pos[0])
-                        self.valy=abs(self.current_pos[1])
-                        self.serial.write(self.signs[0])
-                        self.serial.write(self.valx.to_bytes(1, 'little'))
-                        self.serial.write(self.signs[1])
-                        self.serial.write(self.valy.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))
-                        self.av = 'R'
-                    elif(self.av == 'L'):
-                        #then should reverse the L and do R
-                        self.serial.write('M'.encode())
-                        self.val1=1
-                        self.val0=0
-                        self.movement(-30,-30)
-                        self.valx=abs(self.current_pos[0])
-                        self.valy=abs(self.current_pos[1])
-                        self.serial.write(self.signs[0])
-                        self.serial.write(self.valx.to_bytes(1, 'little'))
-                        self.serial.write(self.signs[1])
-                        self.serial.write(self.valy.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))  
-                        self.val1=1
-                        self.val0=0
-                        self.movement(-30,30)
-                        self.valx=abs(self.current_pos[0])
-                        self.valy=abs(self.current_pos[1])
-                        self.serial.write(self.signs[0])
-                        self.serial.write(self.valx.to_bytes(1, 'little'))
-                        self.serial.write(self.signs[1])
-                        self.serial.write(self.valy.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))
-                        self.serial.write(self.val0.to_bytes(1, 'little'))  
-                        self.av = 'R'
-
-                if line=='SHAKE\n':
-                    #self.values = bytearray(['M',1,0,1,0,0,0])
-                    self.serial.write('M'.encode())
-                    self.val1=1
-                    self.val0=0
-                    self.movement(20,0)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    LOG.info("Shake:" +" "+ str(self.current_pos[0]) +" "+ str(self.current_pos[1]) +" "+ str(self.valx) +" "+ str(self.valy) +" "+ str(self.signs[0]) +" "+ str(self.signs[1]))
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    time.sleep(0.2)
-                    self.serial.write('M'.encode())
-                    self.movement(-40,0)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    time.sleep(0.2)
-                    self.serial.write('M'.encode())
-                    self.movement(40,0)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    time.sleep(0.2)
-                    self.serial.write('M'.encode())
-                    self.movement(-40,0)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    time.sleep(0.2)
-                    self.serial.write('M'.encode())
-                    self.movement(20,0)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                if line=='NOD\n':
-                    #self.values = bytearray(['M',1,0,1,0,0,0])
-                    self.serial.write('M'.encode())
-                    self.val1=1
-                    self.val0=0
-                    self.movement(0,30)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    time.sleep(0.3)
-                    self.serial.write('M'.encode())
-                    self.valx=1
-                    self.movement(0,-30)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    time.sleep(0.3)
-                    self.serial.write('M'.encode())
-                    self.valx=1
-                    self.movement(0,30)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    time.sleep(0.3)
-                    self.serial.write('M'.encode())
-                    self.movement(0,-30)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                if line.find('HSV') != -1:
-                    mylist = line.split(":")
-                    self.current_col = self.hsv2rgb((float)(mylist[1]), (float)(mylist[2]), (float)(mylist[3]))
-                    self.serial.write('C'.encode())
-                    self.serial.write(((int)(self.current_col[0])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[1])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[2])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[0])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[1])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[2])).to_bytes(1, 'little'))
-                if line.find('COL') != -1:
-                    mylist = line.split(":")
-                    self.current_col[0]=(int)(mylist[1]) #r
-                    self.current_col[1]=(int)(mylist[2]) #g
-                    self.current_col[2]=(int)(mylist[3]) #b
-                    self.serial.write('C'.encode())
-                    self.serial.write(((int)(self.current_col[0])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[1])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[2])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[0])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[1])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[2])).to_bytes(1, 'little'))
-                if line.find('SQUINT') != -1:
-                    mylist = line.split(":")
-                    eye=(str)(mylist[1]) #EYE L/R
-                    delta=(int)(mylist[2]) #Change in brighness
-                    if eye=='L':                    
-                       LOG.info("L has been selected")
-                       self.eye_alphas[0]=delta/100
-                    else:
-                       LOG.info("R has been selected")
-                       self.eye_alphas[1]=delta/100
-                    self.serial.write('C'.encode())
-                    self.serial.write(((int)(self.current_col[0]*self.eye_alphas[0])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[1]*self.eye_alphas[0])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[2]*self.eye_alphas[0])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[0]*self.eye_alphas[1])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[1]*self.eye_alphas[1])).to_bytes(1, 'little'))
-                    self.serial.write(((int)(self.current_col[2]*self.eye_alphas[1])).to_bytes(1, 'little'))
-                if line.find('MOVE') != -1:
-                    self.av = 'N' #Should cancel any aversion I guess
-                    mylist = line.split(":")
-                    #self.valx=abs((int)(mylist[2])) #the abs seems to kill it...
-                    #self.valy=abs((int)(mylist[3]))
-                    #self.current_pos[0] = self.valx
-                    #self.current_pos[1] = self.valy
-                    #if mylist[1]=='1':
-                    #    self.signs[0]=b'\x01'
-                    #else:
-                    #    self.signs[0]=b'\xFF'
-                    #if mylist[3]=='1':
-                    #    self.signs[1]=b'\x01'
-                    #else:
-                    #    self.signs[1]=b'\xFF'
-
-                    #Do we still need the signs for this? I'm not sure any more 
-                    cx = int(mylist[2])
-                    cy = int(mylist[4])
-                    LOG.info(f'Moving to {cx} {cy}')
-                    self.serial.write('M'.encode())
-                    self.val1=1
-                    self.val0=0
-                    self.movement(cx, cy, True)
-                    self.valx=abs(self.current_pos[0])
-                    self.valy=abs(self.current_pos[1])
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-
-                    # self.serial.write('M'.encode())
-                    # self.val1=1
-                    # self.val0=0
-                    # self.movement(30,30)
-                    # self.valx=abs(self.current_pos[0])
-                    # self.valy=abs(self.current_pos[1])
-                    # self.serial.write(self.signs[0])
-                    # self.serial.write(self.valx.to_bytes(1, 'little'))
-                    # self.serial.write(self.signs[1])
-                    # self.serial.write(self.valy.to_bytes(1, 'little'))
-                    # self.serial.write(self.val0.to_bytes(1, 'little'))
-                    # self.serial.write(self.val0.to_bytes(1, 'little'))
-
-                    
-                    #LOG.info("Current position "+" "+ str(self.current_pos))
-                    #self.serial.write('M'.encode())
-                    #self.val1=1
-                    #self.val0=0
-                    #self.serial.write(self.signs[0])
-                    #self.serial.write(self.valx.to_bytes(1, 'little'))
-                    #self.serial.write(self.signs[1])
-                    #self.serial.write(self.valy.to_bytes(1, 'little'))
-                    #self.serial.write(self.val0.to_bytes(1, 'little'))
-                    #self.serial.write(self.val0.to_bytes(1, 'little'))
-
-                if  line=='\x1b[D\n':
-                    self.current_pos[0]=self.current_pos[0]-1
-
-                    if self.current_pos[0]<0:
-                        self.signs[0]=b'\x01'
-                    else:
-                        self.signs[0]=b'\xFF'
-                    if self.current_pos[1]>0:
-                        self.signs[1]=b'\x01'
-                    else:
-                        self.signs[1]=b'\xFF'
-                    self.serial.write('M'.encode())
-                    self.val1=1
-                    self.val0=0
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    LOG.info("Current position " +" "+ str(self.current_pos))
-                if  line=='\x1b[C\n':
-                    self.current_pos[0]=self.current_pos[0]+1
-
-
-                    self.valx= abs(self.current_pos[0])
-                    self.valy= abs(self.current_pos[1])
-
-                    if self.current_pos[0]<0:
-                        self.signs[0]=b'\x01'
-                    else:
-                        self.signs[0]=b'\xFF'
-                    if self.current_pos[1]>0:
-                        self.signs[1]=b'\x01'
-                    else:
-                        self.signs[1]=b'\xFF'
-                    self.serial.write('M'.encode())
-                    self.val1=1
-                    self.val0=0
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    LOG.info("Current position "+" "+ str(self.current_pos) +" "+ str(self.valy))
-                if  line=='\x1b[A\n':
-                    self.current_pos[1]=self.current_pos[1]+1
-
-                    self.valx= abs(self.current_pos[0])
-                    self.valy= abs(self.current_pos[1])
-
-                    if self.current_pos[0]<0:
-                        self.signs[0]=b'\x01'
-                    else:
-                        self.signs[0]=b'\xFF'
-                    if self.current_pos[1]>0:
-                        self.signs[1]=b'\x01'
-                    else:
-                        self.signs[1]=b'\xFF'
-                    self.serial.write('M'.encode())
-                    self.val1=1
-                    self.val0=0
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    LOG.info("Current position " +" "+ str(self.current_pos))
-
-                if  line=='\x1b[B\n':
-                    self.current_pos[1]=self.current_pos[1]-1
-
-                    self.valx= abs(self.current_pos[0])
-                    self.valy= abs(self.current_pos[1])
-
-                    if self.current_pos[0]<0:
-                        self.signs[0]=b'\x01'
-                    else:
-                        self.signs[0]=b'\xFF'
-                    if self.current_pos[1]>0:
-                        self.signs[1]=b'\x01'
-                    else:
-                        self.signs[1]=b'\xFF'
-                    self.serial.write('M'.encode())
-                    self.val1=1
-                    self.val0=0
-                    self.serial.write(self.signs[0])
-                    self.serial.write(self.valx.to_bytes(1, 'little'))
-                    self.serial.write(self.signs[1])
-                    self.serial.write(self.valy.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    self.serial.write(self.val0.to_bytes(1, 'little'))
-                    LOG.info("Current position  "+ str(self.current_pos))
-                # Taking this from the tama_2019 tama.py file
-
-                self.commands.task_done()
+                for action in self.timeline.pop_due():
+                    action()
+                # frames from the timeline are not held back for commands
+                timeout = 0 if self._batch else self.timeline.next_due()
+                taken = self._drain(timeout)
             except Exception as e:
                 LOG.error("Writing error: {0}".format(e))
-                print(
-                    type(e).__name__,          # TypeError
-                    __file__,                  # /tmp/example.py
-                    e.__traceback__.tb_lineno  # 2
-                )
-
-    def write(self, command):
-        self.commands.put(str(command))
-        
+            finally:
+                try:
+                    self._write_batch()
+                except Exception as e:
+                    LOG.error("Writing error: {0}".format(e))
+                for _ in range(taken):
+                    self.commands.task_done()
+
+    def write(self, command, ttl=None):
+        """Queue a command for the head without blocking.
+
+        ``command`` is a ``Command`` from ``ovos_PHAL_tama.commands``; legacy
+        text commands are parsed into one here. Commands with a coalescing
+        key replace the pending command with the same key. ``ttl`` (seconds)
+        overrides the default deadline for the opcode; commands that wait
+        longer are dropped.
+        """
+        if not isinstance(command, Command):
+            try:
+                parsed = parse(str(command))
+            except (ValueError, IndexError) as e:
+                LOG.warning(f"Malformed command {command!r}: {e}")
+                return
+            if parsed is None:
+                LOG.debug("Unknown command: " + str(command))
+                return
+            command = parsed
+        if self.capture:
+            self.capture.record(command, ttl)
+        opcode = command.opcode
+        if ttl is None:
+            ttl = self.deadlines.get(opcode)
+        level, channel, key = self.routes.get(opcode, DEFAULT_ROUTE)
+        if not self.commands.put(command, level, key, channel, ttl):
+            LOG.debug("Command queue full, dropped: " + repr(command))
+
+    def snapshot(self):
+        """The device state as known to the writer, JSON serialisable."""
+        return {"pos": list(self.current_pos),
+                "eye_cols": [list(col) for col in self.eye_cols],
+                "eye_alphas": list(self.eye_alphas),
+                "last_col": self.last_col,
+                "av": self.av,
+                "shadow": self.shadow.state()}
+
+    def restore(self, state):
+        """Continue from a ``snapshot`` of a previous run.
+
+        Raises:
+            KeyError, TypeError, ValueError: ``state`` is malformed, the
+                writer is left as it was
+        """
+        x, y = (int(v) for v in state["pos"])
+        eye_cols = [[int(v) for v in col] for col in state["eye_cols"]]
+        eye_alphas = [float(alpha) for alpha in state["eye_alphas"]]
+        if [len(col) for col in eye_cols] != [3, 3] or len(eye_alphas) != 2:
+            raise ValueError("Expected two eye colours and brightnesses")
+        last_col = str(state["last_col"])
+        av = state["av"]
+        if av not in ('N', 'L', 'R'):
+            raise ValueError(f"Bad aversion state: {av!r}")
+        self.shadow.restore(state["shadow"])
+        self.current_pos = [x, y]
+        self.eye_cols = eye_cols
+        self.eye_alphas = eye_alphas
+        self.last_col = last_col
+        self.current_col = list(codec.BASE_COLOURS.get(self.last_col,
+                                                       self.eye_cols[0]))
+        self.av = av
+        if self.planner:
+            self.planner.reset(*self.current_pos)
+        self.restored = True
+        LOG.info(f"Restored device state: head at {self.current_pos}, "
+                 f"eyes {self.shadow.eyes}, lids open: {self.shadow.lids}")
+
+    def save_snapshot(self):
+        try:
+            save_state(self.snapshot(), self.snapshot_path)
+        except (OSError, TypeError, ValueError) as e:
+            LOG.error(f"Failed to save the device state: {e}")
+        self._saved = self.commands.clock()
+
+    def _snapshot_changed(self):
+        """Save the state after a write, at most once per interval."""
+        if not self.snapshot_path or self.timeline.busy('snapshot'):
+            return
+        wait = self._saved + self.snapshot_interval - self.commands.clock()
+        if wait <= 0:
+            self.save_snapshot()
+        else:
+            self.timeline.play('snapshot', [(wait, self.save_snapshot)])
+
+    def handle_get_stats(self, message):
+        """Reply with the queue counters of every priority level, the
+        number of no-op frames suppressed for each device field, the batch
+        sizes and the latency batching added, with flow control the
+        acknowledgement counters and round trip times, on a supervised
+        link the outage counters and the firmware request counters and
+        round trip times."""
+        stats = {level: dict(stats)
+                 for level, stats in self.commands.stats.items()}
+        stats["suppressed"] = dict(self.shadow.suppressed)
+        batch = self.batch_stats
+        stats["batch"] = {
+            "batches": batch["batches"],
+            "frames": batch["frames"],
+            "max_size": batch["max_size"],
+            "mean_size": batch["frames"] / max(1, batch["batches"]),
+            "added_latency_mean_ms":
+                batch["added_latency"] / max(1, batch["batches"]) * 1000,
+            "added_latency_max_ms": batch["max_added_latency"] * 1000
+        }
+        if self.flow:
+            stats["flow"] = self.flow.stats()
+        if self.supervised:
+            stats["link"] = self.serial.stats()
+        if self.rpc:
+            stats["rpc"] = self.rpc.stats()
+        if self.broker:
+            stats["broker"] = self.broker.stats()
+        self.bus.emit(message.reply("enclosure.writer.stats", stats))
+
+    def handle_get_pose(self, message):
+        """Reply with the last head pose written, x and y are None until
+        the head has been moved once."""
+        x, y = self.shadow.head or (None, None)
+        self.bus.emit(message.reply("enclosure.head.pose",
+                                    {"x": x, "y": y,
+                                     "moving": bool(self.planner and
+                                                    self.planner.active)}))
+
+    def handle_recorder_dump(self, message):
+        """Reply with the flight recorder contents.
+
+        With a ``path`` in the message data the binary snapshot is written
+        to that file, otherwise the entries are sent in the reply.
+        """
+        path = message.data.get("path")
+        if path:
+            with open(path, "wb") as f:
+                f.write(self.recorder.snapshot())
+            data = {"path": path, "count": len(self.recorder)}
+        else:
+            data = {"entries": self.recorder.entries()}
+        self.bus.emit(message.reply("enclosure.recorder", data))
+
+    def handle_capture_start(self, message):
+        """Capture the commands queued from now on to ``path``."""
+        path = message.data.get("path")
+        if not path:
+            return
+        if self.capture:
+            self.capture.close()
+        self.capture = CommandCapture(path)
+        self.bus.emit(message.reply("enclosure.capture", {"path": path}))
+
+    def handle_capture_stop(self, message):
+        capture, self.capture = self.capture, None
+        if capture:
+            capture.close()
+            self.bus.emit(message.reply("enclosure.capture",
+                                        {"path": capture.path,
+                                         "count": capture.count}))
 
     def stop(self):
         self.alive = False
-
-
+        if self.capture:
+            self.capture.close()
+        if self.snapshot_path:
+            self.save_snapshot()
+
+
+
+
+# Pause between the reactions to a shutdown or reboot report, the messages
+# after it are emitted from a timer PAUSE_TIME seconds later
+PAUSE = None
+PAUSE_TIME = 0.5
+_GREY_EYES = ("enclosure.eyes.color", {'r': 70, 'g': 65, 'b': 69})
+
+# Lines reported by the head firmware and the bus messages each produces,
+# in order
+LINE_EVENTS = {
+    # the answer to the "system.version" sent when the link is set up
+    "Command: system.version": [("enclosure.started", None)],
+    "mycroft.stop": [("mycroft.stop", None)],
+    "volume.up": [("mycroft.volume.increase", {'play_sound': True})],
+    "volume.down": [("mycroft.volume.decrease", {'play_sound': True})],
+    "unit.shutdown": [_GREY_EYES,
+                      ("enclosure.eyes.timedspin", {'length': 12000}),
+                      ("enclosure.mouth.reset", None), PAUSE,
+                      ("system.shutdown", None)],
+    "unit.reboot": [_GREY_EYES, ("enclosure.eyes.spin", None),
+                    ("enclosure.mouth.reset", None), PAUSE,
+                    ("system.reboot", None)],
+    "unit.setwifi": [("system.wifi.setup", None)],
+    # not in mycroft-core!
+    "unit.factory-reset": [("system.factory.reset", None)],
+    # handled by the wifi client
+    "unit.enable-ssh": [("system.ssh.enable", None)],
+    "unit.disable-ssh": [("system.ssh.disable", None)]
+}
 
 
 class EnclosureReader(Thread):
@@ -634,93 +846,111 @@ class EnclosureReader(Thread):
         # . ``EnclosureReader`` captures the Stop command
         # . Notify all Mycroft Core processes (e.g. skills) to be stopped
 
-    Note: A command is identified by a line break
+    Note: A command is identified by a line break (LF or CRLF). The read
+    loop takes whatever bytes the port has ready and frames them with a
+    ``LineFramer``; ``stop`` cancels a pending read so the thread ends
+    promptly.
+
+    When an ``AsyncSerialTransport`` is given, lines are delivered by its
+    event loop and no read thread is started.
+
+    Every line is looked up once in a handler table, built from
+    ``LINE_EVENTS`` and extended with ``register_handler``. Lines without
+    a handler are counted in ``unhandled`` and emitted on the bus as they
+    are. The read loop never sleeps: what follows a ``PAUSE`` in a
+    reaction is emitted from a timer.
+
+    ``ack:`` lines are passed to ``flow`` (the writer's ``CreditWindow``)
+    when flow control is enabled and never reach the bus, nor do replies
+    to the requests of ``rpc`` (a ``HeadRpc``).
     """
 
-    def __init__(self, serial, bus):
+    def __init__(self, serial, bus, transport=None, flow=None, rpc=None):
         super(EnclosureReader, self).__init__(target=self.read)
         self.alive = True
         self.daemon = True
         self.serial = serial
         self.bus = bus
-        self.start()
+        self.flow = flow
+        self.rpc = rpc
+        self.handled = 0
+        self.unhandled = 0
+        self.handlers = {token: partial(self._emit, events)
+                         for token, events in LINE_EVENTS.items()}
+        self.framer = LineFramer()
+        if transport:
+            transport.on_line = self.process
+        else:
+            self.start()
 
         # Notifications from mycroft-core
         self.bus.on("mycroft.stop.handled", self.on_stop_handled)
 
     def read(self):
+        generation = getattr(self.serial, "generation", None)
         while self.alive:
             try:
-                data = self.serial.readline()[:-2]
-                if data:
+                # block for the first byte, then take all that is buffered
+                data = self.serial.read(max(1, self.serial.in_waiting))
+                if generation != getattr(self.serial, "generation", None):
+                    # a partial line from before a reconnection
+                    generation = self.serial.generation
+                    self.framer.clear()
+                for line in self.framer.feed(data):
                     try:
-                        data_str = data.decode()
+                        data_str = line.decode()
                     except UnicodeError as e:
-                        data_str = data.decode('utf-8', errors='replace')
+                        data_str = line.decode('utf-8', errors='replace')
                         LOG.warning('Invalid characters in response from '
                                     ' enclosure: {}'.format(repr(e)))
                     self.process(data_str)
             except Exception as e:
                 LOG.error("Reading error: {0}".format(e))
 
+    def register_handler(self, token, handler):
+        """Call ``handler(token)`` for lines reading ``token`` (or
+        ``token=<value>``) from the head."""
+        self.handlers[token] = handler
+
     def on_stop_handled(self, event):
         # A skill performed a stop
         #check_for_signal('buttonPress')
         LOG.error("Unhandled STOP")
 
     def process(self, data):
-        # TODO: Look into removing this emit altogether.
-        # We need to check if any other serial bus messages
-        # are handled by other parts of the code
-        if "mycroft.stop" not in data:
+        if self.flow and self.flow.handle_line(data):
+            return
+        if self.rpc and self.rpc.handle_line(data):
+            return
+        token = data.strip()
+        handler = self.handlers.get(token) or \
+            self.handlers.get(token.partition('=')[0])
+        if handler is None:
+            self.unhandled += 1
+            # lines nothing handles still reach the bus as they are
             self.bus.emit(Message(data))
-
-        if "Command: system.version" in data:
-            # This happens in response to the "system.version" message
-            # sent during the construction of Enclosure()
-            self.bus.emit(Message("enclosure.started"))
-
-        if "mycroft.stop" in data:
-            self.bus.emit(Message("mycroft.stop"))
-
-        if "volume.up" in data:
-            self.bus.emit(Message("mycroft.volume.increase",
-                                  {'play_sound': True}))
-
-        if "volume.down" in data:
-            self.bus.emit(Message("mycroft.volume.decrease",
-                                  {'play_sound': True}))
-
-        if "unit.shutdown" in data:
-            # Eyes to soft gray on shutdown
-            self.bus.emit(Message("enclosure.eyes.color",
-                                  {'r': 70, 'g': 65, 'b': 69}))
-            self.bus.emit(
-                Message("enclosure.eyes.timedspin",
-                        {'length': 12000}))
-            self.bus.emit(Message("enclosure.mouth.reset"))
-            time.sleep(0.5)  # give the system time to pass the message
-            self.bus.emit(Message("system.shutdown"))
-
-        if "unit.reboot" in data:
-            # Eyes to soft gray on reboot
-            self.bus.emit(Message("enclosure.eyes.color",
-                                  {'r': 70, 'g': 65, 'b': 69}))
-            self.bus.emit(Message("enclosure.eyes.spin"))
-            self.bus.emit(Message("enclosure.mouth.reset"))
-            time.sleep(0.5)  # give the system time to pass the message
-            self.bus.emit(Message("system.reboot"))
-
-        if "unit.setwifi" in data:
-            self.bus.emit(Message("system.wifi.setup"))
-        if "unit.factory-reset" in data:
-            self.bus.emit(Message("system.factory.reset"))  # not in mycroft-core!
-        if "unit.enable-ssh" in data:
-            # This is handled by the wifi client
-            self.bus.emit(Message("system.ssh.enable"))
-        if "unit.disable-ssh" in data:
-            # This is handled by the wifi client
-            self.bus.emit(Message("system.ssh.disable"))
+            return
+        self.handled += 1
+        handler(token)
+
+    def _emit(self, events, token=None):
+        for i, event in enumerate(events):
+            if event is PAUSE:
+                # the rest follows once the system had time to pass the
+                # messages on, without holding up the read loop
+                timer = Timer(PAUSE_TIME, self._emit, (events[i + 1:],))
+                timer.daemon = True
+                timer.start()
+                return
+            msg_type, data = event
+            self.bus.emit(Message(msg_type, dict(data or {})))
 
     def stop(self):
         self.alive = False
+        # wake the read loop instead of waiting for the read timeout
+        cancel = getattr(self.serial, "cancel_read", None)
+        if cancel and self.is_alive():
+            try:
+                cancel()
+            except Exception as e:
+                LOG.debug(f"Could not cancel the serial read: {e}")
@@ -0,0 +1,137 @@
+"""
+Baud rate probing and negotiation for the head serial link.
+
+The firmware answers ``system.version`` with a ``Command: system.version``
+line, which only comes through when both ends run at the same rate. With
+``"rate": "auto"`` in the ``TAMA`` config the service:
+
+1. tries the rate remembered from the last start,
+2. otherwise probes the candidate ``rates`` until the head answers,
+3. asks the head to move up to a faster candidate with
+   ``system.baud=<rate>``, switches the port and checks the handshake
+   again, going back to the working rate if it fails and trying the next
+   slower candidate, fastest first,
+4. remembers the result for the next start.
+
+If the head answers at no rate the link stays at 9600 baud.
+"""
+import json
+import os
+import time
+
+from ovos_utils.log import LOG
+from ovos_utils.xdg_utils import xdg_state_home
+
+DEFAULT_RATE = 9600
+RATES = (115200, 57600, 38400, 19200, 9600)
+HANDSHAKE = b"system.version\n"
+HANDSHAKE_REPLY = "Command: system.version"
+
+
+def cache_path():
+    return os.path.join(xdg_state_home(), "ovos_PHAL_tama", "serial.json")
+
+
+def load_rate(port, path=None):
+    """The rate remembered for ``port``, None if there is none."""
+    try:
+        with open(path or cache_path()) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached.get(port)
+
+
+def save_rate(port, rate, path=None):
+    path = path or cache_path()
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    cached[port] = rate
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(cached, f)
+
+
+def _expect(serial, reply, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        line = serial.readline()
+        if reply in line.decode('utf-8', errors='replace'):
+            return True
+    return False
+
+
+def handshake(serial, timeout=0.5):
+    """True if the head answers ``system.version`` at the current rate."""
+    serial.reset_input_buffer()
+    serial.write(HANDSHAKE)
+    return _expect(serial, HANDSHAKE_REPLY, timeout)
+
+
+def probe(serial, rates=RATES, timeout=0.5):
+    """Find the rate the head is running at.
+
+    Returns:
+        int: the first of ``rates`` the head answers at, None if none
+    """
+    for rate in rates:
+        serial.baudrate = rate
+        if handshake(serial, timeout):
+            return rate
+    return None
+
+
+def negotiate(serial, rate, timeout=0.5):
+    """Move both ends of the link to ``rate``.
+
+    Returns:
+        bool: True if the head answers at ``rate``; otherwise the port is
+              back at its previous rate
+    """
+    current = serial.baudrate
+    serial.reset_input_buffer()
+    serial.write(f"system.baud={rate}\n".encode())
+    if not _expect(serial, f"Command: system.baud={rate}", timeout):
+        return False
+    # the reply went out at the old rate, the head switches after it
+    serial.flush()
+    serial.baudrate = rate
+    if handshake(serial, timeout):
+        return True
+    serial.baudrate = current
+    return False
+
+
+def select_rate(serial, port, rates=RATES, timeout=0.5, path=None):
+    """Probe, negotiate and remember the fastest rate the head supports.
+
+    Returns:
+        int: the rate the port is left at
+    """
+    remembered = load_rate(port, path)
+    if remembered:
+        serial.baudrate = remembered
+        if handshake(serial, timeout):
+            LOG.info(f"Head answers at the remembered {remembered} baud")
+            return remembered
+    rate = probe(serial, rates, timeout)
+    if rate is None:
+        LOG.warning(f"Head did not answer at {rates}, "
+                    f"falling back to {DEFAULT_RATE} baud")
+        serial.baudrate = DEFAULT_RATE
+        return DEFAULT_RATE
+    for faster in sorted((r for r in rates if r > rate), reverse=True):
+        if negotiate(serial, faster, timeout):
+            rate = faster
+            break
+        if not handshake(serial, timeout):
+            # the head may have switched without us, find it again
+            rate = probe(serial, rates, timeout) or DEFAULT_RATE
+            serial.baudrate = rate
+            break
+    LOG.info(f"Head link running at {rate} baud")
+    save_rate(port, rate, path)
+    return rate
@@ -0,0 +1,374 @@
+"""
+Local broker sharing the head serial link between processes.
+
+The PHAL service owns the serial port. With a ``broker`` ``path`` in the
+``TAMA`` config it also listens on that Unix domain socket, so other local
+processes (the admin service, skills, test tools) can queue typed commands
+with a ``BrokerClient`` instead of opening the port a second time.
+
+Every message on the socket is a 4 byte big endian length followed by a
+JSON object:
+
+    {"hello": {"name": "admin", "subscribe": true}}   first, from the client
+    {"command": ["MoveHead", 10, 20], "ttl": 1.0}      client to broker
+    {"event": {"type": "mycroft.stop", "data": {}}}    broker to subscribers
+
+Each client is given the priority configured for its name (``priorities``,
+default 0). Commands wait in a bounded queue per client and are handed to
+the ``EnclosureWriter`` only while its queue is short: higher priority
+clients first, clients of equal priority in turn, so one busy client cannot
+starve the others. The optional ``ttl`` of a command counts from its
+arrival at the broker. Events read from the head are queued for every
+subscriber and sent by a thread per subscriber, dropping the oldest when a
+client falls ``event_queue`` events behind.
+"""
+import json
+import os
+import socket
+import struct
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+
+from ovos_utils.log import LOG
+
+from ovos_PHAL_tama.commands import command_types, decode, encode
+
+_LENGTH = struct.Struct('>I')
+MAX_MESSAGE = 64 * 1024
+
+
+def send_message(sock, message):
+    body = json.dumps(message).encode()
+    sock.sendall(_LENGTH.pack(len(body)) + body)
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def recv_message(sock):
+    size, = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    if size > MAX_MESSAGE:
+        raise ValueError(f"Message of {size} bytes is too long")
+    return json.loads(_recv_exact(sock, size))
+
+
+class Arbiter:
+    """
+    Per-client command queues served by priority, then round robin.
+
+    Args:
+        size (int): commands kept per client, the oldest are dropped
+    """
+
+    def __init__(self, size=32):
+        self.size = size
+        self.dropped = {}
+        self._queues = {}
+        self._priorities = {}
+        self._order = deque()
+        self._cond = Condition()
+
+    def add(self, client, priority=0):
+        with self._cond:
+            self._queues[client] = deque()
+            self._priorities[client] = priority
+            self._order.append(client)
+            self.dropped[client] = 0
+
+    def remove(self, client):
+        with self._cond:
+            self._queues.pop(client, None)
+            self._priorities.pop(client, None)
+            self.dropped.pop(client, None)
+            if client in self._order:
+                self._order.remove(client)
+
+    def put(self, client, command):
+        with self._cond:
+            queue = self._queues[client]
+            if len(queue) >= self.size:
+                queue.popleft()
+                self.dropped[client] += 1
+            queue.append(command)
+            self._cond.notify()
+
+    def _ready(self):
+        return any(self._queues.values())
+
+    def get(self, timeout=None):
+        """Next command by priority and turn, None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(self._ready, timeout):
+                return None
+            top = max(self._priorities[c] for c in self._order
+                      if self._queues[c])
+            for _ in range(len(self._order)):
+                client = self._order[0]
+                self._order.rotate(-1)
+                if self._queues[client] and self._priorities[client] == top:
+                    return self._queues[client].popleft()
+
+
+class Subscriber(Thread):
+    """
+    Sends events to one client from a bounded outbox, so a stalled client
+    never holds up the thread publishing (e.g. the serial reader).
+
+    Args:
+        sock (socket.socket): client connection
+        size (int): events kept for the client, the oldest are dropped
+    """
+
+    def __init__(self, sock, size=64):
+        super(Subscriber, self).__init__(target=self._send)
+        self.daemon = True
+        self.alive = True
+        self.sock = sock
+        self.size = size
+        self.dropped = 0
+        self._outbox = deque()
+        self._cond = Condition()
+        self.start()
+
+    def put(self, event):
+        """Queue ``event`` without blocking."""
+        with self._cond:
+            if len(self._outbox) >= self.size:
+                self._outbox.popleft()
+                self.dropped += 1
+            self._outbox.append(event)
+            self._cond.notify()
+
+    def _send(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._outbox or not self.alive)
+                if not self.alive:
+                    return
+                event = self._outbox.popleft()
+            try:
+                send_message(self.sock, event)
+            except OSError:
+                self.close()
+
+    def close(self):
+        with self._cond:
+            self.alive = False
+            self._cond.notify()
+
+
+class SerialBroker(Thread):
+    """
+    Unix socket server feeding a shared ``EnclosureWriter``.
+
+    Args:
+        writer (EnclosureWriter): writer owning the serial port
+        path (str): socket path
+        config (dict): ``priorities`` (client name -> priority),
+            ``client_queue`` (commands kept per client), ``event_queue``
+            (events kept per subscriber) and ``high_water`` (writer queue
+            depth above which the broker holds commands back)
+    """
+
+    def __init__(self, writer, path, config=None):
+        super(SerialBroker, self).__init__(target=self._accept)
+        self.daemon = True
+        self.alive = True
+        self.writer = writer
+        self.path = path
+        self.config = config or {}
+        self.priorities = self.config.get("priorities", {})
+        self.high_water = self.config.get("high_water", 2)
+        self.arbiter = Arbiter(self.config.get("client_queue", 32))
+        self._types = command_types()
+        self.event_queue = self.config.get("event_queue", 64)
+        self.expired = 0
+        self._names = {}
+        self._subscribers = {}
+        self._lock = Lock()
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        Thread(target=self._feed, daemon=True).start()
+        self.start()
+
+    def _accept(self):
+        while self.alive:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                break
+            Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock):
+        try:
+            hello = recv_message(sock).get("hello", {})
+        except (ConnectionError, ValueError, OSError) as e:
+            LOG.warning(f"Broker client failed to connect: {e}")
+            sock.close()
+            return
+        name = hello.get("name", "client")
+        with self._lock:
+            self._names[sock] = name
+        self.arbiter.add(sock, self.priorities.get(name, 0))
+        if hello.get("subscribe"):
+            with self._lock:
+                self._subscribers[sock] = Subscriber(sock, self.event_queue)
+        LOG.info(f"Broker client connected: {name}")
+        try:
+            while self.alive:
+                message = recv_message(sock)
+                if "command" in message:
+                    try:
+                        command = decode(message["command"], self._types)
+                    except (KeyError, TypeError, ValueError) as e:
+                        LOG.warning(f"Bad command from {name}: {e}")
+                        continue
+                    ttl = message.get("ttl")
+                    deadline = None if ttl is None \
+                        else time.monotonic() + ttl
+                    self.arbiter.put(sock, (command, deadline))
+        except (ConnectionError, ValueError, OSError):
+            pass
+        finally:
+            LOG.info(f"Broker client disconnected: {name}")
+            self.arbiter.remove(sock)
+            with self._lock:
+                self._names.pop(sock, None)
+                subscriber = self._subscribers.pop(sock, None)
+            if subscriber:
+                subscriber.close()
+            sock.close()
+
+    def _feed(self):
+        """Hand commands to the writer while its queue is short."""
+        while self.alive:
+            # the writer's queue wakes us as it finishes commands
+            if not self.writer.commands.wait_below(self.high_water, 0.1):
+                continue
+            item = self.arbiter.get(timeout=0.1)
+            if item is None:
+                continue
+            command, deadline = item
+            ttl = None
+            if deadline is not None:
+                ttl = deadline - time.monotonic()
+                if ttl <= 0:
+                    self.expired += 1
+                    continue
+            self.writer.write(command, ttl)
+
+    def stats(self):
+        """Connected clients, commands dropped from full client queues and
+        events dropped for slow subscribers by client name, and commands
+        that expired before reaching the writer."""
+        with self._lock:
+            names = dict(self._names)
+            subscribers = dict(self._subscribers)
+        dropped = {}
+        for client, count in list(self.arbiter.dropped.items()):
+            name = names.get(client, "client")
+            dropped[name] = dropped.get(name, 0) + count
+        events_dropped = {}
+        for sock, subscriber in subscribers.items():
+            name = names.get(sock, "client")
+            events_dropped[name] = events_dropped.get(name, 0) + \
+                subscriber.dropped
+        return {"clients": sorted(names.values()),
+                "dropped": dropped,
+                "expired": self.expired,
+                "events_dropped": events_dropped}
+
+    def publish(self, message):
+        """Queue a bus ``Message`` read from the head for every subscriber,
+        without blocking."""
+        event = {"event": {"type": message.msg_type, "data": message.data}}
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def stop(self):
+        self.alive = False
+        try:
+            # wakes the accept() call, closing alone does not on Linux
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for subscriber in subscribers:
+            subscriber.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class EventTee:
+    """Bus wrapper that also publishes emitted messages on a broker."""
+
+    def __init__(self, bus, broker):
+        self.bus = bus
+        self.broker = broker
+
+    def on(self, msg_type, handler):
+        self.bus.on(msg_type, handler)
+
+    def emit(self, message):
+        self.bus.emit(message)
+        self.broker.publish(message)
+
+
+class BrokerClient:
+    """
+    Connection to a ``SerialBroker``, usable in place of an
+    ``EnclosureWriter``.
+
+    Args:
+        path (str): broker socket path
+        name (str): client name, selects the priority the broker gives it
+        on_event (callable): called with ``(msg_type, data)`` for every
+                             event read from the head, None to not
+                             subscribe
+    """
+
+    def __init__(self, path, name="client", on_event=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.on_event = on_event
+        self._lock = Lock()
+        send_message(self.sock, {"hello": {"name": name,
+                                           "subscribe": bool(on_event)}})
+        if on_event:
+            Thread(target=self._read, daemon=True).start()
+
+    def write(self, command, ttl=None):
+        """Queue a ``Command`` on the broker, dropped if it waited longer
+        than ``ttl`` seconds before reaching the writer."""
+        message = {"command": encode(command)}
+        if ttl is not None:
+            message["ttl"] = ttl
+        with self._lock:
+            send_message(self.sock, message)
+
+    def _read(self):
+        try:
+            while True:
+                event = recv_message(self.sock).get("event")
+                if event:
+                    self.on_event(event["type"], event.get("data", {}))
+        except (ConnectionError, ValueError, OSError):
+            pass
+
+    def stop(self):
+        self.sock.close()
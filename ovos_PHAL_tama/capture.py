@@ -0,0 +1,185 @@
+"""
+Capture and replay of the command stream entering the writer.
+
+Unlike the flight recorder, which keeps the last frames written, a capture
+keeps every typed command queued on the ``EnclosureWriter`` with the time
+it was queued, so a session (e.g. a user study where the head glitched)
+can be played back through a writer again.
+
+A capture is a JSON lines file: a header ``{"version": 1, "started": <unix
+time>}`` then one ``[<seconds since start>, <ttl>, <command>...]`` line per
+command, the command encoded by ``commands.encode``. Capturing runs from
+start up with the writer's ``capture`` config (a file path), or on demand
+with ``enclosure.capture.start`` ``{"path": ...}`` and
+``enclosure.capture.stop``.
+
+    ovos_PHAL_tama_replay session.jsonl --emulator --speed 10
+    ovos_PHAL_tama_replay session.jsonl --port /dev/ttyS0 --speed 0
+    ovos_PHAL_tama_replay session.jsonl --broker /run/user/1000/tama.sock
+
+replays a capture into an emulated head, straight to the serial port (with
+the service stopped) or through the running service's broker, at
+``--speed`` times real time; 0 replays without pauses, queuing each
+command once the writer has taken the previous one so that none are
+dropped by its queue (through a broker, commands can still be dropped
+once the client queue there is full).
+"""
+import argparse
+import json
+import time
+from threading import Lock
+
+from ovos_PHAL_tama.commands import command_types, decode, encode
+
+VERSION = 1
+# seconds between flushes of the capture file
+FLUSH_INTERVAL = 1.0
+# seconds the replay tool lets gestures and effects play out after the last
+# command; effects without an end (an untimed spin) are cut off then
+SETTLE_TIME = 2.0
+
+
+class CommandCapture:
+    """
+    Appends the commands queued on a writer to a capture file.
+
+    Args:
+        path (str): capture file, overwritten
+        clock (callable): monotonic time source, in seconds
+    """
+
+    def __init__(self, path, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.count = 0
+        self._lock = Lock()
+        self._file = open(path, "w")
+        self._start = clock()
+        self._flushed = self._start
+        self._file.write(json.dumps({"version": VERSION,
+                                     "started": time.time()}) + "\n")
+
+    def record(self, command, ttl=None):
+        now = self.clock()
+        line = json.dumps([round(now - self._start, 6), ttl,
+                           *encode(command)])
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.count += 1
+            if now - self._flushed >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed = now
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load(path):
+    """The ``(offset, ttl, command)`` entries of a capture file."""
+    types = command_types()
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get("version") != VERSION:
+            raise ValueError(f"{path} is not a command capture")
+        return [(offset, ttl, decode(data, types))
+                for offset, ttl, *data in map(json.loads, f)]
+
+
+def replay(entries, writer, speed=1.0, clock=time.monotonic,
+           sleep=time.sleep):
+    """Queue captured commands on ``writer`` with their original spacing.
+
+    Args:
+        entries (list): ``(offset, ttl, command)`` tuples from ``load``
+        writer: ``EnclosureWriter`` or anything with its ``write``
+        speed (float): times real time, 0 to not pause between commands;
+                       an ``EnclosureWriter`` is then given one command at
+                       a time, so its queue never overflows
+
+    Returns:
+        float: seconds the replay took
+    """
+    start = clock()
+    queue = getattr(writer, "commands", None)
+    for offset, ttl, command in entries:
+        if speed:
+            delay = start + offset / speed - clock()
+            if delay > 0:
+                sleep(delay)
+        elif queue is not None:
+            # a full level would drop what was written before
+            queue.join()
+        writer.write(command, ttl)
+    return clock() - start
+
+
+class _NoBus:
+    def on(self, msg_type, handler):
+        pass
+
+    def emit(self, message):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a captured head command stream")
+    parser.add_argument("path", help="capture file")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="times real time, 0 for no pauses")
+    head = parser.add_mutually_exclusive_group(required=True)
+    head.add_argument("--port", help="serial port of the head")
+    head.add_argument("--emulator", action="store_true",
+                      help="replay into an emulated head")
+    head.add_argument("--broker", help="socket of the running service")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    args = parser.parse_args(argv)
+
+    entries = load(args.path)
+    emulator = writer = None
+    if args.broker:
+        from ovos_PHAL_tama.broker import BrokerClient
+        target = BrokerClient(args.broker, "replay")
+    else:
+        import serial
+        from ovos_PHAL_tama.arduino import EnclosureWriter
+        if args.emulator:
+            from ovos_PHAL_tama.emulator import HeadEmulator
+            emulator = HeadEmulator(args.baudrate, url="loop://")
+            port = emulator.connect()
+        else:
+            port = serial.serial_for_url(args.port, baudrate=args.baudrate)
+        writer = target = EnclosureWriter(port, _NoBus(),
+                                          {"baudrate": args.baudrate})
+    start = time.monotonic()
+    replay(entries, target, args.speed)
+    if writer:
+        writer.commands.join()
+        # let the last gestures and head motions play out
+        end = time.monotonic() + SETTLE_TIME
+        while writer.timeline.next_due() is not None and \
+                time.monotonic() < end:
+            time.sleep(0.01)
+        writer.stop()
+        print(f"batches {writer.batch_stats['batches']} frames "
+              f"{writer.batch_stats['frames']} suppressed "
+              f"{dict(writer.shadow.suppressed)}")
+    else:
+        target.stop()
+    if emulator:
+        # the last frames may still be on the emulated wire
+        emulator.wait_for(writer.batch_stats["frames"])
+        print(f"emulator received {emulator.count} frames, eyes "
+              f"{emulator.eyes} head {emulator.head}")
+        emulator.stop()
+    print(f"replayed {len(entries)} commands in "
+          f"{time.monotonic() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
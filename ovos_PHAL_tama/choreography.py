@@ -0,0 +1,136 @@
+"""
+Declarative gestures and expressions.
+
+Gestures (head keyframes) and expressions (eye colours, eyelids) are
+described in a JSON file, ``choreography.json`` next to this module plus an
+optional user file given as the writer's ``choreography`` config, whose
+entries are added to or replace the built in ones:
+
+    "NOD": [
+        {"head": [0, 30]},
+        {"delay": 0.3, "head": [0, -30]}
+    ],
+    "TALK": [{"eyes": "PINK"}]
+
+Every keyframe comes ``delay`` seconds (default 0) after the previous one
+and may set:
+
+    head  [dx, dy] step from the current head position
+    eyes  a firmware preset name, [r, g, b] or [[r, g, b], [r, g, b]] for
+          the left and right eye
+    lids  true to open the eyelids, false to close them
+
+The file is validated and compiled once when the writer starts: eye and
+eyelid frames are built then, so playing a choreography only looks up
+ready frames. Entries that fail validation are logged and skipped.
+``Gesture(name)`` commands, or ``enclosure.gesture.play`` on the bus,
+play them.
+"""
+import json
+import os
+from collections import namedtuple
+
+from ovos_utils.log import LOG
+
+from ovos_PHAL_tama import codec
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "choreography.json")
+
+# A compiled keyframe. ``head`` is a (dx, dy) step, ``eyes`` the colour
+# frame with ``colours`` the (left, right) rgb it shows and ``preset`` the
+# firmware preset letter if it is one; ``lids`` the eyelid frame. Unused
+# parts are None.
+Cue = namedtuple('Cue', 'delay head eyes colours preset lids')
+
+_KEYS = {"delay", "head", "eyes", "lids"}
+
+
+def _rgb(value):
+    if len(value) != 3 or not all(isinstance(c, int) and 0 <= c <= 255
+                                  for c in value):
+        raise ValueError(f"invalid colour {value}")
+    return tuple(value)
+
+
+def _eyes(value):
+    """(frame, (left, right), preset letter) for an ``eyes`` value."""
+    if isinstance(value, str):
+        if value not in codec.EYE_PRESETS:
+            raise ValueError(f"unknown eye preset {value}")
+        letter = codec.EYE_PRESETS[value].decode()
+        rgb = codec.BASE_COLOURS[letter]
+        return codec.preset(value), (rgb, rgb), letter
+    if isinstance(value, list) and value and isinstance(value[0], list):
+        if len(value) != 2:
+            raise ValueError("eyes needs one colour per eye")
+        left, right = _rgb(value[0]), _rgb(value[1])
+    elif isinstance(value, list):
+        left = right = _rgb(value)
+    else:
+        raise ValueError(f"invalid eyes {value!r}")
+    return codec.colour(left, right), (left, right), None
+
+
+def _cue(keyframe):
+    if not isinstance(keyframe, dict):
+        raise ValueError(f"keyframe {keyframe!r} is not an object")
+    unknown = set(keyframe) - _KEYS
+    if unknown:
+        raise ValueError(f"unknown keyframe keys {sorted(unknown)}")
+    delay = keyframe.get("delay", 0)
+    if not isinstance(delay, (int, float)) or delay < 0:
+        raise ValueError(f"invalid delay {delay!r}")
+    head = keyframe.get("head")
+    if head is not None:
+        if len(head) != 2 or not all(isinstance(d, int) for d in head):
+            raise ValueError(f"invalid head step {head!r}")
+        head = tuple(head)
+    eyes = colours = preset = None
+    if "eyes" in keyframe:
+        eyes, colours, preset = _eyes(keyframe["eyes"])
+    lids = None
+    if "lids" in keyframe:
+        if not isinstance(keyframe["lids"], bool):
+            raise ValueError(f"invalid lids {keyframe['lids']!r}")
+        lids = codec.lids(keyframe["lids"])
+    if head is None and eyes is None and lids is None:
+        raise ValueError("keyframe does nothing")
+    return Cue(float(delay), head, eyes, colours, preset, lids)
+
+
+def compile_choreography(keyframes):
+    """Validate a list of keyframes and compile it into ``Cue`` tuples.
+
+    Raises:
+        ValueError: if a keyframe is invalid
+    """
+    if not isinstance(keyframes, list) or not keyframes:
+        raise ValueError("a choreography is a non empty list of keyframes")
+    return tuple(_cue(keyframe) for keyframe in keyframes)
+
+
+def moves_head(cues):
+    """True if a compiled choreography moves the head."""
+    return any(cue.head for cue in cues)
+
+
+def load_choreographies(path=None):
+    """Compile the built in choreographies and those in ``path``.
+
+    Returns:
+        dict: name -> tuple of ``Cue``
+    """
+    compiled = {}
+    for source in filter(None, (DEFAULT_PATH, path)):
+        try:
+            with open(source) as f:
+                specs = json.load(f)
+        except (OSError, ValueError) as e:
+            LOG.error(f"Failed to read choreographies from {source}: {e}")
+            continue
+        for name, keyframes in specs.items():
+            try:
+                compiled[name] = compile_choreography(keyframes)
+            except (TypeError, ValueError) as e:
+                LOG.error(f"Invalid choreography {name} in {source}: {e}")
+    return compiled
@@ -0,0 +1,106 @@
+"""
+Binary frame codec for the Tama head firmware.
+
+Every command understood by the head controller is a short fixed layout
+frame. The layouts are compiled once into ``struct.Struct`` objects and the
+frames that never change (eye presets, eyelids, home) are built at import
+time, so the writer can send any command with a single ``serial.write()``.
+Head position frames are cached as they are built, gestures and gaze keep
+returning to the same few poses.
+
+Frame layouts (one byte per field):
+    E<col><1><0>              eye preset colour
+    T<0|1>                    eyelids closed / open
+    M<sx><x><sy><y><0><0>     head position, signs are 0x01 or 0xFF
+    C<r><g><b><r><g><b>       eye colour, left eye then right eye
+
+Requests to the firmware (see ``ovos_PHAL_tama.rpc``) are text lines.
+"""
+import struct
+from functools import lru_cache
+
+SIGN_POS = 0x01
+SIGN_NEG = 0xFF
+
+# bits on the wire per byte with 8N1 framing
+BITS_PER_BYTE = 10
+
+# Firmware preset letters for the ``E`` frame
+EYE_PRESETS = {
+    'GREEN': b'G',
+    'YELLOW': b'Y',
+    'RED': b'R',
+    'BLUE': b'B',
+    'CIAN': b'C',
+    'PINK': b'P',
+    'WHITE': b'W',
+    'NONE': b'N'
+}
+
+# RGB values the firmware uses for each preset letter
+BASE_COLOURS = {
+    'R': (255, 0, 0),
+    'G': (0, 255, 0),
+    'B': (0, 0, 255),
+    'Y': (200, 200, 0),
+    'P': (200, 0, 200),
+    'C': (0, 200, 200),
+    'W': (200, 200, 200),
+    'N': (0, 0, 0)
+}
+
+_PRESET = struct.Struct('<ccBB')
+_LIDS = struct.Struct('<cB')
+_MOVE = struct.Struct('<c6B')
+_COLOUR = struct.Struct('<c6B')
+
+# frame length by leading byte
+FRAME_SIZES = {b'E'[0]: _PRESET.size, b'T'[0]: _LIDS.size,
+               b'M'[0]: _MOVE.size, b'C'[0]: _COLOUR.size}
+
+PRESET_FRAMES = {name: _PRESET.pack(b'E', col, 1, 0)
+                 for name, col in EYE_PRESETS.items()}
+OPEN_FRAME = _LIDS.pack(b'T', 1)
+CLOSE_FRAME = _LIDS.pack(b'T', 0)
+HOME_FRAME = _MOVE.pack(b'M', SIGN_POS, 0, SIGN_POS, 0, 0, 0)
+
+
+def preset(name):
+    """Frame selecting one of the firmware colour presets."""
+    return PRESET_FRAMES[name]
+
+
+def lids(is_open):
+    """Frame opening or closing both eyelids."""
+    return OPEN_FRAME if is_open else CLOSE_FRAME
+
+
+@lru_cache(maxsize=1024)
+def move(x, y):
+    """Frame moving the head to the absolute position ``(x, y)``.
+
+    The firmware takes a sign byte and a magnitude byte per axis. The sign
+    convention is inverted between the two axes and follows what the head
+    firmware expects.
+    """
+    sx = SIGN_POS if x < 0 else SIGN_NEG
+    sy = SIGN_POS if y > 0 else SIGN_NEG
+    return _MOVE.pack(b'M', sx, abs(x), sy, abs(y), 0, 0)
+
+
+def colour(left, right=None):
+    """Frame setting the RGB colour of each eye.
+
+    Args:
+        left (tuple): (r, g, b) for the left eye
+        right (tuple): (r, g, b) for the right eye, defaults to ``left``
+    """
+    if right is None:
+        right = left
+    return _COLOUR.pack(b'C', int(left[0]), int(left[1]), int(left[2]),
+                        int(right[0]), int(right[1]), int(right[2]))
+
+
+def request(request_id, method):
+    """Line asking the firmware for ``method``."""
+    return f"rpc:{request_id}:{method}\n".encode()
@@ -0,0 +1,204 @@
+"""
+Priority command queue for the ``EnclosureWriter``.
+
+Commands are queued on one of several priority levels (by default
+"safety", then "eyes", then "look") and the writer always takes the oldest
+command of the most urgent non-empty level. ``put`` never blocks: each level
+is bounded and has its own overflow policy:
+
+    drop_oldest   evict the oldest command of the level
+    drop_new      refuse the new command
+    coalesce      the new command replaces the newest one of the level
+
+Commands that only describe a target state (the newest head position, the
+newest eye colour) are queued under a coalescing key: queuing a new command
+with the same key drops the one still pending, so stale targets are never
+replayed. Any command may also carry a time to live; commands that waited
+longer than that are dropped when dequeued instead of being sent.
+
+Commands also name the channel they drive. A command is never sent ahead of
+an older command on the same channel, even one queued on a lower level, so
+preemption only reorders independent channels.
+"""
+import time
+from collections import deque
+from itertools import count
+from queue import Empty
+from threading import Condition
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEW = 'drop_new'
+COALESCE = 'coalesce'
+
+# (name, size, overflow policy), most urgent first
+DEFAULT_LEVELS = (
+    ('safety', 8, DROP_OLDEST),
+    ('eyes', 16, DROP_OLDEST),
+    ('look', 4, COALESCE)
+)
+
+
+class QueuedCommand:
+    """A command waiting in the ``CommandQueue``."""
+    __slots__ = ('command', 'level', 'key', 'channel', 'deadline',
+                 'enqueued', 'seq')
+
+    def __init__(self, command, level, key=None, channel=None,
+                 deadline=None, enqueued=0.0, seq=0):
+        self.command = command
+        self.level = level
+        self.key = key
+        self.channel = channel
+        self.deadline = deadline
+        self.enqueued = enqueued
+        self.seq = seq
+
+
+class CommandQueue:
+    """
+    Multi-level priority queue with coalescing and per-command deadlines.
+
+    Mirrors the parts of ``queue.Queue`` the writer uses (``put``, ``get``,
+    ``task_done``, ``join``, ``qsize``) and counts queued, coalesced,
+    dropped and expired commands per level in ``stats``.
+
+    Args:
+        levels (iterable): (name, size, policy) tuples, most urgent first
+        clock (callable): monotonic time source, in seconds
+    """
+
+    def __init__(self, levels=DEFAULT_LEVELS, clock=time.monotonic):
+        self.clock = clock
+        self.levels = [name for name, _, _ in levels]
+        self._size = {name: size for name, size, _ in levels}
+        self._policy = {}
+        for name, _, policy in levels:
+            if policy not in (DROP_OLDEST, DROP_NEW, COALESCE):
+                raise ValueError(f"Unknown overflow policy: {policy}")
+            self._policy[name] = policy
+        self._queues = {name: deque() for name in self.levels}
+        self._pending = {}
+        self._seq = count()
+        self._unfinished = 0
+        self._cond = Condition()
+        self.stats = {name: {'queued': 0, 'coalesced': 0, 'dropped': 0,
+                             'expired': 0} for name in self.levels}
+
+    def qsize(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def _discard(self, entry):
+        self._queues[entry.level].remove(entry)
+        if entry.key is not None and self._pending.get(entry.key) is entry:
+            del self._pending[entry.key]
+        self._unfinished -= 1
+
+    def put(self, command, level, key=None, channel=None, ttl=None):
+        """Queue ``command`` without blocking.
+
+        Args:
+            command: the command to send
+            level (str): priority level name
+            key (str): coalescing key, a pending command with the same key
+                is replaced by this one
+            channel (str): device channel the command drives
+            ttl (float): seconds the command may wait before it is dropped
+
+        Returns:
+            bool: False if the level was full and its policy refused it
+        """
+        now = self.clock()
+        with self._cond:
+            queue = self._queues[level]
+            stats = self.stats[level]
+            stale = self._pending.get(key) if key is not None else None
+            if stale is not None:
+                self._discard(stale)
+                self.stats[stale.level]['coalesced'] += 1
+            elif len(queue) >= self._size[level]:
+                policy = self._policy[level]
+                if policy == DROP_NEW or not queue:
+                    stats['dropped'] += 1
+                    return False
+                if policy == DROP_OLDEST:
+                    self._discard(queue[0])
+                    stats['dropped'] += 1
+                else:
+                    self._discard(queue[-1])
+                    stats['coalesced'] += 1
+            entry = QueuedCommand(command, level, key, channel,
+                                  None if ttl is None else now + ttl, now,
+                                  next(self._seq))
+            queue.append(entry)
+            if key is not None:
+                self._pending[key] = entry
+            self._unfinished += 1
+            stats['queued'] += 1
+            self._cond.notify_all()
+            return True
+
+    def _next(self):
+        """The entry to send next, or None if the queue is empty."""
+        for level in self.levels:
+            if self._queues[level]:
+                entry = self._queues[level][0]
+                break
+        else:
+            return None
+        if entry.channel is None:
+            return entry
+        # never overtake an older command on the same channel
+        for level in self.levels[self.levels.index(entry.level) + 1:]:
+            for older in self._queues[level]:
+                if older.seq > entry.seq:
+                    break
+                if older.channel == entry.channel:
+                    entry = older
+                    break
+        return entry
+
+    def get(self, timeout=None):
+        """Return the next live ``QueuedCommand``.
+
+        Expired commands are discarded on the way.
+
+        Raises:
+            queue.Empty: nothing was available within ``timeout`` seconds
+        """
+        with self._cond:
+            while True:
+                if not self._cond.wait_for(self._next, timeout):
+                    raise Empty
+                entry = self._next()
+                self._queues[entry.level].remove(entry)
+                if entry.key is not None:
+                    del self._pending[entry.key]
+                if entry.deadline is not None and \
+                        self.clock() > entry.deadline:
+                    self.stats[entry.level]['expired'] += 1
+                    self._unfinished -= 1
+                    # as task_done, an expired command may finish a join()
+                    self._cond.notify_all()
+                    continue
+                return entry
+
+    def task_done(self):
+        with self._cond:
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def wait_below(self, size, timeout=None):
+        """Block until fewer than ``size`` commands are queued.
+
+        Returns:
+            bool: False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: sum(len(q) for q in self._queues.values()) < size,
+                timeout)
+
+    def join(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._unfinished <= 0)
@@ -0,0 +1,282 @@
+"""
+Typed head commands.
+
+Small slotted value objects queued by ``EnclosureEyes`` (and any other
+caller) straight into the ``EnclosureWriter``, which dispatches on their
+type and encodes them without formatting or parsing strings. ``opcode``
+names the command for queue routing, deadlines and the flight recorder.
+
+``parse`` turns the legacy text commands (``"COL:r:g:b"``,
+``"MOVE:0:x:0:y"``, ``"YELLOW"``, ``"eyes.blink=b"``, ...) into the same
+objects, once, when they are queued. ``encode``/``decode`` convert them to
+and from JSON friendly lists (``["MoveHead", 10, 20]``) for the broker
+socket and command captures.
+"""
+import colorsys
+
+from ovos_PHAL_tama.codec import EYE_PRESETS
+
+
+class Command:
+    """Base class of all head commands."""
+    __slots__ = ()
+    opcode = ''
+
+    def _fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._fields() == other._fields()
+
+    def __hash__(self):
+        return hash((type(self), self._fields()))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}"
+                           for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class SetColor(Command):
+    """Set both eyes to an RGB colour."""
+    __slots__ = ('r', 'g', 'b')
+    opcode = 'COL'
+
+    def __init__(self, r, g, b):
+        self.r = int(r)
+        self.g = int(g)
+        self.b = int(b)
+
+    @classmethod
+    def from_hsv(cls, h, s, v):
+        """Colour from hue, saturation and value, each in [0, 1]."""
+        return cls(*(round(c * 255) for c in colorsys.hsv_to_rgb(h, s, v)))
+
+
+class EyePreset(Command):
+    """Select one of the firmware colour presets, e.g. "YELLOW"."""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def opcode(self):
+        return self.name
+
+
+class Squint(Command):
+    """Dim one eye ("L" or "R") to ``level`` percent of the eye colour."""
+    __slots__ = ('eye', 'level')
+    opcode = 'SQUINT'
+
+    def __init__(self, eye, level):
+        self.eye = eye
+        self.level = int(level)
+
+
+class Eyelids(Command):
+    """Open or close both eyelids."""
+    __slots__ = ('open',)
+
+    def __init__(self, open):
+        self.open = bool(open)
+
+    @property
+    def opcode(self):
+        return 'OPEN' if self.open else 'CLOSE'
+
+
+class MoveHead(Command):
+    """Move the head to the absolute position ``(x, y)``."""
+    __slots__ = ('x', 'y')
+    opcode = 'MOVE'
+
+    def __init__(self, x, y):
+        self.x = int(x)
+        self.y = int(y)
+
+
+class Nudge(Command):
+    """Move the head by ``(dx, dy)`` from where it is."""
+    __slots__ = ('dx', 'dy')
+    opcode = 'NUDGE'
+
+    def __init__(self, dx, dy):
+        self.dx = int(dx)
+        self.dy = int(dy)
+
+
+class Home(Command):
+    """Move the head back to its rest position."""
+    __slots__ = ()
+    opcode = 'HOME'
+
+
+class Gesture(Command):
+    """Play a head gesture ("AVL", "AVR") or a choreography by name, see
+    ``ovos_PHAL_tama.choreography``."""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def opcode(self):
+        return self.name
+
+
+class Stop(Command):
+    """Cancel the head gesture that is playing."""
+    __slots__ = ()
+    opcode = 'STOP'
+
+
+class Blink(Command):
+    """Blink both eyes ("b") or only the left ("l") or right ("r") one."""
+    __slots__ = ('side',)
+    opcode = 'BLINK'
+
+    def __init__(self, side='b'):
+        self.side = side
+
+
+class Narrow(Command):
+    """Narrow the eyes until the next eye colour command."""
+    __slots__ = ()
+    opcode = 'NARROW'
+
+
+class Spin(Command):
+    """Spin the eye colour for ``length`` ms, or until cancelled if None."""
+    __slots__ = ('length',)
+    opcode = 'SPIN'
+
+    def __init__(self, length=None):
+        self.length = None if length is None else int(length)
+
+
+class Fill(Command):
+    """Light ``percentage`` percent of the eyes, left eye first."""
+    __slots__ = ('percentage',)
+    opcode = 'FILL'
+
+    def __init__(self, percentage):
+        self.percentage = max(0, min(100, int(percentage)))
+
+
+class Brightness(Command):
+    """Set the eye brightness, ``level`` from 0 to 30."""
+    __slots__ = ('level',)
+    opcode = 'LEVEL'
+
+    def __init__(self, level):
+        self.level = max(0, min(30, int(level)))
+
+
+class SetPixel(Command):
+    """Set eye ``idx`` (0 left, 1 right) to an RGB colour."""
+    __slots__ = ('idx', 'r', 'g', 'b')
+    opcode = 'PIXEL'
+
+    def __init__(self, idx, r, g, b):
+        self.idx = int(idx)
+        self.r = int(r)
+        self.g = int(g)
+        self.b = int(b)
+
+
+class Request(Command):
+    """Ask the head firmware for ``method``, see ``ovos_PHAL_tama.rpc``."""
+    __slots__ = ('id', 'method')
+    opcode = 'RPC'
+
+    def __init__(self, id, method):
+        self.id = int(id)
+        self.method = method
+
+
+# Shared instances, so enqueuing a constant command allocates nothing
+PRESETS = {name: EyePreset(name) for name in EYE_PRESETS}
+GESTURES = {name: Gesture(name) for name in ('SHAKE', 'NOD', 'AVL', 'AVR')}
+
+# Legacy arrow key escapes, taken from the tama_2019 tama.py file
+ARROWS = {
+    '\x1b[D': Nudge(-1, 0),
+    '\x1b[C': Nudge(1, 0),
+    '\x1b[A': Nudge(0, 1),
+    '\x1b[B': Nudge(0, -1)
+}
+
+_CONSTANTS = dict(ARROWS, **PRESETS, **GESTURES, OPEN=Eyelids(True),
+                  CLOSE=Eyelids(False), HOME=Home(), STOP=Stop())
+_CONSTANTS['eyes.narrow'] = Narrow()
+_CONSTANTS['eyes.spin'] = Spin()
+_PARSERS = {
+    'COL': lambda a: SetColor(a[0], a[1], a[2]),
+    'HSV': lambda a: SetColor.from_hsv(float(a[0]), float(a[1]), float(a[2])),
+    'SQUINT': lambda a: Squint(a[0], a[1]),
+    'MOVE': lambda a: MoveHead(a[1], a[3])
+}
+# Mycroft style "eyes.<effect>=<value>" commands
+_EYE_PARSERS = {
+    'eyes.blink': lambda v: Blink(v or 'b'),
+    'eyes.spin': lambda v: Spin(v or None),
+    # 23 is the last pixel of the Mycroft eye ring
+    'eyes.fill': lambda v: Fill(round(int(v) * 100 / 23)),
+    'eyes.level': lambda v: Brightness(v),
+    'eyes.set': lambda v: _pixel(*v.split(','))
+}
+
+
+def _pixel(idx, colour):
+    colour = int(colour)
+    return SetPixel(idx, colour >> 16 & 0xFF, colour >> 8 & 0xFF, colour & 0xFF)
+
+
+def parse(line):
+    """Parse a legacy text command.
+
+    Args:
+        line (str): e.g. "COL:255:0:0", "MOVE:0:12:0:20:" or "eyes.spin=500"
+
+    Returns:
+        Command: the command, or None if the opcode is unknown
+    """
+    line = line.strip()
+    if line in _CONSTANTS:
+        return _CONSTANTS[line]
+    name, _, value = line.partition('=')
+    if name in _EYE_PARSERS:
+        return _EYE_PARSERS[name](value)
+    opcode, *args = line.split(':')
+    if opcode in _CONSTANTS:
+        return _CONSTANTS[opcode]
+    parser = _PARSERS.get(opcode)
+    return parser(args) if parser else None
+
+
+def command_types():
+    """Command classes by name, including those defined by plugins."""
+    types = {}
+    pending = list(Command.__subclasses__())
+    while pending:
+        cls = pending.pop()
+        types[cls.__name__] = cls
+        pending.extend(cls.__subclasses__())
+    return types
+
+
+def encode(command):
+    """``command`` as a list of its class name and fields."""
+    return [type(command).__name__, *command._fields()]
+
+
+def decode(data, types=None):
+    """The command encoded by ``encode``.
+
+    Raises:
+        KeyError: for an unknown command class
+    """
+    name, *fields = data
+    return (types or command_types())[name](*fields)
@@ -0,0 +1,433 @@
+"""
+Emulator of the Tama head firmware.
+
+Speaks the head side of the serial protocol so ``EnclosureWriter`` and
+``EnclosureReader`` (or the whole service) can run without an Arduino:
+
+    E<col><1><0>              eye preset colour
+    T<0|1>                    eyelids closed / open
+    M<sx><x><sy><y><0><0>     head position
+    C<r><g><b><r><g><b>       eye colour
+    <text>\\n                  text command, answered with "Command: <text>"
+
+The emulator attaches either through a pseudo-terminal, whose slave path is
+used as the serial port, or through a pyserial ``loop://`` port that the
+host reads replies from. Bytes in both directions take the time they would
+take on a real link at ``baudrate`` (8N1), so throughput and latency
+measured against the emulator track the real head.
+
+When the host port runs at another rate than the firmware nothing gets
+through in either direction (counted in ``garbled``). ``system.baud=<rate>``
+switches the firmware rate after its reply, up to ``max_baudrate``.
+
+Optionally the firmware takes ``frame_time`` seconds to process each frame
+from a receive buffer of ``rx_buffer`` bytes, dropping what overflows it,
+and with ``ack`` answers every processed frame with ``ack:<type>`` (see
+``ovos_PHAL_tama.flow``). With ``rpc`` it answers ``rpc:<id>:<method>``
+requests (see ``ovos_PHAL_tama.rpc``), otherwise they are echoed like any
+other text command.
+
+    ovos_PHAL_tama_emulator --baudrate 9600
+
+prints the pty path to put in the ``TAMA`` ``port`` config.
+"""
+import argparse
+import os
+import queue
+import select
+import termios
+import time
+import tty
+from collections import deque
+from threading import Condition, Thread
+
+import serial
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.shadow import HOME_POSE
+
+# firmware version reported to ``system.version`` requests
+VERSION = "emulator"
+
+# granularity of the transmission time model, in seconds
+TICK = 0.005
+
+# termios speed constants of the rates the host can set on the pty
+_SPEEDS = {getattr(termios, f"B{rate}"): rate
+           for rate in (1200, 2400, 4800, 9600, 19200, 38400, 57600,
+                        115200, 230400) if hasattr(termios, f"B{rate}")}
+
+
+class LoopbackPort:
+    """
+    Host side of a ``loop://`` attachment.
+
+    Writes go to the emulator; reads return what the emulator sent back,
+    through a pyserial ``loop://`` port. Everything else is delegated to
+    that port, so this can be used wherever a ``serial.Serial`` is.
+    """
+
+    def __init__(self, emulator, timeout=None):
+        self._emulator = emulator
+        self._port = serial.serial_for_url('loop://', timeout=timeout)
+
+    @property
+    def timeout(self):
+        return self._port.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._port.timeout = value
+
+    @property
+    def baudrate(self):
+        return self._port.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self._port.baudrate = value
+
+    def fileno(self):
+        raise OSError("loop:// has no file descriptor")
+
+    def write(self, data):
+        data = bytes(data)
+        self._emulator._inbox.put(data)
+        return len(data)
+
+    def __getattr__(self, name):
+        return getattr(self._port, name)
+
+
+class HeadEmulator(Thread):
+    """
+    Emulated head firmware running in its own thread.
+
+    Args:
+        baudrate (int): modelled link speed, 0 for no transmission delay
+        url (str): "pty" for a pseudo-terminal, "loop://" for a pyserial
+                   loopback port
+        history (int): number of received frames kept in ``frames``
+        ack (bool): acknowledge every processed frame
+        rx_buffer (int): size of the firmware receive buffer in bytes,
+                         None for unlimited
+        frame_time (float): seconds the firmware takes per frame
+        max_baudrate (int): fastest rate ``system.baud`` accepts, None for
+                            any
+        rpc (bool): answer requests with request IDs
+
+    The emulated state is in ``eyes`` (left and right (r, g, b)), ``lids``
+    (True when open) and ``head`` ((x, y)). ``frames`` holds the latest
+    ``(timestamp, frame)`` pairs, timestamped on the ``time.monotonic``
+    clock when they were processed; ``count`` and ``received`` are the
+    totals of frames and bytes, ``overruns`` the bytes dropped because the
+    receive buffer was full.
+    """
+
+    def __init__(self, baudrate=9600, url="pty", history=4096, ack=False,
+                 rx_buffer=None, frame_time=0.0, max_baudrate=None,
+                 rpc=False):
+        super(HeadEmulator, self).__init__(target=self._run)
+        self.daemon = True
+        self.alive = True
+        self._set_rate(baudrate)
+        self.max_baudrate = max_baudrate
+        self.garbled = 0
+        self.eyes = (codec.BASE_COLOURS['N'],) * 2
+        self.lids = False
+        self.head = HOME_POSE
+        self.frames = deque(maxlen=history)
+        self.received = 0
+        self.count = 0
+        self.overruns = 0
+        self.text = []
+        self.ack = ack
+        self.rpc = rpc
+        self.rx_buffer = rx_buffer
+        self.frame_time = frame_time
+        self._pending = bytearray()
+        self._rx = bytearray()
+        self._wire = 0.0
+        self._cond = Condition()
+        self._tx = queue.Queue()
+        self._handlers = {
+            b'E'[0]: self._preset,
+            b'T'[0]: self._lids,
+            b'M'[0]: self._move,
+            b'C'[0]: self._colour
+        }
+        if url == "pty":
+            self._master, self._slave = os.openpty()
+            tty.setraw(self._slave)
+            self.port = os.ttyname(self._slave)
+            self._loop = None
+        elif url == "loop://":
+            self._master = self._slave = None
+            self.port = url
+            self._inbox = queue.Queue()
+            self._loop = LoopbackPort(self)
+        else:
+            raise ValueError("Unsupported emulator url: " + url)
+        Thread(target=self._send_lines, daemon=True).start()
+        self._firmware = None
+        if rx_buffer is not None or frame_time:
+            self._firmware = Thread(target=self._process, daemon=True)
+            self._firmware.start()
+        self.start()
+
+    def connect(self, timeout=1):
+        """Open the host side of the link, as the service would."""
+        if self._loop:
+            self._loop.timeout = timeout
+            self._loop.baudrate = self.baudrate or 9600
+            return self._loop
+        return serial.Serial(self.port, self.baudrate or 9600,
+                             timeout=timeout)
+
+    # firmware
+    def _preset(self, frame):
+        rgb = codec.BASE_COLOURS[chr(frame[1])]
+        self.eyes = (rgb, rgb)
+
+    def _lids(self, frame):
+        self.lids = bool(frame[1])
+
+    def _move(self, frame):
+        if frame == codec.HOME_FRAME:
+            self.head = HOME_POSE
+            return
+        x = -frame[2] if frame[1] == codec.SIGN_POS else frame[2]
+        y = -frame[4] if frame[3] == codec.SIGN_NEG else frame[4]
+        self.head = (x, y)
+
+    def _colour(self, frame):
+        self.eyes = (tuple(frame[1:4]), tuple(frame[4:7]))
+
+    def _set_rate(self, baudrate):
+        self.baudrate = baudrate
+        self.byte_time = codec.BITS_PER_BYTE / baudrate if baudrate else 0
+
+    def _host_rate(self):
+        """Rate the host side of the link is set to, None if unknown."""
+        if self._loop:
+            return self._loop.baudrate
+        try:
+            return _SPEEDS.get(termios.tcgetattr(self._slave)[5])
+        except termios.error:
+            return None
+
+    def _mismatched(self):
+        host = self._host_rate()
+        return bool(self.baudrate and host and host != self.baudrate)
+
+    def _answer(self, method):
+        if method == "system.version":
+            return VERSION
+        if method == "head.pos":
+            return "{},{}".format(*self.head)
+        if method == "eyes.rgb":
+            return ",".join(str(c) for rgb in self.eyes for c in rgb)
+        if method == "eyes.lids":
+            return "1" if self.lids else "0"
+        return "!unknown method " + method
+
+    def _command(self, line):
+        self.text.append(line)
+        if self.rpc and line.startswith("rpc:"):
+            request_id, _, method = line[4:].partition(":")
+            self.send_line(f"rpc:{request_id}:{self._answer(method)}")
+            return
+        if line.startswith("system.baud="):
+            rate = int(line.split("=")[1])
+            if self.max_baudrate and rate > self.max_baudrate:
+                return
+            self.send_line("Command: " + line)
+            self._tx.put(lambda: self._set_rate(rate))
+            return
+        self.send_line("Command: " + line)
+
+    def feed(self, data, timestamp=None):
+        """Process bytes received from the host."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        buf = self._pending
+        buf += data
+        done = []
+        while buf:
+            size = codec.FRAME_SIZES.get(buf[0])
+            if size is None:
+                end = buf.find(b'\n')
+                if end < 0:
+                    break
+                line = bytes(buf[:end]).rstrip(b'\r')
+                del buf[:end + 1]
+                if line:
+                    self._command(line.decode('utf-8', errors='replace'))
+                continue
+            if len(buf) < size:
+                break
+            frame = bytes(buf[:size])
+            del buf[:size]
+            self._handlers[frame[0]](frame)
+            done.append((timestamp, frame))
+            if self.ack:
+                self.send_line("ack:" + chr(frame[0]))
+        with self._cond:
+            self.received += len(data)
+            self.count += len(done)
+            self.frames.extend(done)
+            self._cond.notify_all()
+
+    # host link
+    def send_line(self, line):
+        """Send a line to the host, e.g. a "unit.shutdown" report."""
+        self._tx.put((line + "\r\n").encode())
+
+    def _send_lines(self):
+        while self.alive:
+            try:
+                data = self._tx.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if callable(data):
+                data()
+                continue
+            time.sleep(len(data) * self.byte_time)
+            if self._mismatched():
+                self.garbled += len(data)
+                continue
+            try:
+                if self._loop:
+                    self._loop._port.write(data)
+                else:
+                    os.write(self._master, data)
+            except OSError:
+                break
+
+    def report(self, name):
+        """Report a button or unit event, e.g. "unit.reboot"."""
+        self.send_line(name)
+
+    def _transmit(self, data):
+        """Wait until ``data`` would have arrived over the link."""
+        now = time.monotonic()
+        self._wire = max(self._wire, now) + len(data) * self.byte_time
+        if self._wire > now:
+            time.sleep(self._wire - now)
+        if self._mismatched():
+            self.garbled += len(data)
+            return
+        if self._firmware is None:
+            self.feed(data, self._wire)
+            return
+        with self._cond:
+            room = len(data)
+            if self.rx_buffer is not None:
+                room = min(room, max(0, self.rx_buffer - len(self._rx)))
+            self._rx += data[:room]
+            self.overruns += len(data) - room
+            self._cond.notify_all()
+
+    def _unit(self):
+        """Length of the complete frame or line at the head of the receive
+        buffer, 0 if it is still incomplete."""
+        if not self._rx:
+            return 0
+        size = codec.FRAME_SIZES.get(self._rx[0])
+        if size is None:
+            return self._rx.find(b'\n') + 1
+        return size if len(self._rx) >= size else 0
+
+    def _process(self):
+        """Firmware loop, consuming the receive buffer one frame at a time."""
+        while self.alive:
+            with self._cond:
+                if not self._cond.wait_for(self._unit, 0.1):
+                    continue
+                size = self._unit()
+            # the frame holds its buffer space until it has been handled
+            time.sleep(self.frame_time)
+            with self._cond:
+                unit = bytes(self._rx[:size])
+                del self._rx[:size]
+            self.feed(unit)
+
+    def _chunks(self, data):
+        step = int(TICK / self.byte_time) if self.byte_time else len(data)
+        step = max(1, step)
+        for i in range(0, len(data), step):
+            yield data[i:i + step]
+
+    def _receive(self):
+        if self._loop:
+            try:
+                return self._inbox.get(timeout=0.1)
+            except queue.Empty:
+                return b''
+        ready, _, _ = select.select([self._master], [], [], 0.1)
+        if not ready:
+            return b''
+        chunk = int(TICK / self.byte_time) if self.byte_time else 4096
+        return os.read(self._master, max(1, chunk))
+
+    def _run(self):
+        while self.alive:
+            try:
+                data = self._receive()
+            except OSError:
+                break
+            for chunk in self._chunks(data):
+                self._transmit(chunk)
+
+    def wait_for(self, count, timeout=5):
+        """Block until ``count`` frames were received in total.
+
+        Returns:
+            bool: False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.count >= count,
+                                       timeout)
+
+    def stop(self):
+        self.alive = False
+        self.join(1)
+        if self._master is not None:
+            os.close(self._master)
+            os.close(self._slave)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Emulate the Tama head firmware on a pseudo-terminal")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    parser.add_argument("--ack", action="store_true",
+                        help="acknowledge every frame (writer flow config)")
+    parser.add_argument("--rx-buffer", type=int,
+                        help="firmware receive buffer size in bytes")
+    parser.add_argument("--frame-time", type=float, default=0.0,
+                        help="seconds the firmware takes per frame")
+    parser.add_argument("--max-baudrate", type=int,
+                        help="fastest rate system.baud switches to")
+    parser.add_argument("--rpc", action="store_true",
+                        help="answer rpc:<id>:<method> requests")
+    args = parser.parse_args(argv)
+    emulator = HeadEmulator(args.baudrate, ack=args.ack,
+                            rx_buffer=args.rx_buffer,
+                            frame_time=args.frame_time,
+                            max_baudrate=args.max_baudrate, rpc=args.rpc)
+    print(emulator.port, flush=True)
+    try:
+        while True:
+            count = emulator.count
+            time.sleep(1)
+            if emulator.count != count:
+                print(f"eyes {emulator.eyes} lids "
+                      f"{'open' if emulator.lids else 'closed'} "
+                      f"head {emulator.head}", flush=True)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,23 @@ from ovos_utils.log import LOG
 
 from pathlib import Path
 
+from ovos_PHAL_tama.commands import PRESETS, GESTURES, Blink, Brightness, \
+    Eyelids, Fill, Gesture, Home, MoveHead, Narrow, SetColor, SetPixel, \
+    Spin, Stop, parse
+
+OPEN = Eyelids(True)
+CLOSE = Eyelids(False)
+HOME = Home()
+STOP = Stop()
+NARROW = Narrow()
+SPIN = Spin()
+# interaction state expressions, defined in choreography.json
+TALK = Gesture("TALK")
+TALK_OVER = Gesture("TALK_OVER")
+THINK = Gesture("THINK")
+LISTEN = Gesture("LISTEN")
+
+
 class EnclosureEyes:
     """
     Listens to enclosure commands for Tama's Eyes
@@ -42,6 +59,7 @@ class EnclosureEyes:
 
     def __init_events(self):
         self.bus.on('enclosure.eyes.on', self.on)
+        self.bus.on('enclosure.gesture.play', self.play_gesture)
         self.bus.on('enclosure.eyes.off', self.off)
         self.bus.on('enclosure.eyes.blink', self.blink)
         self.bus.on('enclosure.eyes.narrow', self.narrow)
@@ -98,32 +116,42 @@ class EnclosureEyes:
         Returns:
            (list) list of (r,g,b) tuples for each eye pixel
         """
+        # the writer's shadow knows what the eyes show, presets included,
+        # a broker client has no shadow
+        shadow = getattr(self.writer, "shadow", None)
+        pixels = (shadow and shadow.pixels()) or self._current_rgb
         self.bus.emit(message.reply("enclosure.eyes.rgb",
-                                    {"pixels": self._current_rgb}))
+                                    {"pixels": pixels}))
 
     def on(self, event=None):
-        self.writer.write("OPEN")
+        self.writer.write(OPEN)
         self.isOpen = True
 
     def off(self, event=None):
-        self.writer.write("CLOSE")
+        self.writer.write(CLOSE)
         self.isOpen = False
 
     def blink(self, event=None):
         side = "b"
         if event and event.data:
             side = event.data.get("side", side)
-        self.writer.write("eyes.blink=" + side)
+        self.writer.write(Blink(side))
 
     def narrow(self, event=None):
-        self.writer.write("eyes.narrow")
+        self.writer.write(NARROW)
 
     def look(self, event=None):
         if event and event.data:
-            #side = event.data.get("data", "")
             LOG.info("Trying to look at "+str(event.data))
             if(self.automove):
-                self.writer.write(event.data)
+                if "x" in event.data:
+                    self.writer.write(MoveHead(event.data["x"],
+                                               event.data.get("y", 0)))
+                else:
+                    # older senders only put a "MOVE:..." string in "data"
+                    command = parse(event.data.get("data", ""))
+                    if command:
+                        self.writer.write(command)
                 
     def toggleAutoLook(self, event=None):
         self.automove = not self.automove
@@ -160,22 +188,26 @@ class EnclosureEyes:
         
 
     def talk(self, event=None):
-        self.writer.write("PINK")
+        self.writer.write(TALK)
 
     #changed from green to yellow
     def talkOver(self, event=None):
-        self.writer.write("YELLOW") # this is too short flash after the speaker finishes
+        self.writer.write(TALK_OVER) # this is too short flash after the speaker finishes
 
     #CHANGED from blu and the AVR is commented 
     def think(self, event=None):
-        #self.writer.write("BLUE")
         if(self.automove):
-            self.writer.write("AVR")
+            self.writer.write(GESTURES["AVR"])
         else:
-            self.writer.write("YELLOW")
+            self.writer.write(THINK)
 
     def listen(self, event=None):
-        self.writer.write("YELLOW")
+        self.writer.write(LISTEN)
+
+    def play_gesture(self, event=None):
+        """Play a gesture or choreography by ``name``."""
+        if event and event.data.get("name"):
+            self.writer.write(Gesture(event.data["name"]))
 
 
     def color(self, event=None):
@@ -184,42 +216,42 @@ class EnclosureEyes:
             r = int(event.data.get("r", r))
             g = int(event.data.get("g", g))
             b = int(event.data.get("b", b))
-        color = (r * 65536) + (g * 256) + b
         self._current_rgb = [(r, g, b) for i in range(self._num_pixels)]
         LOG.info("Changing color " + str(event.data))
-        self.writer.write("COL:" + str(r) + ":" + str(g) + ":" + str(b))
+        self.writer.write(SetColor(r, g, b))
 
     def yellow(self, event=None):
         #self._current_rgb = [(r, g, b) for i in range(self._num_pixels)]
         #should update these calles to use the real colour set function
-        self.writer.write("YELLOW")
+        self.writer.write(PRESETS["YELLOW"])
 
     def green(self, event=None):
-        self.writer.write("GREEN")
+        self.writer.write(PRESETS["GREEN"])
 
     def avr(self, event=None):
-        self.writer.write("AVR")
+        self.writer.write(GESTURES["AVR"])
 
     def avl(self, event=None):
-        self.writer.write("AVL")
+        self.writer.write(GESTURES["AVL"])
 
     def pink(self, event=None):
-        self.writer.write("PINK")
+        self.writer.write(PRESETS["PINK"])
 
     def blue(self, event=None):
-        self.writer.write("BLUE")
+        self.writer.write(PRESETS["BLUE"])
 
     def none(self, event=None):
-        self.writer.write("NONE")
+        self.writer.write(PRESETS["NONE"])
 
 
 
     def close(self, event=None):   
         #self._current_rgb = [(r, g, b) for i in range(self._num_pixels)]
         #should update these calles to use the real colour set function
-        self.writer.write("HOME")
-        self.writer.write("NONE")
-        self.writer.write("CLOSE")        
+        self.writer.write(STOP)
+        self.writer.write(HOME)
+        self.writer.write(PRESETS["NONE"])
+        self.writer.write(CLOSE)        
 
     def set_pixel(self, event=None):
         idx = 0
@@ -230,67 +262,60 @@ class EnclosureEyes:
             g = int(event.data.get("g", g))
             b = int(event.data.get("b", b))
         self._current_rgb[idx] = (r, g, b)
-        color = (r * 65536) + (g * 256) + b
-        self.writer.write("eyes.set=" + str(idx) + "," + str(color))
+        self.writer.write(SetPixel(idx, r, g, b))
 
     def fill(self, event=None):
-        amount = 0
+        percent = 0
         if event and event.data:
             percent = int(event.data.get("percentage", 0))
-            amount = int(round(23.0 * percent / 100.0))
-        self.writer.write("eyes.fill=" + str(amount))
+        self.writer.write(Fill(percent))
 
     def brightness(self, event=None):
         level = 30
         if event and event.data:
             level = event.data.get("level", level)
-        self.writer.write("eyes.level=" + str(level))
+        self.writer.write(Brightness(level))
 
     def shake(self):
-        self.writer.write("PINK")
-        self.writer.write("SHAKE")
+        # pink while shaking, then green: both are SHAKE keyframes, queued
+        # colours would not wait for the gesture
+        self.writer.write(GESTURES["SHAKE"])
         if(self.automove):
-            self.writer.write("HOME")
-        self.writer.write("GREEN")
+            self.writer.write(HOME)
 
 
     def volume(self, event=None):
         volume = 4
         if event and event.data:
             volume = event.data.get("volume", volume)
-        self.writer.write("eyes.volume=" + str(volume))
+        # shown like the Mycroft eye ring, as a fill of 11 steps
+        self.writer.write(Fill(int(volume) * 100 / 11))
 
     def reset(self, event=None):
         if self.isOpen == True:
-            self.writer.write("CLOSE")
+            self.writer.write(CLOSE)
             self.isOpen = False
             
         if self.isOpen == False:
-            self.writer.write("OPEN")
+            self.writer.write(OPEN)
             self.isOpen = True
 
         if(self.automove):
-            self.writer.write("HOME")
-        self.writer.write("YELLOW") #changed from green
+            self.writer.write(HOME)
+        self.writer.write(PRESETS["YELLOW"]) #changed from green
 
     def spin(self, event=None):
-        self.writer.write("eyes.spin")
+        self.writer.write(SPIN)
 
     def timed_spin(self, event=None):
         length = 5000
         if event and event.data:
             length = event.data.get("length", length)
-        self.writer.write("eyes.spin=" + str(length))
+        self.writer.write(Spin(length))
 
     def move(self, event):
         #this ethod should move the head and send the data on the bus after the msg is sent from webscoket
-        #LOG.info(str(event.data['pos']))
-        x_sign = 0 
-        x_m = event.data['pos']
-        y_sign = 0
-        y_m = event.data['posvertical']
-        update_pos='MOVE:'+str(x_sign)+":"+str(x_m)+":"+str(y_sign)+":"+str(y_m)+":\n"
-        self.writer.write(update_pos)
+        self.writer.write(MoveHead(event.data['pos'], event.data['posvertical']))
 
     def trialStart():
         LOG.info('Trial started')
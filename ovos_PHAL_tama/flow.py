@@ -0,0 +1,149 @@
+"""
+Acknowledged flow control for the head link.
+
+Firmware that supports it answers every frame it has processed with an
+``ack:<type>`` line, ``<type>`` being the leading byte of the frame (``E``,
+``T``, ``M`` or ``C``). Frames are processed in order, so acknowledgements
+are matched to the oldest outstanding frame of that type.
+
+The writer takes a credit from a ``CreditWindow`` before every frame and
+blocks while ``window`` frames are unacknowledged, so it only sends what
+the head can absorb and commands keep coalescing in the queue meanwhile.
+Frames not acknowledged within ``timeout`` are counted as lost and give
+their credit back, so a firmware without acks degrades to one window per
+timeout instead of stalling.
+"""
+import time
+from collections import deque
+from threading import Condition
+
+ACK_PREFIX = "ack:"
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class CreditWindow:
+    """
+    Tracks unacknowledged frames against a credit window.
+
+    Args:
+        window (int): frames that may be in flight
+        timeout (float): seconds before an unacknowledged frame is lost
+        clock (callable): monotonic time source, in seconds
+        history (int): round trip times kept for the percentiles
+    """
+
+    def __init__(self, window=4, timeout=1.0, clock=time.monotonic,
+                 history=256):
+        self.window = window
+        self.timeout = timeout
+        self.clock = clock
+        self.acked = 0
+        self.lost = 0
+        self.stalls = 0
+        self._outstanding = deque()
+        self._rtts = deque(maxlen=history)
+        self._by_opcode = {}
+        self._cond = Condition()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("window", 4), config.get("timeout", 1.0))
+
+    @property
+    def outstanding(self):
+        return len(self._outstanding)
+
+    def _expire(self, now):
+        while self._outstanding and \
+                now - self._outstanding[0][2] >= self.timeout:
+            self._outstanding.popleft()
+            self.lost += 1
+
+    def available(self):
+        """True if a frame may be sent without waiting."""
+        with self._cond:
+            self._expire(self.clock())
+            return len(self._outstanding) < self.window
+
+    def acquire(self):
+        """Block until a frame may be sent.
+
+        Waits at most ``timeout``: by then the oldest outstanding frame is
+        counted as lost and its credit returned.
+        """
+        with self._cond:
+            self._expire(self.clock())
+            if len(self._outstanding) < self.window:
+                return
+            self.stalls += 1
+            while len(self._outstanding) >= self.window:
+                wait = self._outstanding[0][2] + self.timeout - self.clock()
+                if wait > 0:
+                    self._cond.wait(wait)
+                self._expire(self.clock())
+
+    def sent(self, opcode, frame):
+        """Record ``frame`` as written and waiting for its acknowledgement."""
+        with self._cond:
+            self._outstanding.append((frame[0], opcode, self.clock()))
+
+    def ack(self, frame_type):
+        """Match an acknowledgement for a frame starting with ``frame_type``.
+
+        Older outstanding frames of another type were dropped by the head
+        and are counted as lost.
+
+        Returns:
+            float: round trip time in seconds, None if nothing matched
+        """
+        code = ord(frame_type)
+        with self._cond:
+            if not any(entry[0] == code for entry in self._outstanding):
+                return None
+            while True:
+                entry_code, opcode, sent = self._outstanding.popleft()
+                if entry_code == code:
+                    break
+                self.lost += 1
+            rtt = self.clock() - sent
+            self.acked += 1
+            self._rtts.append(rtt)
+            count, total, worst = self._by_opcode.get(opcode, (0, 0.0, 0.0))
+            self._by_opcode[opcode] = (count + 1, total + rtt, max(worst, rtt))
+            self._cond.notify_all()
+            return rtt
+
+    def handle_line(self, line):
+        """Feed a line read from the head, True if it was an ack."""
+        if not line.startswith(ACK_PREFIX) or len(line) <= len(ACK_PREFIX):
+            return False
+        self.ack(line[len(ACK_PREFIX)])
+        return True
+
+    def stats(self):
+        with self._cond:
+            rtts = list(self._rtts)
+            return {
+                "window": self.window,
+                "outstanding": len(self._outstanding),
+                "acked": self.acked,
+                "lost": self.lost,
+                "stalls": self.stalls,
+                "rtt_p50_ms": _ms(_percentile(rtts, 50)),
+                "rtt_p99_ms": _ms(_percentile(rtts, 99)),
+                "rtt": {opcode: {"count": count,
+                                 "mean_ms": total / count * 1000,
+                                 "max_ms": worst * 1000}
+                        for opcode, (count, total, worst)
+                        in self._by_opcode.items()}
+            }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
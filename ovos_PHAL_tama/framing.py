@@ -0,0 +1,59 @@
+"""
+Line framing of the bytes read from the head.
+
+The firmware ends its lines with CRLF, but LF alone is accepted too.
+Readers hand ``LineFramer.feed`` whatever the port had available and get
+back the lines completed by it; a partial line stays in the buffer until
+the rest arrives.
+"""
+from ovos_utils.log import LOG
+
+# longest line kept while waiting for its end, anything longer is noise
+# (e.g. the head running at another baud rate)
+MAX_LINE = 4096
+
+
+class LineFramer:
+    """
+    Splits a byte stream into lines ending in LF or CRLF.
+
+    Args:
+        max_line (int): bytes buffered without a line end before they are
+                        dropped
+    """
+
+    def __init__(self, max_line=MAX_LINE):
+        self.max_line = max_line
+        self.dropped = 0
+        self._buffer = bytearray()
+        # the buffer up to here holds no line end
+        self._scanned = 0
+
+    def feed(self, data):
+        """Add ``data``, return the complete non-empty lines as bytes,
+        without their line ends."""
+        buffer = self._buffer
+        buffer += data
+        lines = []
+        start = 0
+        end = buffer.find(b'\n', self._scanned)
+        while end >= 0:
+            line = bytes(buffer[start:end]).rstrip(b'\r')
+            if line:
+                lines.append(line)
+            start = end + 1
+            end = buffer.find(b'\n', start)
+        if start:
+            del buffer[:start]
+        if len(buffer) > self.max_line:
+            LOG.warning(f"Dropping {len(buffer)} bytes read from the head "
+                        f"without a line end")
+            self.dropped += len(buffer)
+            buffer.clear()
+        self._scanned = len(buffer)
+        return lines
+
+    def clear(self):
+        """Forget a partial line, e.g. after reconnecting."""
+        self._buffer.clear()
+        self._scanned = 0
@@ -0,0 +1,130 @@
+"""
+Flight recorder for the head serial link.
+
+Keeps the last N commands written to the head in a fixed-size ring buffer:
+when each was sent, its opcode, the encoded frame and how long it waited in
+the writer queue. Records are packed into one preallocated ``bytearray``, so
+recording allocates nothing and memory use is constant however long the
+service runs.
+
+The buffer can be dumped over the bus (``enclosure.recorder.dump``) either
+as a list of entries or as a compact binary snapshot written to a file:
+
+    ovos_PHAL_tama_recorder dump /tmp/head.bin
+    ovos_PHAL_tama_recorder show /tmp/head.bin
+"""
+import argparse
+import struct
+import time
+from threading import Lock
+
+MAGIC = b'TAMAFR1\x00'
+_HEADER = struct.Struct('<8sI')
+# timestamp, queue wait, opcode, frame length, frame
+_RECORD = struct.Struct('<df8sB23s')
+MAX_FRAME = 23
+
+
+class FlightRecorder:
+    """
+    Ring buffer of the most recent commands sent to the head.
+
+    Args:
+        size (int): number of commands kept
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self._buf = bytearray(size * _RECORD.size)
+        self._next = 0
+        self._count = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return self._count
+
+    def record(self, opcode, frame, wait=0.0, timestamp=None):
+        """Store one command, overwriting the oldest once full.
+
+        Frames longer than ``MAX_FRAME`` bytes are truncated.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        frame = frame[:MAX_FRAME]
+        with self._lock:
+            _RECORD.pack_into(self._buf, self._next * _RECORD.size,
+                              timestamp, wait, opcode.encode()[:8],
+                              len(frame), frame)
+            self._next = (self._next + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+
+    def snapshot(self):
+        """Binary snapshot of the buffer, oldest record first."""
+        with self._lock:
+            start = (self._next - self._count) % self.size * _RECORD.size
+            end = self._next * _RECORD.size
+            if self._count < self.size:
+                records = self._buf[start:end]
+            else:
+                records = self._buf[end:] + self._buf[:end]
+            return _HEADER.pack(MAGIC, self._count) + bytes(records)
+
+    def entries(self):
+        """The buffer as a list of dicts, oldest first."""
+        return load(self.snapshot())
+
+    def clear(self):
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+
+def load(snapshot):
+    """Decode a binary snapshot into a list of entry dicts."""
+    magic, count = _HEADER.unpack_from(snapshot)
+    if magic != MAGIC:
+        raise ValueError("Not a flight recorder snapshot")
+    entries = []
+    for i in range(count):
+        timestamp, wait, opcode, length, frame = _RECORD.unpack_from(
+            snapshot, _HEADER.size + i * _RECORD.size)
+        entries.append({"timestamp": timestamp,
+                        "wait": wait,
+                        "opcode": opcode.rstrip(b'\x00').decode(),
+                        "frame": frame[:length].hex()})
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Dump or decode the Tama head flight recorder")
+    sub = parser.add_subparsers(dest="action", required=True)
+    dump = sub.add_parser("dump", help="ask the running service for a snapshot")
+    dump.add_argument("path", help="file the service writes the snapshot to")
+    show = sub.add_parser("show", help="print a snapshot file")
+    show.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.action == "dump":
+        from ovos_bus_client import Message
+        from ovos_bus_client.client import MessageBusClient
+        bus = MessageBusClient()
+        bus.run_in_thread()
+        bus.connected_event.wait(10)
+        reply = bus.wait_for_response(
+            Message("enclosure.recorder.dump", {"path": args.path}),
+            "enclosure.recorder")
+        bus.close()
+        if not reply:
+            parser.exit(1, "No reply from the Tama PHAL service\n")
+    with open(args.path, "rb") as f:
+        snapshot = f.read()
+    for entry in load(snapshot):
+        stamp = time.strftime("%H:%M:%S", time.localtime(entry["timestamp"]))
+        print(f"{stamp}.{int(entry['timestamp'] * 1000) % 1000:03d} "
+              f"{entry['opcode']!r:<10} wait {entry['wait'] * 1000:7.1f} ms "
+              f"{entry['frame']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Request/response calls to the head firmware.
+
+A request is the text line ``rpc:<id>:<method>``, queued on the writer
+like any other command, and the firmware answers ``rpc:<id>:<result>``, or
+``rpc:<id>:!<message>`` for an error. The ``EnclosureReader`` hands every
+line to ``HeadRpc.handle_line``, which completes the ``Future`` returned for
+that request ID. Firmware that does not know the protocol echoes the line
+as ``Command: rpc:<id>:<method>``; the call then fails at once with
+``RpcError`` instead of waiting for its timeout.
+
+Methods answered by the firmware (and ``HeadEmulator(rpc=True)``):
+
+    system.version    firmware version
+    head.pos          "x,y" head position
+    eyes.rgb          "r,g,b,r,g,b" left then right eye colour
+    eyes.lids         "1" if the eyelids are open, "0" if closed
+
+Round trip times are kept per method for the stats, and the bus can query
+the head with ``enclosure.head.query`` ``{"method": ...}``.
+"""
+import itertools
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from threading import Lock, Timer
+
+from ovos_utils.log import LOG
+
+from ovos_PHAL_tama.commands import Request
+from ovos_PHAL_tama.flow import _ms, _percentile
+
+RPC_PREFIX = "rpc:"
+_UNSUPPORTED = "Command: " + RPC_PREFIX
+# request IDs wrap around, far beyond the requests ever outstanding
+MAX_ID = 10000
+
+
+class RpcError(Exception):
+    """The head answered a request with an error."""
+
+
+class HeadRpc:
+    """
+    Correlates requests to the head with their replies.
+
+    Args:
+        writer (EnclosureWriter): writer the requests are queued on
+        bus (MessageBusClient): answers ``enclosure.head.query`` if given
+        timeout (float): default seconds to wait for a reply
+        clock (callable): monotonic time source, in seconds
+        history (int): round trip times kept for the percentiles
+    """
+
+    def __init__(self, writer, bus=None, timeout=1.0, clock=time.monotonic,
+                 history=256):
+        self.writer = writer
+        self.timeout = timeout
+        self.clock = clock
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._rtts = deque(maxlen=history)
+        self._by_method = {}
+        self._lock = Lock()
+        if bus:
+            self.bus = bus
+            bus.on("enclosure.head.query", self.handle_query)
+
+    def _expire(self, now):
+        """Take the requests nobody answered within the timeout.
+
+        Returns:
+            list: (future, exception) pairs to complete outside the lock
+        """
+        expired = [request_id for request_id, (_, _, sent)
+                   in self._pending.items() if now - sent >= self.timeout]
+        failures = []
+        for request_id in expired:
+            future, method, _ = self._pending.pop(request_id)
+            self.timeouts += 1
+            failures.append((future, TimeoutError(f"No reply to {method}")))
+        return failures
+
+    def expire(self):
+        """Fail the requests nobody answered within the timeout."""
+        with self._lock:
+            failures = self._expire(self.clock())
+        for future, error in failures:
+            future.set_exception(error)
+
+    def call(self, method):
+        """Send a request without waiting.
+
+        Returns:
+            Future: resolves to the reply text, fails with ``RpcError`` or,
+                    once ``timeout`` has passed, ``TimeoutError``
+        """
+        self.expire()
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids) % MAX_ID
+            self._pending[request_id] = (future, method, self.clock())
+        self.writer.write(Request(request_id, method))
+        return future
+
+    def query(self, method, timeout=None):
+        """Send a request and wait for the reply text."""
+        timeout = self.timeout if timeout is None else timeout
+        future = self.call(method)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            with self._lock:
+                for request_id, entry in list(self._pending.items()):
+                    if entry[0] is future:
+                        del self._pending[request_id]
+                        self.timeouts += 1
+            raise
+
+    def version(self, timeout=None):
+        return self.query("system.version", timeout)
+
+    def head_position(self, timeout=None):
+        """(x, y) the head servos are at."""
+        x, y = self.query("head.pos", timeout).split(",")
+        return int(x), int(y)
+
+    def eye_colours(self, timeout=None):
+        """(r, g, b) the left and right eye show."""
+        values = [int(v) for v in self.query("eyes.rgb", timeout).split(",")]
+        return tuple(values[:3]), tuple(values[3:6])
+
+    def handle_line(self, line):
+        """Feed a line read from the head, True if it was an RPC reply."""
+        if line.startswith(RPC_PREFIX):
+            unsupported = False
+            body = line[len(RPC_PREFIX):]
+        elif line.startswith(_UNSUPPORTED):
+            unsupported = True
+            body = line[len(_UNSUPPORTED):]
+        else:
+            return False
+        request_id, _, result = body.partition(":")
+        try:
+            request_id = int(request_id)
+        except ValueError:
+            return False
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+            if entry is None:
+                LOG.debug(f"Reply to an unknown request: {line}")
+                return True
+            future, method, sent = entry
+            if unsupported or result.startswith("!"):
+                self.failed += 1
+            else:
+                rtt = self.clock() - sent
+                self.completed += 1
+                self._rtts.append(rtt)
+                count, total, worst = self._by_method.get(method,
+                                                          (0, 0.0, 0.0))
+                self._by_method[method] = (count + 1, total + rtt,
+                                           max(worst, rtt))
+        # done callbacks run here, outside the lock
+        if unsupported:
+            future.set_exception(
+                RpcError(f"{method} is not supported by the firmware"))
+        elif result.startswith("!"):
+            future.set_exception(RpcError(result[1:]))
+        else:
+            future.set_result(result)
+        return True
+
+    def handle_query(self, message):
+        """Reply with ``result`` or ``error`` once the head answered."""
+        method = message.data.get("method")
+        if not method:
+            return
+
+        def reply(future):
+            try:
+                data = {"method": method, "result": future.result()}
+            except Exception as e:
+                data = {"method": method, "error": str(e) or repr(e)}
+            self.bus.emit(message.reply("enclosure.head.query.response",
+                                        data))
+
+        self.call(method).add_done_callback(reply)
+        # without a reply, nothing else may come along to expire it
+        timer = Timer(self.timeout + 0.1, self.expire)
+        timer.daemon = True
+        timer.start()
+
+    def stats(self):
+        self.expire()
+        with self._lock:
+            rtts = list(self._rtts)
+            return {
+                "pending": len(self._pending),
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "rtt_p50_ms": _ms(_percentile(rtts, 50)),
+                "rtt_p99_ms": _ms(_percentile(rtts, 99)),
+                "rtt": {method: {"count": count,
+                                 "mean_ms": total / count * 1000,
+                                 "max_ms": worst * 1000}
+                        for method, (count, total, worst)
+                        in self._by_method.items()}
+            }
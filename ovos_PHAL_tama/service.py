@@ -16,8 +16,14 @@ from threading import Thread, Timer
 import serial
 import colorsys
 from ovos_PHAL_tama.arduino import EnclosureReader, EnclosureWriter
+from ovos_PHAL_tama.baud import DEFAULT_RATE, RATES, select_rate
+from ovos_PHAL_tama.broker import BrokerClient, EventTee, SerialBroker
+from ovos_PHAL_tama.rpc import HeadRpc
+from ovos_PHAL_tama.snapshot import state_path
+from ovos_PHAL_tama.supervisor import SerialSupervisor
 #from ovos_PHAL_tama.arduino import EnclosureArduino
 from ovos_PHAL_tama.eyes import EnclosureEyes
+from ovos_PHAL_tama.transport import AsyncSerialTransport
 from ovos_PHAL_tama.gaze import EnclosureGaze
 
 
@@ -77,9 +83,14 @@ class PHAL(OVOSAbstractApplication):
             "timeout": 5
         }  # TODO
         self.drivers = {}
-        self.__init_serial()
-        self.reader = EnclosureReader(self.serial, self.bus)
-        self.writer = EnclosureWriter(self.serial, self.bus)
+        self.broker = None
+        broker_config = self.config.get("broker") or {}
+        if broker_config.get("connect"):
+            # another service owns the port, share it through its broker
+            self.serial = self.transport = self.reader = self.rpc = None
+            self.writer = BrokerClient(broker_config["path"], skill_id)
+        else:
+            self.__init_link(broker_config)
         self.status.bind(self.bus)
 
         self.bus.on("enclosure.started", self.on_arduino_responded)
@@ -97,6 +108,36 @@ class PHAL(OVOSAbstractApplication):
         self.arduino_responded = True
 
 
+    def __init_link(self, broker_config):
+        self.__init_serial()
+        if self.config.get("transport") == "asyncio":
+            # one event loop thread handles both directions of the link
+            self.transport = AsyncSerialTransport(self.serial)
+            link = self.transport
+        else:
+            self.transport = None
+            link = self.serial
+        writer_config = dict(self.config.get("writer") or {},
+                             baudrate=int(self.rate))
+        snapshot = writer_config.get("snapshot") or {}
+        if snapshot.get("restore"):
+            # saving only pays off when the next start restores the state
+            writer_config["snapshot"] = dict({"path": state_path()},
+                                             **snapshot)
+        self.writer = EnclosureWriter(link, self.bus, config=writer_config)
+        events = self.bus
+        if broker_config.get("path"):
+            self.broker = SerialBroker(self.writer, broker_config["path"],
+                                       broker_config)
+            self.writer.broker = self.broker
+            events = EventTee(self.bus, self.broker)
+        self.rpc = HeadRpc(self.writer, self.bus,
+                           self.config.get("rpc_timeout", 1.0))
+        self.writer.rpc = self.rpc
+        self.reader = EnclosureReader(self.serial, events,
+                                      transport=self.transport,
+                                      flow=self.writer.flow, rpc=self.rpc)
+
     def __init_serial(self):
         try:
             #For TAMA these should be '/dev/ttyS0',9600)#IK0312
@@ -106,8 +147,14 @@ class PHAL(OVOSAbstractApplication):
             self.rate = self.config.get("rate")
             #self.rate = 9600
             self.timeout = self.config.get("timeout")
-            self.serial = serial.serial_for_url(
-                url=self.port, baudrate=self.rate, timeout=self.timeout)
+            reconnect = self.config.get("reconnect", {})
+            if self.config.get("transport") == "asyncio" or \
+                    reconnect is False:
+                # the event loop holds on to the port's file descriptor
+                self.serial = self.__open_serial()
+            else:
+                self.serial = SerialSupervisor.from_config(
+                    self.__open_serial, self.port, reconnect or {})
             LOG.info("Connected to: %s rate: %s timeout: %s" %
                      (self.port, self.rate, self.timeout))
         except Exception:
@@ -115,6 +162,17 @@ class PHAL(OVOSAbstractApplication):
                       str(self.port))
             raise
 
+    def __open_serial(self):
+        if str(self.config.get("rate")) == "auto":
+            port = serial.serial_for_url(
+                url=self.port, baudrate=DEFAULT_RATE, timeout=0.1)
+            self.rate = select_rate(port, self.port,
+                                    self.config.get("rates") or RATES)
+            port.timeout = self.timeout
+            return port
+        return serial.serial_for_url(
+            url=self.port, baudrate=self.rate, timeout=self.timeout)
+
     def __register_events(self):
         self.bus.on('enclosure.reset', self.__reset)
 
@@ -131,12 +189,16 @@ class PHAL(OVOSAbstractApplication):
             # There is nothing on the other end of the serial port
             # close these serial-port readers and this process
             self.writer.stop()
-            self.serial.close()
+            self.__stop_transport()
+            if self.serial:
+                self.serial.close()
             self.bus.close()
 
     def stop(self):
         self.eyes.close()
         self.gaze.shutdown()
+        if self.broker:
+            self.broker.stop()
 
 
     def load_plugins(self):
@@ -166,3 +228,11 @@ class PHAL(OVOSAbstractApplication):
 
     def shutdown(self):
         self.status.set_stopping()
+        self.writer.stop()
+        self.__stop_transport()
+
+    def __stop_transport(self):
+        # release the port's file descriptor held by the event loop
+        if self.transport:
+            self.transport.stop()
+            self.transport.join(1)
@@ -0,0 +1,152 @@
+"""
+Device shadow of the Tama head.
+
+The shadow is the writer's model of what the head is showing: the RGB
+colour of each eye, whether the eyelids are open and the head pose. It is
+updated from the frames actually written, so every path to the serial port
+(commands, gesture keyframes, trajectory setpoints) is covered, and a frame
+that would not change anything is not written at all.
+
+Until a field has been written once its state is unknown (None) and the
+first frame for it always goes out. ``invalidate`` forgets everything, e.g.
+after the head was power cycled. ``state`` and ``restore`` copy the shadow
+to and from a snapshot for warm restarts, ``frames`` replays it to a head
+that lost its state.
+"""
+from ovos_PHAL_tama import codec
+
+# Where the writer takes the head to be after the HOME frame. The firmware
+# homes on its own, so HOME is only ever a no-op right after another HOME.
+HOME_POSE = (0, 20)
+
+
+def _signed(sign, magnitude, negative):
+    return -magnitude if sign == negative else magnitude
+
+
+def _rgb(values):
+    """``values`` as an (r, g, b) tuple of bytes."""
+    if not isinstance(values, (list, tuple)):
+        raise TypeError(f"Bad colour: {values!r}")
+    rgb = tuple(bytes(values))
+    if len(rgb) != 3:
+        raise ValueError(f"Bad colour: {values!r}")
+    return rgb
+
+
+class DeviceShadow:
+    """
+    Last known eye colours, eyelid state and head pose.
+
+    ``eyes`` is a pair of (r, g, b) tuples, ``lids`` True when open and
+    ``head`` the (x, y) pose; ``suppressed`` counts the no-op frames per
+    field.
+    """
+
+    def __init__(self):
+        self.eyes = None
+        self.lids = None
+        self._head = None
+        self.suppressed = {'eyes': 0, 'lids': 0, 'head': 0}
+        # frame type -> (field, attribute, decoder); the head keeps its raw
+        # frame since HOME and a MOVE to the home pose are not the same
+        self._fields = {
+            b'E'[0]: ('eyes', 'eyes', self._preset),
+            b'C'[0]: ('eyes', 'eyes', self._colour),
+            b'T'[0]: ('lids', 'lids', self._lids),
+            b'M'[0]: ('head', '_head', bytes)
+        }
+
+    @property
+    def head(self):
+        """(x, y) head pose, None if unknown."""
+        if self._head is None:
+            return None
+        if self._head == codec.HOME_FRAME:
+            return HOME_POSE
+        # see codec.move for the sign convention of each axis
+        frame = self._head
+        return (_signed(frame[1], frame[2], codec.SIGN_POS),
+                _signed(frame[3], frame[4], codec.SIGN_NEG))
+
+    @staticmethod
+    def _preset(frame):
+        rgb = codec.BASE_COLOURS[chr(frame[1])]
+        return rgb, rgb
+
+    @staticmethod
+    def _colour(frame):
+        return tuple(frame[1:4]), tuple(frame[4:7])
+
+    @staticmethod
+    def _lids(frame):
+        return bool(frame[1])
+
+    def update(self, frame):
+        """Apply ``frame`` to the shadow.
+
+        Returns:
+            bool: True if the frame changes the device state and has to be
+                  written, False if it is a no-op
+        """
+        field = self._fields.get(frame[0]) if frame else None
+        if field is None:
+            return True
+        name, attr, decode = field
+        state = decode(frame)
+        if getattr(self, attr) == state:
+            self.suppressed[name] += 1
+            return False
+        setattr(self, attr, state)
+        return True
+
+    def pixels(self):
+        """(r, g, b) of the left and right eye, None if unknown."""
+        return list(self.eyes) if self.eyes else None
+
+    def state(self):
+        """JSON serialisable copy of the shadow."""
+        return {"eyes": [list(rgb) for rgb in self.eyes] if self.eyes else None,
+                "lids": self.lids,
+                "head": list(self._head) if self._head else None}
+
+    def restore(self, state):
+        """Load a copy made by ``state``.
+
+        Raises:
+            TypeError, ValueError: ``state`` is malformed, the shadow is
+                left as it was
+        """
+        eyes = state.get("eyes")
+        if eyes:
+            eyes = tuple(_rgb(rgb) for rgb in eyes)
+            if len(eyes) != 2:
+                raise ValueError(f"Expected two eye colours: {eyes}")
+        lids = state.get("lids")
+        if lids not in (None, True, False):
+            raise ValueError(f"Bad eyelid state: {lids!r}")
+        head = state.get("head")
+        if head:
+            head = bytes(head)
+            if head[:1] != b'M' or len(head) != codec.FRAME_SIZES[head[0]]:
+                raise ValueError(f"Bad head frame: {head!r}")
+        self.eyes = eyes or None
+        self.lids = lids
+        self._head = head or None
+
+    def frames(self):
+        """Frames bringing a reset head back to the shadow state."""
+        frames = []
+        if self.eyes:
+            frames.append(codec.colour(*self.eyes))
+        if self.lids is not None:
+            frames.append(codec.lids(self.lids))
+        if self._head:
+            frames.append(self._head)
+        return frames
+
+    def invalidate(self):
+        """Forget the device state, the next frame of each field is sent."""
+        self.eyes = None
+        self.lids = None
+        self._head = None
@@ -0,0 +1,57 @@
+"""
+Persisted device state for warm restarts.
+
+The writer saves its model of the head (eye colours and brightness,
+eyelids, head pose and aversion) to a small JSON file whenever frames
+change it, at most once per ``interval`` seconds, and again when it stops.
+A writer started with the same file and ``restore`` enabled restores that
+state, so its shadow already knows what the head shows and the start up
+reset only sends the frames that actually change something. Restoring is
+off by default: a head that was power cycled in the meantime no longer
+shows the saved state, and the frames it needs would be suppressed.
+
+The file is replaced atomically, a crash while saving leaves the previous
+snapshot in place.
+"""
+import json
+import os
+import tempfile
+
+from ovos_utils.log import LOG
+from ovos_utils.xdg_utils import xdg_state_home
+
+VERSION = 1
+
+
+def state_path():
+    return os.path.join(xdg_state_home(), "ovos_PHAL_tama", "state.json")
+
+
+def load_state(path=None):
+    """The saved device state, None if there is none or it is unreadable."""
+    try:
+        with open(path or state_path()) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("version") != VERSION:
+        LOG.warning("Ignoring device state snapshot of another version")
+        return None
+    return state
+
+
+def save_state(state, path=None):
+    path = path or state_path()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".state")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(dict(state, version=VERSION), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        # left behind only when saving failed, e.g. on unserialisable state
+        if os.path.exists(tmp):
+            os.unlink(tmp)
@@ -0,0 +1,182 @@
+"""
+Supervised serial connection to the head.
+
+When the USB serial adapter of the head resets, reads and writes on the
+old handle fail forever. ``SerialSupervisor`` stands in for the
+``serial.Serial``: the first I/O error (or the device node disappearing)
+marks the link down, closes the handle and reopens the port in the
+background with exponential backoff, from ``backoff`` up to
+``max_backoff`` seconds between attempts.
+
+While the link is down ``read`` and ``readline`` wait for it instead of
+failing and the ``EnclosureWriter`` stops taking commands from its queue,
+so they stay queued (and coalesce) during the outage. Every reconnection
+increments ``generation``; the writer then replays the frames restoring
+the last known state of the head (see ``DeviceShadow.frames``). Outage
+counts and durations are part of the writer stats.
+"""
+import os
+import time
+from threading import Condition, Thread
+
+from ovos_utils.log import LOG
+from serial import SerialException
+
+
+class SerialSupervisor:
+    """
+    Serial port proxy reopening the port after I/O errors.
+
+    Args:
+        opener (callable): returns a newly opened ``serial.Serial``
+        path (str): device node checked when reads time out, None to skip
+        backoff (float): seconds before the first reconnection attempt
+        max_backoff (float): longest wait between attempts
+        clock (callable): monotonic time source, in seconds
+    """
+
+    def __init__(self, opener, path=None, backoff=0.5, max_backoff=30.0,
+                 clock=time.monotonic):
+        self.opener = opener
+        self.path = path if path and path.startswith("/") else None
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.alive = True
+        self.connected = True
+        self.generation = 0
+        self.outages = 0
+        self.attempts = 0
+        self.downtime = 0.0
+        self.last_outage = None
+        self._down_since = None
+        self._cond = Condition()
+        self.serial = opener()
+
+    @classmethod
+    def from_config(cls, opener, path, config):
+        return cls(opener, path, config.get("backoff", 0.5),
+                   config.get("max_backoff", 30.0))
+
+    def __getattr__(self, name):
+        # baudrate, timeout, ... of the current port
+        return getattr(self.__dict__["serial"], name)
+
+    def _fail(self, serial, error):
+        """Mark the link down after an error on ``serial``."""
+        with self._cond:
+            if serial is not self.serial or not self.connected:
+                return
+            self.connected = False
+            self.outages += 1
+            self._down_since = self.clock()
+        LOG.warning(f"Head serial link lost: {error}")
+        try:
+            serial.close()
+        except Exception:
+            pass
+        Thread(target=self._reconnect, daemon=True).start()
+
+    def _reconnect(self):
+        delay = self.backoff
+        while self.alive:
+            time.sleep(delay)
+            self.attempts += 1
+            try:
+                serial = self.opener()
+            except (SerialException, OSError) as e:
+                LOG.debug(f"Reconnecting to the head failed: {e}")
+                delay = min(delay * 2, self.max_backoff)
+                continue
+            with self._cond:
+                self.serial = serial
+                self.last_outage = self.clock() - self._down_since
+                self.downtime += self.last_outage
+                self._down_since = None
+                self.connected = True
+                self.generation += 1
+                self._cond.notify_all()
+            LOG.info(f"Head serial link back after {self.last_outage:.1f}s")
+            return
+
+    def wait_connected(self, timeout=None):
+        """Block until the link is up, True if it is."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.connected, timeout)
+
+    def write(self, data):
+        serial = self.serial
+        if not self.connected:
+            raise SerialException("Head serial link is down")
+        try:
+            return serial.write(data)
+        except (SerialException, OSError) as e:
+            self._fail(serial, e)
+            raise
+
+    def flush(self):
+        serial = self.serial
+        if not self.connected:
+            return
+        try:
+            serial.flush()
+        except (SerialException, OSError) as e:
+            self._fail(serial, e)
+            raise
+
+    def _read(self, method, *args):
+        if not self.wait_connected(0.5):
+            return b''
+        serial = self.serial
+        try:
+            data = getattr(serial, method)(*args)
+        except (SerialException, OSError) as e:
+            self._fail(serial, e)
+            return b''
+        if not data and self.path and not os.path.exists(self.path):
+            self._fail(serial, f"{self.path} disappeared")
+        return data
+
+    def readline(self):
+        """A line from the head, empty while the link is down."""
+        return self._read("readline")
+
+    def read(self, size=1):
+        """Up to ``size`` bytes from the head, empty while the link is
+        down."""
+        return self._read("read", size)
+
+    @property
+    def in_waiting(self):
+        """Bytes ready to read, 0 while the link is down."""
+        serial = self.serial
+        if not self.connected:
+            return 0
+        try:
+            return serial.in_waiting
+        except (SerialException, OSError) as e:
+            self._fail(serial, e)
+            return 0
+
+    def cancel_read(self):
+        """Wake a ``read`` blocked on the current port."""
+        cancel = getattr(self.serial, "cancel_read", None)
+        if cancel:
+            cancel()
+
+    def stats(self):
+        with self._cond:
+            down = 0.0 if self._down_since is None \
+                else self.clock() - self._down_since
+            return {"connected": self.connected,
+                    "outages": self.outages,
+                    "reconnect_attempts": self.attempts,
+                    "downtime": self.downtime + down,
+                    "last_outage": self.last_outage}
+
+    def close(self):
+        self.alive = False
+        with self._cond:
+            self.connected = False
+            self._cond.notify_all()
+        self.serial.close()
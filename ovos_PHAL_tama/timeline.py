@@ -0,0 +1,112 @@
+"""
+Non-blocking keyframe scheduler for head gestures.
+
+A gesture (SHAKE, NOD, aversion, ...) is a list of keyframes, each one a
+delay and an action run by the writer thread once the delay has elapsed.
+The writer waits on its command queue only until the next keyframe is due,
+so other channels (eye colour, eyelids) keep flowing between keyframes
+instead of sleeping behind a gesture.
+
+Each channel plays at most one gesture at a time. Playing a gesture of equal
+or higher priority replaces the running one; lower priority commands for a
+busy channel can be deferred until it goes idle, keeping only the latest.
+A deferred command survives a gesture being replaced and runs after the
+new one; only ``cancel`` drops it.
+"""
+import time
+from collections import deque
+
+
+class Timeline:
+    """
+    Keyframe timeline for the writer thread.
+
+    Args:
+        clock (callable): monotonic time source, in seconds
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._tracks = {}
+        self._deferred = {}
+
+    def play(self, channel, keyframes, priority=0):
+        """Start a gesture on ``channel``.
+
+        Args:
+            channel (str): channel the gesture drives, e.g. "head"
+            keyframes (list): (delay, action) pairs, delays in seconds
+                relative to the previous keyframe. ``action()`` is called
+                by the writer thread once the keyframe is due.
+            priority (int): gestures only preempt running gestures of equal
+                or lower priority
+
+        Returns:
+            bool: True if the gesture was scheduled
+        """
+        running = self._tracks.get(channel)
+        if running and running[0] > priority:
+            return False
+        due = self.clock()
+        frames = deque()
+        for delay, action in keyframes:
+            due += delay
+            frames.append((due, action))
+        self._tracks[channel] = (priority, frames)
+        # a deferred command (HOME, a look target) now waits for this one
+        return True
+
+    def cancel(self, channel, priority=None):
+        """Stop the gesture running on ``channel``.
+
+        If ``priority`` is given only gestures of that priority or lower
+        are cancelled. Deferred commands for the channel are dropped.
+
+        Returns:
+            bool: True if a gesture was cancelled
+        """
+        running = self._tracks.get(channel)
+        if not running or (priority is not None and running[0] > priority):
+            return False
+        del self._tracks[channel]
+        self._deferred.pop(channel, None)
+        return True
+
+    def busy(self, channel):
+        """True while a gesture is playing on ``channel``."""
+        return channel in self._tracks
+
+    def defer(self, channel, action):
+        """Run ``action`` once ``channel`` is idle, replacing any earlier one.
+
+        Returns:
+            bool: True if deferred, False if the channel is already idle
+        """
+        if channel not in self._tracks:
+            return False
+        self._deferred[channel] = action
+        return True
+
+    def next_due(self):
+        """Seconds until the next keyframe, 0 if overdue, None if idle."""
+        if not self._tracks:
+            return 0 if self._deferred else None
+        due = min(frames[0][0] for _, frames in self._tracks.values())
+        return max(0, due - self.clock())
+
+    def pop_due(self):
+        """Remove and return the actions that are due, in due order."""
+        now = self.clock()
+        due = []
+        for channel in list(self._tracks):
+            frames = self._tracks[channel][1]
+            while frames and frames[0][0] <= now:
+                due.append(frames.popleft())
+            if not frames:
+                del self._tracks[channel]
+        due.sort(key=lambda keyframe: keyframe[0])
+        actions = [action for _, action in due]
+        for channel in list(self._deferred):
+            if channel not in self._tracks:
+                actions.append(self._deferred.pop(channel))
+        return actions
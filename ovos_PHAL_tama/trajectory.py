@@ -0,0 +1,124 @@
+"""
+Head trajectory planner.
+
+Instead of snapping the head to every look target, the planner moves a
+setpoint towards the target at a fixed control rate while respecting
+per-axis velocity, acceleration and range limits. Each axis follows a
+trapezoidal profile: it accelerates up to its top speed and starts braking
+early enough to stop on the target. A new target replans from the current
+position and velocity, so jittery gaze targets bend the path instead of
+restarting it.
+
+Only changed integer setpoints are emitted, and the control rate is capped
+by what the serial link can carry, so the planner never sends more ``M``
+frames than the head can take.
+"""
+import math
+
+from ovos_PHAL_tama.codec import BITS_PER_BYTE, HOME_FRAME
+
+MOVE_FRAME_SIZE = len(HOME_FRAME)
+
+
+class AxisLimits:
+    """Motion limits of one head axis, in firmware position units."""
+    __slots__ = ('vmax', 'amax', 'low', 'high')
+
+    def __init__(self, vmax=120.0, amax=600.0, low=-127, high=127):
+        self.vmax = float(vmax)
+        self.amax = float(amax)
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("vmax", 120.0), config.get("amax", 600.0),
+                   config.get("min", -127), config.get("max", 127))
+
+
+def max_rate(baudrate, frame_size=MOVE_FRAME_SIZE, share=0.5):
+    """Highest setpoint rate using at most ``share`` of the link."""
+    return share * baudrate / (BITS_PER_BYTE * frame_size)
+
+
+class TrajectoryPlanner:
+    """
+    Per-axis trapezoidal trajectory generator.
+
+    Args:
+        limits (tuple): ``AxisLimits`` for the x and y axes
+        rate (float): control rate in Hz
+        baudrate (int): serial link speed, caps ``rate`` when given
+    """
+
+    def __init__(self, limits=None, rate=25.0, baudrate=None):
+        self.limits = limits or (AxisLimits(), AxisLimits())
+        if baudrate:
+            rate = min(rate, max_rate(baudrate))
+        self.rate = rate
+        self.period = 1.0 / rate
+        self._pos = [0.0, 0.0]
+        self._vel = [0.0, 0.0]
+        self._target = [0.0, 0.0]
+        self._emitted = (0, 0)
+
+    @classmethod
+    def from_config(cls, config, baudrate=None):
+        return cls((AxisLimits.from_config(config.get("x", {})),
+                    AxisLimits.from_config(config.get("y", {}))),
+                   config.get("rate", 25.0), baudrate)
+
+    @property
+    def active(self):
+        """True until the setpoint has settled on the target."""
+        return self._pos != self._target or any(self._vel)
+
+    @property
+    def target(self):
+        return tuple(self._target)
+
+    def reset(self, x, y):
+        """Jump to ``(x, y)`` at rest, e.g. after a move the planner did not make."""
+        self._pos = [float(x), float(y)]
+        self._vel = [0.0, 0.0]
+        self._target = list(self._pos)
+        self._emitted = (int(x), int(y))
+
+    def set_target(self, x, y):
+        """Replan towards ``(x, y)``, clamped to the axis ranges."""
+        self._target = [float(min(max(v, lim.low), lim.high))
+                        for v, lim in zip((x, y), self.limits)]
+
+    def update(self, dt=None):
+        """Advance one control period.
+
+        Returns:
+            tuple: the new integer ``(x, y)`` setpoint, or None if it did not
+                   change since the last one returned
+        """
+        dt = self.period if dt is None else dt
+        for i, lim in enumerate(self.limits):
+            self._pos[i], self._vel[i] = self._axis(
+                self._pos[i], self._vel[i], self._target[i], lim, dt)
+        setpoint = (int(round(self._pos[0])), int(round(self._pos[1])))
+        if setpoint == self._emitted:
+            return None
+        self._emitted = setpoint
+        return setpoint
+
+    @staticmethod
+    def _axis(pos, vel, target, lim, dt):
+        error = target - pos
+        dv = lim.amax * dt
+        if abs(error) <= max(0.5, abs(vel) * dt) and abs(vel) <= dv:
+            return target, 0.0
+        # fastest speed from which we can still brake before the target,
+        # for a velocity that changes in steps of dv
+        v_stop = math.sqrt(2 * lim.amax * abs(error) + dv * dv / 4) - dv / 2
+        v_want = math.copysign(min(lim.vmax, v_stop), error)
+        vel += max(-dv, min(dv, v_want - vel))
+        pos += vel * dt
+        if (target - pos) * error < 0 and abs(vel) <= dv:
+            # overshot by less than one step while braking, settle
+            return target, 0.0
+        return pos, vel
@@ -0,0 +1,162 @@
+"""
+asyncio transport for the head serial link.
+
+One event loop thread owns the serial file descriptor for both directions:
+incoming bytes are framed into lines as soon as the descriptor becomes
+readable (no polling ``readline()`` with a timeout) and outgoing frames are
+written without blocking, with the remainder flushed when the descriptor
+becomes writable again.
+
+Coroutines use ``await transport.send(frame)``. Threads (bus handlers, the
+``EnclosureWriter``) use ``transport.write(frame)``, which writes directly
+when nothing is pending and otherwise hands the frame to the loop, so
+``AsyncSerialTransport`` can be passed anywhere a ``serial.Serial`` is
+written to.
+"""
+import asyncio
+import os
+from threading import Lock, Thread
+
+from ovos_utils.log import LOG
+
+from ovos_PHAL_tama.framing import LineFramer
+
+
+class AsyncSerialTransport(Thread):
+    """
+    Full duplex serial transport running in its own asyncio loop.
+
+    Args:
+        serial (serial.Serial): open serial port, switched to non-blocking
+        on_line (callable): called on the loop with each received line
+        poll_interval (float): read poll period for ports without a file
+                               descriptor (e.g. pyserial ``loop://``)
+    """
+
+    def __init__(self, serial, on_line=None, poll_interval=0.01):
+        super(AsyncSerialTransport, self).__init__(target=self._run)
+        self.daemon = True
+        self.serial = serial
+        self.on_line = on_line
+        self.poll_interval = poll_interval
+        self.loop = asyncio.new_event_loop()
+        self._framer = LineFramer()
+        self._out = bytearray()
+        self._waiters = []
+        self._lock = Lock()
+        try:
+            self._fd = serial.fileno()
+        except Exception:
+            self._fd = None
+        self.serial.timeout = 0
+        self.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        if self._fd is not None:
+            self.loop.add_reader(self._fd, self._on_readable)
+        else:
+            self.loop.create_task(self._poll())
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _poll(self):
+        while True:
+            self._on_readable()
+            await asyncio.sleep(self.poll_interval)
+
+    def _on_readable(self):
+        try:
+            if self._fd is not None:
+                data = os.read(self._fd, 4096)
+            else:
+                data = self.serial.read(self.serial.in_waiting)
+        except BlockingIOError:
+            return
+        except Exception as e:
+            LOG.error("Reading error: {0}".format(e))
+            return
+        if data:
+            self._feed(data)
+
+    def _feed(self, data):
+        for line in self._framer.feed(data):
+            if self.on_line:
+                try:
+                    self.on_line(line.decode('utf-8', errors='replace'))
+                except Exception as e:
+                    LOG.error("Error handling line {}: {}".format(line, e))
+
+    def _write_now(self, frame):
+        """Write as much as possible without blocking, keep the rest."""
+        if self._fd is None:
+            self.serial.write(frame)
+            return True
+        try:
+            written = os.write(self._fd, frame)
+        except BlockingIOError:
+            written = 0
+        if written < len(frame):
+            self._out += frame[written:]
+            return False
+        return True
+
+    def _on_writable(self):
+        with self._lock:
+            try:
+                written = os.write(self._fd, self._out)
+            except BlockingIOError:
+                return
+            del self._out[:written]
+            if self._out:
+                return
+            waiters, self._waiters = self._waiters, []
+        self.loop.remove_writer(self._fd)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _queue(self, frame):
+        """Loop side of a write: returns a future resolved once on the wire."""
+        waiter = self.loop.create_future()
+        with self._lock:
+            if self._out:
+                # behind the bytes still waiting for the descriptor
+                self._out += frame
+            elif self._write_now(frame):
+                waiter.set_result(None)
+                return waiter
+            if not self._waiters:
+                self.loop.add_writer(self._fd, self._on_writable)
+            self._waiters.append(waiter)
+        return waiter
+
+    async def send(self, frame):
+        """Write ``frame``, returning once it was handed to the OS."""
+        await self._queue(bytes(frame))
+
+    def write(self, frame):
+        """Thread-safe, non-blocking write usable in place of ``Serial``."""
+        frame = bytes(frame)
+        with self._lock:
+            if not self._out and not self._waiters:
+                if self._write_now(frame):
+                    return len(frame)
+                self.loop.call_soon_threadsafe(self._arm_writer)
+                return len(frame)
+        self.loop.call_soon_threadsafe(self._queue, frame)
+        return len(frame)
+
+    def _arm_writer(self):
+        with self._lock:
+            if self._out and not self._waiters:
+                self._waiters.append(self.loop.create_future())
+                self.loop.add_writer(self._fd, self._on_writable)
+
+    def flush(self):
+        pass
+
+    def stop(self):
+        if self._fd is not None:
+            self.loop.call_soon_threadsafe(self.loop.remove_reader, self._fd)
+        self.loop.call_soon_threadsafe(self.loop.stop)
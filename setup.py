@@ -71,7 +71,10 @@ setup(
     entry_points={
         'console_scripts': [
             'ovos_PHAL_tama=ovos_PHAL_tama.__main__:main',
-            'ovos_PHAL_tama_admin=ovos_PHAL_tama.admin:main'
+            'ovos_PHAL_tama_admin=ovos_PHAL_tama.admin:main',
+            'ovos_PHAL_tama_recorder=ovos_PHAL_tama.recorder:main',
+            'ovos_PHAL_tama_emulator=ovos_PHAL_tama.emulator:main',
+            'ovos_PHAL_tama_replay=ovos_PHAL_tama.capture:main'
         ]
     }
 )
@@ -0,0 +1,110 @@
+"""
+Microbenchmark for the head frame encoding.
+
+Compares the legacy per-field ``serial.write()`` calls that
+``EnclosureWriter.flush`` used to make against the single precompiled frame
+built by ``ovos_PHAL_tama.codec``. Reports write calls per command and the
+mean per-command latency, both against an in-memory sink and, on POSIX,
+against a pseudo-terminal where every write call is a real syscall.
+
+    python test/benchmarks/bench_codec.py [iterations]
+"""
+import os
+import sys
+import time
+
+from ovos_PHAL_tama import codec
+
+
+class CountingSink:
+    """Serial stand-in that only counts calls and bytes."""
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.calls += 1
+        self.bytes += len(data)
+        return len(data)
+
+
+class PtySink(CountingSink):
+    """Counting sink backed by the master side of a pseudo-terminal."""
+
+    def __init__(self):
+        super().__init__()
+        self.master, self.slave = os.openpty()
+        self._drain = bytearray(4096)
+
+    def write(self, data):
+        super().write(data)
+        n = os.write(self.slave, data)
+        os.readv(self.master, [self._drain])
+        return n
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def legacy_move(serial, x, y):
+    serial.write('M'.encode())
+    serial.write(b'\x01' if x < 0 else b'\xFF')
+    serial.write(abs(x).to_bytes(1, 'little'))
+    serial.write(b'\x01' if y > 0 else b'\xFF')
+    serial.write(abs(y).to_bytes(1, 'little'))
+    serial.write((0).to_bytes(1, 'little'))
+    serial.write((0).to_bytes(1, 'little'))
+
+
+def legacy_preset(serial, name):
+    serial.write('E'.encode())
+    serial.write(codec.EYE_PRESETS[name])
+    serial.write((1).to_bytes(1, 'little'))
+    serial.write((0).to_bytes(1, 'little'))
+
+
+def legacy_colour(serial, rgb):
+    serial.write('C'.encode())
+    for c in rgb + rgb:
+        serial.write(int(c).to_bytes(1, 'little'))
+
+
+COMMANDS = {
+    'MOVE': (lambda s: legacy_move(s, -12, 20),
+             lambda s: s.write(codec.move(-12, 20))),
+    'YELLOW': (lambda s: legacy_preset(s, 'YELLOW'),
+               lambda s: s.write(codec.preset('YELLOW'))),
+    'COL': (lambda s: legacy_colour(s, [70, 65, 69]),
+            lambda s: s.write(codec.colour((70, 65, 69)))),
+}
+
+
+def run(sink_factory, fn, iterations):
+    sink = sink_factory()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(sink)
+    elapsed = time.perf_counter() - start
+    if hasattr(sink, 'close'):
+        sink.close()
+    return sink.calls / iterations, elapsed / iterations * 1e6
+
+
+def main(iterations=20000):
+    sinks = [('memory', CountingSink)]
+    if hasattr(os, 'openpty'):
+        sinks.append(('pty', PtySink))
+    print(f"{'sink':<8}{'command':<8}{'calls before':>14}{'calls after':>13}"
+          f"{'us before':>12}{'us after':>11}")
+    for sink_name, factory in sinks:
+        for name, (before, after) in COMMANDS.items():
+            calls_b, us_b = run(factory, before, iterations)
+            calls_a, us_a = run(factory, after, iterations)
+            print(f"{sink_name:<8}{name:<8}{calls_b:>14.0f}{calls_a:>13.0f}"
+                  f"{us_b:>12.2f}{us_a:>11.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,266 @@
+"""
+End to end benchmark of the bus to serial command path.
+
+Bus messages (``enclosure.eyes.color``, ``enclosure.eyes.look``,
+``enclosure.head.move``, ...) are delivered synchronously to
+``EnclosureEyes``, which queues commands on a real ``EnclosureWriter``
+writing to an in-process sink. Scenarios:
+
+    burst    colour and head move messages sent as fast as possible
+    gaze     look targets at a steady 10 Hz
+    gesture  10 Hz gaze and eye colour with head aversions interleaved
+
+Each scenario reports bus messages per second, p50/p99 enqueue to write
+latency, bytes on the wire per bus message and the writer queue depth over
+time. Results are printed and, with ``--output``, written as JSON so
+releases can be compared.
+
+    python test/benchmarks/bench_pipeline.py [--duration 5] [--output results.json]
+
+``--baudrate`` runs against ``HeadEmulator`` at that speed instead of the
+in-memory sink, adding the serial transmission time.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from threading import Thread
+
+from ovos_bus_client import Message
+
+from ovos_PHAL_tama.arduino import EnclosureWriter
+from ovos_PHAL_tama.commands import MoveHead
+from ovos_PHAL_tama.eyes import EnclosureEyes
+from ovos_PHAL_tama.version import VERSION_ALPHA, VERSION_BUILD, \
+    VERSION_MAJOR, VERSION_MINOR
+
+SAMPLE_PERIOD = 0.01
+
+
+class SyncBus:
+    """Message bus stand-in delivering messages in the caller's thread."""
+
+    def __init__(self):
+        self.handlers = {}
+
+    def on(self, msg_type, handler):
+        self.handlers.setdefault(msg_type, []).append(handler)
+
+    def emit(self, message):
+        for handler in self.handlers.get(message.msg_type, []):
+            handler(message)
+
+
+class Sink:
+    """Serial stand-in counting writes, optionally forwarding them."""
+
+    def __init__(self, port=None):
+        self.port = port
+        self.calls = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.calls += 1
+        self.bytes += len(data)
+        if self.port:
+            self.port.write(data)
+        return len(data)
+
+
+class TimedWriter(EnclosureWriter):
+    """Writer keeping the enqueue to write latency of every queued command.
+
+    Look targets count until the first trajectory setpoint towards them is
+    written. Gesture keyframes and later setpoints are not counted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.latencies = []
+        self._looks = {}
+        self._look = None
+        super(TimedWriter, self).__init__(*args, **kwargs)
+
+    def write(self, command, ttl=None):
+        if isinstance(command, MoveHead):
+            self._looks[id(command)] = self.commands.clock()
+        super(TimedWriter, self).write(command, ttl)
+
+    def _move(self, cmd):
+        enqueued = self._looks.pop(id(cmd), None)
+        if enqueued is not None:
+            self._look = enqueued
+        return super(TimedWriter, self)._move(cmd)
+
+    def _send(self, opcode, frame, wait=None):
+        pending = len(self._batch)
+        super(TimedWriter, self)._send(opcode, frame, wait or 0.0)
+        if len(self._batch) == pending:
+            return
+        if wait is not None:
+            self.latencies.append(wait)
+        elif opcode == 'MOVE' and self._look is not None:
+            self.latencies.append(self.commands.clock() - self._look)
+            self._look = None
+
+
+def burst(bus, duration):
+    count = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        for i in range(100):
+            bus.emit(Message("enclosure.eyes.color",
+                             {"r": i, "g": 255 - i, "b": 128}))
+            bus.emit(Message("enclosure.head.move",
+                             {"pos": i % 60 - 30, "posvertical": 20}))
+        count += 200
+    return count
+
+
+def steady(bus, duration, rate, extra=None):
+    count = 0
+    start = time.monotonic()
+    tick = 0
+    while time.monotonic() - start < duration:
+        x = int(30 * ((tick % 40) / 20 - 1))
+        bus.emit(Message("enclosure.eyes.look",
+                         {"data": f"MOVE:0:{x}:0:20:", "x": x, "y": 20}))
+        count += 1
+        if extra:
+            count += extra(bus, tick)
+        tick += 1
+        delay = start + tick / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    return count
+
+
+def gaze(bus, duration):
+    return steady(bus, duration, 10)
+
+
+def gesture(bus, duration):
+    def interleave(bus, tick):
+        bus.emit(Message("enclosure.eyes.color",
+                         {"r": tick % 256, "g": 0, "b": 200}))
+        if tick % 10 == 5:
+            bus.emit(Message("enclosure.eyes.avr" if tick % 20 == 5
+                             else "enclosure.eyes.avl"))
+            return 2
+        return 1
+    return steady(bus, duration, 10, interleave)
+
+
+SCENARIOS = {'burst': burst, 'gaze': gaze, 'gesture': gesture}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def drain(writer, timeout=30):
+    writer.commands.join()
+    end = time.monotonic() + timeout
+    while writer.timeline.next_due() is not None and time.monotonic() < end:
+        time.sleep(SAMPLE_PERIOD)
+
+
+def run(name, duration, baudrate=None):
+    emulator = None
+    if baudrate:
+        from ovos_PHAL_tama.emulator import HeadEmulator
+        emulator = HeadEmulator(baudrate, url="loop://")
+        sink = Sink(emulator.connect())
+    else:
+        sink = Sink()
+    bus = SyncBus()
+    writer = TimedWriter(sink, bus, {"baudrate": baudrate or 115200})
+    EnclosureEyes(bus, writer)
+    depth = []
+    sampling = [True]
+
+    def sample():
+        start = time.monotonic()
+        while sampling[0]:
+            depth.append((round(time.monotonic() - start, 3),
+                          writer.commands.qsize()))
+            time.sleep(SAMPLE_PERIOD)
+
+    sampler = Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.monotonic()
+    messages = SCENARIOS[name](bus, duration)
+    drain(writer)
+    elapsed = time.monotonic() - start
+    sampling[0] = False
+    sampler.join()
+    writer.stop()
+    if emulator:
+        emulator.stop()
+
+    latencies = writer.latencies
+    depths = [d for _, d in depth]
+    return {
+        "messages": messages,
+        "elapsed": elapsed,
+        "messages_per_second": messages / elapsed,
+        "writes": sink.calls,
+        "bytes": sink.bytes,
+        "bytes_per_message": sink.bytes / messages if messages else 0,
+        "latency_p50_ms": _ms(percentile(latencies, 50)),
+        "latency_p99_ms": _ms(percentile(latencies, 99)),
+        "queue_depth_max": max(depths, default=0),
+        "queue_depth_mean": statistics.mean(depths) if depths else 0,
+        "queue_depth": depth,
+        "queue_stats": {level: dict(stats) for level, stats
+                        in writer.commands.stats.items()},
+        "suppressed": dict(writer.shadow.suppressed),
+        "batch": dict(writer.batch_stats)
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="seconds each scenario sends messages for")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="scenario to run, all by default")
+    parser.add_argument("--baudrate", type=int,
+                        help="write to an emulated head at this baud rate")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args(argv)
+
+    results = {
+        "version": f"{VERSION_MAJOR}.{VERSION_MINOR}.{VERSION_BUILD}"
+                   f"a{VERSION_ALPHA}",
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "duration": args.duration,
+        "baudrate": args.baudrate,
+        "scenarios": {}
+    }
+    print(f"{'scenario':<10}{'msg/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'B/msg':>8}{'max depth':>11}")
+    for name in args.scenario or SCENARIOS:
+        result = run(name, args.duration, args.baudrate)
+        results["scenarios"][name] = result
+        print(f"{name:<10}{result['messages_per_second']:>10.1f}"
+              f"{result['latency_p50_ms'] or 0:>9.3f}"
+              f"{result['latency_p99_ms'] or 0:>9.3f}"
+              f"{result['bytes_per_message']:>8.2f}"
+              f"{result['queue_depth_max']:>11}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,61 @@
+"""
+Test doubles shared by the unit tests.
+"""
+from ovos_PHAL_tama import codec
+
+
+class FakeBus:
+    """Message bus recording the handlers registered and messages emitted."""
+
+    def __init__(self):
+        self.handlers = {}
+        self.emitted = []
+
+    def on(self, msg_type, handler):
+        self.handlers[msg_type] = handler
+
+    def emit(self, message):
+        self.emitted.append(message)
+
+
+class FakeClock:
+    """Monotonic clock that only moves when told to, or when slept on.
+
+    Usable as a ``clock`` callable and, through ``monotonic`` and
+    ``sleep``, in place of the ``time`` module.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeSerial:
+    """Serial port recording every write, split back into frames."""
+
+    def __init__(self):
+        self.frames = []
+        self.writes = []
+        self.flushes = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.writes.append(data)
+        size = len(data)
+        # split batched writes back into frames
+        while data:
+            frame_size = codec.FRAME_SIZES.get(data[0], len(data))
+            self.frames.append(data[:frame_size])
+            data = data[frame_size:]
+        return size
+
+    def flush(self):
+        self.flushes += 1
@@ -0,0 +1,54 @@
+import unittest
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.animation import EyeAnimator, ramp, render
+from ovos_PHAL_tama.trajectory import max_rate
+
+YELLOW = (200, 200, 0)
+
+
+class TestEyeAnimator(unittest.TestCase):
+    def setUp(self):
+        self.animator = EyeAnimator(fps=20)
+
+    def test_ramp(self):
+        levels = ramp(0, 1, 5)
+        self.assertEqual((levels[0], levels[-1]), (0, 1))
+        self.assertEqual(list(levels), sorted(levels))
+        self.assertEqual(ramp(0.2, 1, 1), (1,))
+
+    def test_fps_capped_by_link(self):
+        self.assertEqual(EyeAnimator(1000, baudrate=9600).fps,
+                         max_rate(9600, share=0.25))
+        self.assertEqual(EyeAnimator(20, baudrate=115200).fps, 20)
+
+    def test_fade(self):
+        keyframes = self.animator.fade(YELLOW, YELLOW, (1, 1), (0.5, 0.5))
+        self.assertEqual(keyframes[0], (0, codec.colour(YELLOW)))
+        self.assertEqual(keyframes[-1][1], codec.colour((100, 100, 0)))
+        self.assertTrue(all(delay == 0.05 for delay, _ in keyframes[1:]))
+
+    def test_blink(self):
+        self.assertEqual(self.animator.blink(YELLOW, YELLOW, (1, 1), 'b', True),
+                         [(0, codec.CLOSE_FRAME), (0.3, codec.OPEN_FRAME)])
+        frames = [f for _, f in self.animator.blink(YELLOW, YELLOW, (1, 1), 'l')]
+        self.assertIn(codec.colour((0, 0, 0), YELLOW), frames)
+        self.assertEqual(frames[-1], codec.colour(YELLOW))
+
+    def test_spin_cycle(self):
+        keyframes = self.animator.spin(YELLOW, YELLOW, (1, 1))
+        self.assertEqual(len(keyframes), 20)
+        self.assertTrue(all(delay == 0.05 for delay, _ in keyframes))
+        self.assertEqual(keyframes[0][1], codec.colour(YELLOW, (0, 0, 0)))
+        self.assertEqual(keyframes[10][1], codec.colour((0, 0, 0), YELLOW))
+
+    def test_fill(self):
+        self.assertEqual(self.animator.fill(YELLOW, YELLOW, (1, 1), 0.5),
+                         codec.colour(YELLOW, (0, 0, 0)))
+        self.assertEqual(self.animator.fill(YELLOW, YELLOW, (1, 1), 1),
+                         codec.colour(YELLOW))
+
+    def test_frames_cached(self):
+        levels = ((1, 1), (0.5, 0.5))
+        self.assertIs(render(YELLOW, YELLOW, levels),
+                      render(YELLOW, YELLOW, levels))
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from ovos_PHAL_tama.baud import handshake, load_rate, probe, save_rate, \
+    select_rate
+from ovos_PHAL_tama.emulator import HeadEmulator
+
+
+class TestBaudProbe(unittest.TestCase):
+    def setUp(self):
+        self.cache = os.path.join(tempfile.mkdtemp(), "serial.json")
+
+    def attach(self, baudrate, **kwargs):
+        emulator = HeadEmulator(baudrate, url="loop://", **kwargs)
+        self.addCleanup(emulator.stop)
+        port = emulator.connect(timeout=0.05)
+        return emulator, port
+
+    def test_handshake_needs_matching_rate(self):
+        emulator, port = self.attach(19200)
+        self.assertTrue(handshake(port, 0.3))
+        port.baudrate = 9600
+        self.assertFalse(handshake(port, 0.3))
+        self.assertGreater(emulator.garbled, 0)
+
+    def test_probe(self):
+        _, port = self.attach(38400)
+        port.baudrate = 9600
+        self.assertEqual(probe(port, timeout=0.3), 38400)
+
+    def test_select_negotiates_and_remembers(self):
+        emulator, port = self.attach(9600)
+        rate = select_rate(port, "loop://", timeout=0.3, path=self.cache)
+        self.assertEqual(rate, 115200)
+        self.assertEqual(emulator.baudrate, 115200)
+        self.assertEqual(port.baudrate, 115200)
+        self.assertEqual(load_rate("loop://", self.cache), 115200)
+
+    def test_select_keeps_working_rate(self):
+        emulator, port = self.attach(19200, max_baudrate=19200)
+        port.baudrate = 9600
+        self.assertEqual(select_rate(port, "loop://", timeout=0.3,
+                                     path=self.cache), 19200)
+        self.assertEqual(port.baudrate, 19200)
+
+    def test_select_steps_down_to_supported_rate(self):
+        emulator, port = self.attach(9600, max_baudrate=57600)
+        self.assertEqual(select_rate(port, "loop://", timeout=0.3,
+                                     path=self.cache), 57600)
+        self.assertEqual(emulator.baudrate, 57600)
+        self.assertEqual(port.baudrate, 57600)
+        self.assertEqual(load_rate("loop://", self.cache), 57600)
+
+    def test_remembered_rate_skips_probe(self):
+        save_rate("loop://", 57600, self.cache)
+        emulator, port = self.attach(57600)
+        port.baudrate = 9600
+        self.assertEqual(select_rate(port, "loop://", timeout=0.3,
+                                     path=self.cache), 57600)
+        self.assertEqual(emulator.text, ["system.version"])
+
+    def test_fallback(self):
+        _, port = self.attach(4800)
+        self.assertEqual(select_rate(port, "loop://", timeout=0.1,
+                                     path=self.cache), 9600)
+        self.assertIsNone(load_rate("loop://", self.cache))
@@ -0,0 +1,184 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+from queue import Queue
+from threading import Event
+
+from ovos_bus_client import Message
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.arduino import EnclosureWriter
+from ovos_PHAL_tama.broker import Arbiter, BrokerClient, SerialBroker, \
+    send_message
+from ovos_PHAL_tama.commands import Gesture, Home, MoveHead, SetColor, \
+    SetPixel, decode, encode
+
+from fakes import FakeBus, FakeSerial
+
+
+class HeldQueue:
+    """Writer queue that has no room until ``room`` is set."""
+
+    def __init__(self):
+        self.room = Event()
+
+    def wait_below(self, size, timeout=None):
+        return self.room.wait(timeout)
+
+
+class HeldWriter:
+    def __init__(self):
+        self.commands = HeldQueue()
+        self.written = []
+
+    def write(self, command, ttl=None):
+        self.written.append((command, ttl))
+
+
+class TestWireFormat(unittest.TestCase):
+    def test_round_trip(self):
+        for command in (SetColor(1, 2, 3), MoveHead(-10, 20), Home(),
+                        Gesture("NOD"), SetPixel(3, 4, 5, 6)):
+            self.assertEqual(decode(encode(command)), command)
+
+    def test_unknown_command(self):
+        with self.assertRaises(KeyError):
+            decode(["Explode", 1])
+
+
+class TestArbiter(unittest.TestCase):
+    def test_round_robin_between_equal_clients(self):
+        arbiter = Arbiter()
+        arbiter.add("a")
+        arbiter.add("b")
+        for i in range(3):
+            arbiter.put("a", SetColor(i, 0, 0))
+        arbiter.put("b", MoveHead(1, 20))
+        order = [arbiter.get(0) for _ in range(4)]
+        self.assertEqual(order, [SetColor(0, 0, 0), MoveHead(1, 20),
+                                 SetColor(1, 0, 0), SetColor(2, 0, 0)])
+        self.assertIsNone(arbiter.get(0))
+
+    def test_higher_priority_first(self):
+        arbiter = Arbiter()
+        arbiter.add("skill")
+        arbiter.add("admin", priority=10)
+        arbiter.put("skill", SetColor(1, 0, 0))
+        arbiter.put("admin", Home())
+        self.assertEqual(arbiter.get(0), Home())
+        self.assertEqual(arbiter.get(0), SetColor(1, 0, 0))
+
+    def test_client_queue_is_bounded(self):
+        arbiter = Arbiter(size=2)
+        arbiter.add("a")
+        for i in range(4):
+            arbiter.put("a", SetColor(i, 0, 0))
+        self.assertEqual(arbiter.dropped["a"], 2)
+        self.assertEqual(arbiter.get(0), SetColor(2, 0, 0))
+
+
+class TestSerialBroker(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tama.sock")
+        self.serial = FakeSerial()
+        self.writer = EnclosureWriter(self.serial, FakeBus(),
+                                      {"trajectory": False})
+        self.broker = SerialBroker(self.writer, self.path,
+                                   {"priorities": {"admin": 10}})
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.stop()
+        self.broker.stop()
+        self.writer.stop()
+        self.dir.cleanup()
+
+    def connect(self, name, on_event=None):
+        client = BrokerClient(self.path, name, on_event)
+        self.clients.append(client)
+        return client
+
+    def wait_frames(self, count, timeout=2.0):
+        end = time.monotonic() + timeout
+        while len(self.serial.frames) < count and time.monotonic() < end:
+            time.sleep(0.01)
+        return self.serial.frames
+
+    def test_commands_from_several_clients(self):
+        self.connect("skill").write(SetColor(255, 0, 0))
+        self.connect("admin").write(MoveHead(-10, 20))
+        frames = self.wait_frames(2)
+        self.assertCountEqual(frames, [codec.colour((255, 0, 0)),
+                                       codec.move(-10, 20)])
+
+    def test_ttl_counts_from_arrival(self):
+        writer = HeldWriter()
+        broker = SerialBroker(writer, self.path + ".held")
+        self.addCleanup(broker.stop)
+        client = BrokerClient(self.path + ".held", "skill")
+        self.addCleanup(client.stop)
+        client.write(MoveHead(4, 20), ttl=0.05)
+        client.write(SetColor(1, 2, 3), ttl=5)
+        time.sleep(0.2)
+        writer.commands.room.set()
+        end = time.monotonic() + 2
+        while not writer.written and time.monotonic() < end:
+            time.sleep(0.01)
+        (command, ttl), = writer.written
+        self.assertEqual(command, SetColor(1, 2, 3))
+        self.assertLess(ttl, 5)
+        self.assertEqual(broker.stats()["expired"], 1)
+
+    def test_stats(self):
+        self.connect("skill")
+        end = time.monotonic() + 2
+        while not self.broker.stats()["clients"] and time.monotonic() < end:
+            time.sleep(0.01)
+        client, = self.broker.arbiter.dropped
+        self.broker.arbiter.dropped[client] = 3
+        self.assertEqual(self.broker.stats(),
+                         {"clients": ["skill"], "dropped": {"skill": 3},
+                          "expired": 0, "events_dropped": {}})
+
+    def test_client_priority_from_config(self):
+        self.connect("admin")
+        self.connect("skill")
+        end = time.monotonic() + 2
+        while len(self.broker.arbiter._priorities) < 2 and \
+                time.monotonic() < end:
+            time.sleep(0.01)
+        self.assertCountEqual(self.broker.arbiter._priorities.values(),
+                              [10, 0])
+
+    def test_events_reach_subscribers(self):
+        events = Queue()
+        self.connect("tool", lambda msg_type, data:
+                     events.put((msg_type, data)))
+        end = time.monotonic() + 2
+        while not self.broker._subscribers and time.monotonic() < end:
+            time.sleep(0.01)
+        self.broker.publish(Message("mycroft.volume.increase",
+                                    {"play_sound": True}))
+        self.assertEqual(events.get(timeout=2),
+                         ("mycroft.volume.increase", {"play_sound": True}))
+
+    def test_stalled_subscriber_does_not_block_publish(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(sock.close)
+        sock.connect(self.path)
+        # subscribes, then never reads
+        send_message(sock, {"hello": {"name": "stalled", "subscribe": True}})
+        end = time.monotonic() + 2
+        while not self.broker._subscribers and time.monotonic() < end:
+            time.sleep(0.01)
+        start = time.monotonic()
+        for _ in range(200):
+            self.broker.publish(Message("enclosure.test",
+                                        {"padding": "x" * 10000}))
+        self.assertLess(time.monotonic() - start, 0.5)
+        subscriber, = self.broker._subscribers.values()
+        self.assertGreater(subscriber.dropped, 0)
@@ -0,0 +1,124 @@
+import io
+import os
+import re
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+
+from ovos_bus_client import Message
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.arduino import EnclosureWriter
+from ovos_PHAL_tama.capture import SETTLE_TIME, CommandCapture, load, \
+    main, replay
+from ovos_PHAL_tama.commands import Eyelids, Gesture, MoveHead, SetColor, \
+    Spin
+from ovos_PHAL_tama.emulator import HeadEmulator
+
+from fakes import FakeBus, FakeClock, FakeSerial
+
+
+class FakeWriter:
+    def __init__(self, clock):
+        self.clock = clock
+        self.written = []
+
+    def write(self, command, ttl=None):
+        self.written.append((self.clock(), command, ttl))
+
+
+SESSION = [(0.0, None, Eyelids(True)), (0.5, None, SetColor(1, 2, 3)),
+           (1.5, 0.2, MoveHead(-10, 20)), (2.0, None, Gesture("NOD"))]
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "session.jsonl")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def capture(self):
+        clock = FakeClock()
+        capture = CommandCapture(self.path, clock)
+        for offset, ttl, command in SESSION:
+            clock.now = offset
+            capture.record(command, ttl)
+        capture.close()
+        return capture
+
+    def test_round_trip(self):
+        self.assertEqual(self.capture().count, 4)
+        self.assertEqual(load(self.path), SESSION)
+
+    def test_replay_pacing(self):
+        clock = FakeClock()
+        writer = FakeWriter(clock)
+        elapsed = replay(SESSION, writer, speed=2, clock=clock,
+                         sleep=clock.sleep)
+        self.assertEqual([t for t, _, _ in writer.written],
+                         [0.0, 0.25, 0.75, 1.0])
+        self.assertEqual(writer.written[2][2], 0.2)
+        self.assertEqual(elapsed, 1.0)
+
+    def test_replay_max_throughput(self):
+        clock = FakeClock()
+        writer = FakeWriter(clock)
+        replay(SESSION, writer, speed=0, clock=clock, sleep=clock.sleep)
+        self.assertEqual([t for t, _, _ in writer.written], [0.0] * 4)
+
+    def test_writer_capture_on_the_bus(self):
+        bus = FakeBus()
+        writer = EnclosureWriter(HeadEmulator(0, url="loop://").connect(),
+                                 bus, {"trajectory": False})
+        writer.write(SetColor(9, 9, 9))
+        bus.handlers["enclosure.capture.start"](
+            Message("enclosure.capture.start", {"path": self.path}))
+        writer.write("COL:1:2:3")
+        writer.write(MoveHead(4, 20))
+        bus.handlers["enclosure.capture.stop"](
+            Message("enclosure.capture.stop"))
+        writer.write(SetColor(0, 0, 0))
+        writer.stop()
+        self.assertEqual([command for _, _, command in load(self.path)],
+                         [SetColor(1, 2, 3), MoveHead(4, 20)])
+        self.assertEqual(bus.emitted[-1].data["count"], 2)
+
+    def test_replay_into_emulator(self):
+        self.capture()
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main([self.path, "--emulator", "--speed", "0",
+                  "--baudrate", "115200"])
+        self.assertIn("eyes ((1, 2, 3), (1, 2, 3))", out.getvalue())
+        self.assertIn("replayed 4 commands", out.getvalue())
+        # the summary waits for every frame written to reach the emulator
+        sent = re.search(r"frames (\d+) suppressed", out.getvalue())
+        self.assertIn(f"emulator received {sent.group(1)} frames",
+                      out.getvalue())
+
+    def test_replay_with_untimed_spin_ends(self):
+        clock = FakeClock()
+        capture = CommandCapture(self.path, clock)
+        capture.record(SetColor(1, 2, 3))
+        capture.record(Spin())
+        capture.close()
+        out = io.StringIO()
+        start = time.monotonic()
+        with redirect_stdout(out):
+            main([self.path, "--emulator", "--speed", "0",
+                  "--baudrate", "115200"])
+        self.assertLess(time.monotonic() - start, SETTLE_TIME + 2)
+        self.assertIn("replayed 2 commands", out.getvalue())
+
+    def test_max_throughput_drops_nothing(self):
+        serial = FakeSerial()
+        writer = EnclosureWriter(serial, FakeBus(), {"trajectory": False})
+        entries = [(0.0, None, SetColor(i, 0, 0)) for i in range(200)]
+        replay(entries, writer, speed=0)
+        writer.commands.join()
+        writer.stop()
+        self.assertEqual(len(serial.frames), 200)
+        self.assertEqual(serial.frames[-1], codec.colour((199, 0, 0)))
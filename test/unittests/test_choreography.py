@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.arduino import EnclosureWriter
+from ovos_PHAL_tama.choreography import compile_choreography, \
+    load_choreographies
+from ovos_PHAL_tama.commands import Gesture, MoveHead
+
+from fakes import FakeBus, FakeSerial
+
+
+class TestCompile(unittest.TestCase):
+    def test_frames_built_once(self):
+        cues = compile_choreography([
+            {"eyes": "PINK", "lids": False},
+            {"delay": 0.5, "eyes": [[1, 2, 3], [4, 5, 6]], "head": [10, 0]}])
+        self.assertEqual(cues[0].eyes, codec.preset("PINK"))
+        self.assertEqual(cues[0].preset, "P")
+        self.assertEqual(cues[0].lids, codec.CLOSE_FRAME)
+        self.assertEqual(cues[1].delay, 0.5)
+        self.assertEqual(cues[1].eyes, codec.colour((1, 2, 3), (4, 5, 6)))
+        self.assertEqual(cues[1].head, (10, 0))
+
+    def test_invalid(self):
+        for keyframes in ([], [{}], [{"eyes": "PURPLE"}],
+                          [{"eyes": [1, 2, 300]}], [{"head": [1]}],
+                          [{"delay": -1, "lids": True}],
+                          [{"lids": True, "sound": "beep"}]):
+            with self.assertRaises(ValueError):
+                compile_choreography(keyframes)
+
+    def test_user_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "gestures.json")
+            with open(path, "w") as f:
+                json.dump({"NOD": [{"head": [0, 10]}],
+                           "WINK": [{"lids": False}, {"delay": 0.1,
+                                                      "lids": True}],
+                           "BROKEN": [{"eyes": "PURPLE"}]}, f)
+            compiled = load_choreographies(path)
+        self.assertEqual(len(compiled["NOD"]), 1)
+        self.assertIn("SHAKE", compiled)
+        self.assertIn("WINK", compiled)
+        self.assertNotIn("BROKEN", compiled)
+
+
+class TestPlay(unittest.TestCase):
+    def setUp(self):
+        self.serial = FakeSerial()
+        self.writer = EnclosureWriter(self.serial, FakeBus(),
+                                      {"trajectory": False})
+
+    def tearDown(self):
+        self.writer.stop()
+
+    def test_expression(self):
+        self.writer.write(Gesture("TALK"))
+        self.writer.commands.join()
+        self.assertEqual(self.serial.frames, [codec.preset("PINK")])
+        self.assertEqual(self.writer.last_col, "P")
+        self.assertEqual(self.writer.eye_cols, [[200, 0, 200]] * 2)
+
+    def test_routes_follow_what_moves(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "gestures.json")
+            with open(path, "w") as f:
+                json.dump({"PEEK": [{"head": [5, 0]}],
+                           "BLUSH": [{"eyes": "PINK"}]}, f)
+            writer = EnclosureWriter(self.serial, FakeBus(),
+                                     {"trajectory": False,
+                                      "choreography": path})
+        writer.stop()
+        for name in ("NOD", "SHAKE", "PEEK"):
+            self.assertEqual(writer.routes[name], ('eyes', 'head', None))
+        for name in ("TALK", "LISTEN", "THINK", "TALK_OVER", "BLUSH"):
+            self.assertEqual(writer.routes[name], ('eyes', 'eyes', 'eyes'))
+
+    def test_shake_expression(self):
+        self.writer.write(Gesture("SHAKE"))
+        self.writer.commands.join()
+        self.assertEqual(self.serial.frames[0], codec.preset("PINK"))
+        time.sleep(1)
+        self.assertEqual(self.serial.frames[-2:],
+                         [codec.preset("GREEN"), codec.move(0, 20)])
+
+    def test_gesture_steps_from_current_pose(self):
+        self.writer.write(MoveHead(-10, 20))
+        self.writer.commands.join()
+        self.writer.choreographies["PEEK"] = compile_choreography(
+            [{"head": [5, 0], "eyes": [9, 9, 9]}])
+        self.writer.write(Gesture("PEEK"))
+        self.writer.commands.join()
+        self.assertEqual(self.serial.frames[1:],
+                         [codec.colour((9, 9, 9)), codec.move(-5, 20)])
@@ -0,0 +1,27 @@
+import unittest
+
+from ovos_PHAL_tama import codec
+
+
+class TestCodec(unittest.TestCase):
+    def test_preset(self):
+        self.assertEqual(codec.preset('YELLOW'), b'EY\x01\x00')
+        self.assertEqual(codec.preset('NONE'), b'EN\x01\x00')
+
+    def test_lids(self):
+        self.assertEqual(codec.lids(True), b'T\x01')
+        self.assertEqual(codec.lids(False), b'T\x00')
+
+    def test_move(self):
+        self.assertEqual(codec.move(-12, 20), b'M\x01\x0c\x01\x14\x00\x00')
+        self.assertEqual(codec.move(30, -5), b'M\xff\x1e\xff\x05\x00\x00')
+        self.assertEqual(codec.HOME_FRAME, b'M\x01\x00\x01\x00\x00\x00')
+
+    def test_colour(self):
+        self.assertEqual(codec.colour((1, 2, 3)), b'C\x01\x02\x03\x01\x02\x03')
+        self.assertEqual(codec.colour((1, 2, 3), (4.9, 5, 6)),
+                         b'C\x01\x02\x03\x04\x05\x06')
+
+    def test_out_of_range(self):
+        with self.assertRaises(Exception):
+            codec.move(300, 0)
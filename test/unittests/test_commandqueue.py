@@ -0,0 +1,98 @@
+import unittest
+from queue import Empty
+from threading import Thread
+
+from ovos_PHAL_tama.commandqueue import CommandQueue, DROP_NEW, \
+    DROP_OLDEST, COALESCE
+
+from fakes import FakeClock
+
+
+class TestCommandQueue(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.queue = CommandQueue([('safety', 2, DROP_OLDEST),
+                                   ('eyes', 3, DROP_NEW),
+                                   ('look', 2, COALESCE)], clock=self.clock)
+
+    def drain(self):
+        commands = []
+        while True:
+            try:
+                commands.append(self.queue.get(timeout=0).command)
+            except Empty:
+                return commands
+
+    def test_fifo(self):
+        for c in ("a", "b", "c"):
+            self.queue.put(c, 'eyes')
+        self.assertEqual(self.drain(), ["a", "b", "c"])
+
+    def test_priority(self):
+        self.queue.put("MOVE", 'look')
+        self.queue.put("PINK", 'eyes')
+        self.queue.put("CLOSE", 'safety')
+        self.assertEqual(self.drain(), ["CLOSE", "PINK", "MOVE"])
+
+    def test_channel_order_kept(self):
+        self.queue.put("AVR", 'eyes', channel='head')
+        self.queue.put("PINK", 'eyes', channel='eyes')
+        self.queue.put("HOME", 'safety', channel='head')
+        self.queue.put("CLOSE", 'safety', channel='lids')
+        self.assertEqual(self.drain(), ["AVR", "HOME", "CLOSE", "PINK"])
+
+    def test_coalesce_keeps_newest(self):
+        self.queue.put("MOVE:1", 'look', key="head")
+        self.queue.put("OPEN", 'safety')
+        self.queue.put("MOVE:2", 'look', key="head")
+        self.queue.put("HOME", 'safety', key="head")
+        self.assertEqual(self.drain(), ["OPEN", "HOME"])
+        self.assertEqual(self.queue.stats['look']['coalesced'], 2)
+
+    def test_overflow_policies(self):
+        for c in ("a", "b", "c"):
+            self.assertTrue(self.queue.put(c, 'safety'))
+        for c in ("d", "e", "f", "g"):
+            self.queue.put(c, 'eyes')
+        for c in ("h", "i", "j"):
+            self.assertTrue(self.queue.put(c, 'look'))
+        self.assertEqual(self.drain(), ["b", "c", "d", "e", "f", "h", "j"])
+        self.assertEqual(self.queue.stats['safety']['dropped'], 1)
+        self.assertEqual(self.queue.stats['eyes']['dropped'], 1)
+        self.assertEqual(self.queue.stats['look']['coalesced'], 1)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            CommandQueue([('safety', 2, 'block')])
+
+    def test_deadline(self):
+        self.queue.put("MOVE:1", 'look', ttl=0.5)
+        self.queue.put("OPEN", 'safety')
+        self.clock.now = 1.0
+        self.assertEqual(self.drain(), ["OPEN"])
+        self.assertEqual(self.queue.stats['look']['expired'], 1)
+
+    def test_join(self):
+        self.queue.put("a", 'eyes', ttl=0.1)
+        self.queue.put("b", 'eyes')
+        self.clock.now = 1.0
+        self.queue.get(timeout=0)
+        self.queue.task_done()
+        self.queue.join()
+
+    def test_wait_below(self):
+        self.queue.put("a", 'eyes')
+        self.queue.put("b", 'eyes')
+        self.assertFalse(self.queue.wait_below(2, timeout=0))
+        self.queue.get(timeout=0)
+        self.assertTrue(self.queue.wait_below(2, timeout=0))
+
+    def test_expiry_wakes_join(self):
+        self.queue.put("a", 'eyes', ttl=0.1)
+        joined = Thread(target=self.queue.join, daemon=True)
+        joined.start()
+        self.clock.now = 1.0
+        with self.assertRaises(Empty):
+            self.queue.get(timeout=0)
+        joined.join(1)
+        self.assertFalse(joined.is_alive())
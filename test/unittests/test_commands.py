@@ -0,0 +1,41 @@
+import unittest
+
+from ovos_PHAL_tama.commands import ARROWS, Blink, Brightness, EyePreset, \
+    Eyelids, Fill, Gesture, Home, MoveHead, Narrow, Nudge, SetColor, \
+    SetPixel, Spin, Squint, parse
+
+
+class TestCommands(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse("COL:1:2:3"), SetColor(1, 2, 3))
+        self.assertEqual(parse("MOVE:0:12:0:-5:\n"), MoveHead(12, -5))
+        self.assertEqual(parse("SQUINT:L:50"), Squint('L', 50))
+        self.assertEqual(parse("YELLOW"), EyePreset('YELLOW'))
+        self.assertEqual(parse("SHAKE"), Gesture('SHAKE'))
+        self.assertEqual(parse("CLOSE"), Eyelids(False))
+        self.assertEqual(parse("HOME"), Home())
+        self.assertEqual(parse("\x1b[D"), Nudge(-1, 0))
+        self.assertEqual(parse("HSV:0:1:1"), SetColor(255, 0, 0))
+
+    def test_parse_eye_effects(self):
+        self.assertEqual(parse("eyes.blink=l"), Blink('l'))
+        self.assertEqual(parse("eyes.narrow"), Narrow())
+        self.assertEqual(parse("eyes.spin"), Spin())
+        self.assertEqual(parse("eyes.spin=5000"), Spin(5000))
+        self.assertEqual(parse("eyes.fill=23"), Fill(100))
+        self.assertEqual(parse("eyes.level=12"), Brightness(12))
+        self.assertEqual(parse("eyes.set=1,65280"), SetPixel(1, 0, 255, 0))
+
+    def test_unknown(self):
+        self.assertIsNone(parse("eyes.wink"))
+        self.assertIsNone(parse("COLOUR"))
+
+    def test_opcodes(self):
+        self.assertEqual(Eyelids(True).opcode, 'OPEN')
+        self.assertEqual(EyePreset('PINK').opcode, 'PINK')
+        self.assertEqual(MoveHead(1, 2).opcode, 'MOVE')
+        self.assertTrue(all(n.opcode == 'NUDGE' for n in ARROWS.values()))
+
+    def test_slotted(self):
+        with self.assertRaises(AttributeError):
+            SetColor(1, 2, 3).alpha = 1
@@ -0,0 +1,87 @@
+import os
+import time
+import unittest
+from unittest import mock
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.arduino import EnclosureReader, EnclosureWriter
+from ovos_PHAL_tama.commands import MoveHead, SetColor
+from ovos_PHAL_tama.emulator import HeadEmulator
+from ovos_PHAL_tama.shadow import HOME_POSE
+
+from fakes import FakeBus, FakeClock
+
+
+class TestHeadEmulator(unittest.TestCase):
+    def test_frames_update_state(self):
+        emulator = HeadEmulator(0, url="loop://")
+        emulator.feed(codec.preset('PINK') + codec.lids(True) +
+                      codec.move(-4, 9)[:3])
+        self.assertEqual(emulator.eyes, ((200, 0, 200),) * 2)
+        self.assertTrue(emulator.lids)
+        self.assertEqual(emulator.head, HOME_POSE)
+        emulator.feed(codec.move(-4, 9)[3:] + codec.colour((1, 2, 3),
+                                                           (4, 5, 6)))
+        self.assertEqual(emulator.head, (-4, 9))
+        self.assertEqual(emulator.eyes, ((1, 2, 3), (4, 5, 6)))
+        self.assertEqual(emulator.count, 4)
+        emulator.stop()
+
+    def test_loop_text_commands_and_reports(self):
+        emulator = HeadEmulator(0, url="loop://")
+        port = emulator.connect()
+        port.write(b'system.version\n')
+        self.assertEqual(port.readline(), b'Command: system.version\r\n')
+        emulator.report("unit.reboot")
+        self.assertEqual(port.readline(), b'unit.reboot\r\n')
+        emulator.stop()
+
+    def test_baud_timing(self):
+        clock = FakeClock()
+        # the emulator waits out the wire time on a clock that only moves
+        # when it sleeps, so the timestamps are exact
+        with mock.patch("ovos_PHAL_tama.emulator.time", clock):
+            emulator = HeadEmulator(9600, url="loop://")
+            port = emulator.connect()
+            for _ in range(20):
+                port.write(codec.move(1, 1))
+            self.assertTrue(emulator.wait_for(20))
+            emulator.stop()
+        # 140 bytes at 960 bytes/s
+        self.assertAlmostEqual(clock.now, 140 / 960)
+        stamps = [timestamp for timestamp, _ in emulator.frames]
+        self.assertAlmostEqual(stamps[0], 7 / 960)
+        self.assertAlmostEqual(stamps[-1] - stamps[0], 19 * 7 / 960)
+
+
+@unittest.skipUnless(hasattr(os, "openpty"), "needs a pseudo-terminal")
+class TestEmulatorEndToEnd(unittest.TestCase):
+    def setUp(self):
+        self.emulator = HeadEmulator(115200)
+        self.port = self.emulator.connect(timeout=0.1)
+        self.bus = FakeBus()
+
+    def tearDown(self):
+        self.port.close()
+        self.emulator.stop()
+
+    def test_writer(self):
+        writer = EnclosureWriter(self.port, self.bus, {"trajectory": False})
+        writer.write("OPEN")
+        writer.write(SetColor(10, 20, 30))
+        writer.write(MoveHead(12, -5))
+        self.assertTrue(self.emulator.wait_for(3))
+        writer.stop()
+        self.assertTrue(self.emulator.lids)
+        self.assertEqual(self.emulator.eyes, ((10, 20, 30),) * 2)
+        self.assertEqual(self.emulator.head, (12, -5))
+
+    def test_reader(self):
+        reader = EnclosureReader(self.port, self.bus)
+        self.emulator.report("volume.up")
+        deadline = time.monotonic() + 2
+        while not self.bus.emitted and time.monotonic() < deadline:
+            time.sleep(0.01)
+        reader.stop()
+        self.assertIn("mycroft.volume.increase",
+                      [m.msg_type for m in self.bus.emitted])
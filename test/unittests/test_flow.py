@@ -0,0 +1,119 @@
+import time
+import unittest
+from threading import Thread
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.arduino import EnclosureReader, EnclosureWriter
+from ovos_PHAL_tama.commands import SetColor
+from ovos_PHAL_tama.emulator import VERSION, HeadEmulator
+from ovos_PHAL_tama.flow import CreditWindow
+from ovos_PHAL_tama.rpc import HeadRpc
+
+from fakes import FakeBus, FakeClock
+
+
+class TestCreditWindow(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.flow = CreditWindow(window=2, timeout=1.0, clock=self.clock)
+
+    def test_round_trip(self):
+        self.flow.acquire()
+        self.flow.sent('MOVE', codec.move(1, 1))
+        self.clock.now = 0.25
+        self.assertEqual(self.flow.ack('M'), 0.25)
+        stats = self.flow.stats()
+        self.assertEqual(stats["acked"], 1)
+        self.assertEqual(stats["outstanding"], 0)
+        self.assertEqual(stats["rtt"]["MOVE"]["count"], 1)
+        self.assertEqual(stats["rtt_p50_ms"], 250)
+
+    def test_skipped_frames_are_lost(self):
+        self.flow.sent('YELLOW', codec.preset('YELLOW'))
+        self.flow.sent('OPEN', codec.OPEN_FRAME)
+        self.assertIsNone(self.flow.ack('C'))
+        self.flow.ack('T')
+        self.assertEqual((self.flow.acked, self.flow.lost), (1, 1))
+
+    def test_handle_line(self):
+        self.flow.sent('OPEN', codec.OPEN_FRAME)
+        self.assertTrue(self.flow.handle_line("ack:T"))
+        self.assertFalse(self.flow.handle_line("unit.reboot"))
+        self.assertEqual(self.flow.acked, 1)
+
+    def test_blocks_until_acked(self):
+        flow = CreditWindow(window=1, timeout=5)
+        flow.sent('OPEN', codec.OPEN_FRAME)
+        done = []
+        waiter = Thread(target=lambda: done.append(flow.acquire()))
+        waiter.start()
+        time.sleep(0.05)
+        self.assertEqual(done, [])
+        flow.ack('T')
+        waiter.join(1)
+        self.assertEqual(done, [None])
+        self.assertEqual(flow.stalls, 1)
+
+    def test_timeout_returns_credit(self):
+        flow = CreditWindow(window=1, timeout=0.05)
+        flow.sent('OPEN', codec.OPEN_FRAME)
+        flow.acquire()
+        self.assertEqual((flow.lost, flow.outstanding), (1, 0))
+
+
+class TestAcknowledgedLink(unittest.TestCase):
+    def run_burst(self, flow):
+        emulator = HeadEmulator(115200, url="loop://", ack=True,
+                                rx_buffer=32, frame_time=0.005)
+        port = emulator.connect(timeout=0.1)
+        bus = FakeBus()
+        config = {"trajectory": False}
+        if flow:
+            config["flow"] = {"window": 2}
+        writer = EnclosureWriter(port, bus, config)
+        reader = EnclosureReader(port, bus, flow=writer.flow)
+        for i in range(40):
+            writer.write(SetColor(i, 0, 0))
+            time.sleep(0.001)
+        writer.commands.join()
+        time.sleep(0.3)
+        writer.stop()
+        reader.stop()
+        emulator.stop()
+        return emulator, writer, bus
+
+    def test_flow_control_avoids_overruns(self):
+        emulator, writer, bus = self.run_burst(flow=True)
+        self.assertEqual(emulator.overruns, 0)
+        self.assertEqual(writer.flow.lost, 0)
+        self.assertGreater(writer.flow.acked, 0)
+        self.assertEqual(emulator.eyes[0], (39, 0, 0))
+        # acks never reach the bus
+        self.assertFalse(any(m.msg_type.startswith("ack:")
+                             for m in bus.emitted))
+
+    def test_overrun_without_flow_control(self):
+        emulator, _, _ = self.run_burst(flow=False)
+        self.assertGreater(emulator.overruns, 0)
+
+    def test_rpc_lines_take_no_credit(self):
+        emulator = HeadEmulator(115200, url="loop://", ack=True, rpc=True)
+        port = emulator.connect(timeout=0.1)
+        bus = FakeBus()
+        writer = EnclosureWriter(port, bus, {"trajectory": False,
+                                             "flow": {"window": 2}})
+        rpc = HeadRpc(writer, timeout=2.0)
+        reader = EnclosureReader(port, bus, flow=writer.flow, rpc=rpc)
+        try:
+            for _ in range(3):
+                self.assertEqual(rpc.version(), VERSION)
+            writer.write(SetColor(1, 2, 3))
+            writer.commands.join()
+            time.sleep(0.1)
+            stats = writer.flow.stats()
+            self.assertEqual((stats["lost"], stats["outstanding"]), (0, 0))
+            self.assertEqual(stats["acked"], 1)
+        finally:
+            writer.stop()
+            reader.stop()
+            emulator.stop()
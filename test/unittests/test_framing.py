@@ -0,0 +1,29 @@
+import unittest
+
+from ovos_PHAL_tama.framing import LineFramer
+
+
+class TestLineFramer(unittest.TestCase):
+    def test_lf_and_crlf(self):
+        framer = LineFramer()
+        self.assertEqual(framer.feed(b'volume.up\r\nmycroft.stop\n\r\n'),
+                         [b'volume.up', b'mycroft.stop'])
+
+    def test_lines_split_across_reads(self):
+        framer = LineFramer()
+        self.assertEqual(framer.feed(b'unit.re'), [])
+        self.assertEqual(framer.feed(b'boot\r'), [])
+        self.assertEqual(framer.feed(b'\nvolume'), [b'unit.reboot'])
+        self.assertEqual(framer.feed(b'.down\n'), [b'volume.down'])
+
+    def test_noise_without_line_end_is_dropped(self):
+        framer = LineFramer(max_line=8)
+        self.assertEqual(framer.feed(b'\xff' * 9), [])
+        self.assertEqual(framer.dropped, 9)
+        self.assertEqual(framer.feed(b'ack:1\n'), [b'ack:1'])
+
+    def test_clear(self):
+        framer = LineFramer()
+        framer.feed(b'partial')
+        framer.clear()
+        self.assertEqual(framer.feed(b'volume.up\n'), [b'volume.up'])
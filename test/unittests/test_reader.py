@@ -0,0 +1,94 @@
+import time
+import unittest
+
+import serial
+
+from ovos_PHAL_tama.arduino import PAUSE_TIME, EnclosureReader
+
+from fakes import FakeBus
+
+
+class FakeTransport:
+    on_line = None
+
+
+class TestEnclosureReader(unittest.TestCase):
+    def setUp(self):
+        self.bus = FakeBus()
+        # with a transport no read thread is started
+        self.reader = EnclosureReader(None, self.bus,
+                                      transport=FakeTransport())
+
+    def emitted(self):
+        return [(m.msg_type, m.data) for m in self.bus.emitted]
+
+    def test_known_lines(self):
+        self.reader.process("volume.up")
+        self.reader.process("Command: system.version\r")
+        self.reader.process("mycroft.stop")
+        self.assertEqual(self.emitted(),
+                         [("mycroft.volume.increase", {"play_sound": True}),
+                          ("enclosure.started", {}),
+                          ("mycroft.stop", {})])
+        self.assertEqual((self.reader.handled, self.reader.unhandled),
+                         (3, 0))
+
+    def test_unknown_lines_fall_back(self):
+        self.reader.process("button.long-press")
+        self.assertEqual(self.emitted(), [("button.long-press", {})])
+        self.assertEqual(self.reader.unhandled, 1)
+
+    def test_registered_handler(self):
+        seen = []
+        self.reader.register_handler("unit.temperature", seen.append)
+        self.reader.process("unit.temperature=41")
+        self.assertEqual(seen, ["unit.temperature=41"])
+        self.assertEqual(self.bus.emitted, [])
+
+    def test_reboot_does_not_block_the_read_loop(self):
+        start = time.monotonic()
+        self.reader.process("unit.reboot")
+        self.assertLess(time.monotonic() - start, PAUSE_TIME / 2)
+        self.assertEqual([t for t, _ in self.emitted()],
+                         ["enclosure.eyes.color", "enclosure.eyes.spin",
+                          "enclosure.mouth.reset"])
+        # reports arriving meanwhile are handled at once
+        self.reader.process("volume.down")
+        self.assertEqual(self.emitted()[-1][0], "mycroft.volume.decrease")
+        deadline = time.monotonic() + 2
+        while len(self.bus.emitted) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.emitted()[-1][0], "system.reboot")
+        self.assertGreaterEqual(time.monotonic() - start, PAUSE_TIME)
+
+
+class TestReadLoop(unittest.TestCase):
+    def setUp(self):
+        self.bus = FakeBus()
+        # a quiet head: reads block for the whole timeout
+        self.port = serial.serial_for_url("loop://", timeout=5)
+        self.reader = EnclosureReader(self.port, self.bus)
+
+    def tearDown(self):
+        self.reader.stop()
+        self.port.close()
+
+    def test_frames_partial_reads(self):
+        for chunk in (b'volu', b'me.up\r', b'\nmycroft.stop\nvolume.d',
+                      b'own\r\n'):
+            self.port.write(chunk)
+            time.sleep(0.02)
+        deadline = time.monotonic() + 2
+        while len(self.bus.emitted) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([m.msg_type for m in self.bus.emitted],
+                         ["mycroft.volume.increase", "mycroft.stop",
+                          "mycroft.volume.decrease"])
+
+    def test_stop_wakes_the_read_loop(self):
+        time.sleep(0.05)
+        start = time.monotonic()
+        self.reader.stop()
+        self.reader.join(2)
+        self.assertFalse(self.reader.is_alive())
+        self.assertLess(time.monotonic() - start, 1)
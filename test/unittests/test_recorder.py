@@ -0,0 +1,36 @@
+import unittest
+
+from ovos_PHAL_tama.recorder import FlightRecorder, load
+
+
+class TestFlightRecorder(unittest.TestCase):
+    def test_partial_buffer(self):
+        recorder = FlightRecorder(4)
+        recorder.record('OPEN', b'T\x01', 0.5, timestamp=1.0)
+        recorder.record('MOVE', b'M\x01\x0c\x01\x14\x00\x00', timestamp=2.0)
+        entries = recorder.entries()
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0], {"timestamp": 1.0, "wait": 0.5,
+                                      "opcode": "OPEN", "frame": "5401"})
+        self.assertEqual(entries[1]["frame"], "4d010c01140000")
+
+    def test_wraps_oldest_first(self):
+        recorder = FlightRecorder(3)
+        for i in range(5):
+            recorder.record(str(i), bytes([i]), timestamp=float(i))
+        self.assertEqual(len(recorder), 3)
+        self.assertEqual([e["opcode"] for e in recorder.entries()],
+                         ["2", "3", "4"])
+
+    def test_snapshot_is_compact(self):
+        recorder = FlightRecorder(100)
+        for i in range(250):
+            recorder.record('MOVE', b'M' * 7)
+        snapshot = recorder.snapshot()
+        self.assertEqual(len(snapshot), len(FlightRecorder(1).snapshot()) +
+                         100 * 44)
+        self.assertEqual(len(load(snapshot)), 100)
+
+    def test_bad_snapshot(self):
+        with self.assertRaises(ValueError):
+            load(b'\x00' * 12)
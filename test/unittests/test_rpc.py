@@ -0,0 +1,96 @@
+import unittest
+from concurrent.futures import TimeoutError
+
+from ovos_bus_client import Message
+
+from ovos_PHAL_tama.arduino import EnclosureReader, EnclosureWriter
+from ovos_PHAL_tama.commands import MoveHead, SetColor
+from ovos_PHAL_tama.emulator import VERSION, HeadEmulator
+from ovos_PHAL_tama.rpc import HeadRpc, RpcError
+
+from fakes import FakeBus, FakeClock
+
+
+class FakeWriter:
+    def __init__(self):
+        self.written = []
+
+    def write(self, command, ttl=None):
+        self.written.append(command)
+
+
+class TestHeadRpc(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.writer = FakeWriter()
+        self.rpc = HeadRpc(self.writer, timeout=1.0, clock=self.clock)
+
+    def test_reply_matched_by_id(self):
+        first = self.rpc.call("head.pos")
+        second = self.rpc.call("system.version")
+        ids = [request.id for request in self.writer.written]
+        self.clock.now = 0.25
+        self.assertTrue(self.rpc.handle_line(f"rpc:{ids[1]}:1.2"))
+        self.assertTrue(self.rpc.handle_line(f"rpc:{ids[0]}:3,20"))
+        self.assertEqual(first.result(0), "3,20")
+        self.assertEqual(second.result(0), "1.2")
+        stats = self.rpc.stats()
+        self.assertEqual((stats["completed"], stats["pending"]), (2, 0))
+        self.assertEqual(stats["rtt"]["head.pos"]["max_ms"], 250)
+
+    def test_errors(self):
+        failing = self.rpc.call("eyes.wink")
+        unsupported = self.rpc.call("head.pos")
+        first, second = (request.id for request in self.writer.written)
+        self.rpc.handle_line(f"rpc:{first}:!unknown method eyes.wink")
+        # firmware without RPC echoes the request
+        self.rpc.handle_line(f"Command: rpc:{second}:head.pos")
+        with self.assertRaises(RpcError):
+            failing.result(0)
+        with self.assertRaises(RpcError):
+            unsupported.result(0)
+        self.assertEqual(self.rpc.failed, 2)
+
+    def test_timeout(self):
+        future = self.rpc.call("head.pos")
+        self.clock.now = 1.5
+        self.assertEqual(self.rpc.stats()["timeouts"], 1)
+        with self.assertRaises(TimeoutError):
+            future.result(0)
+        # a late reply is consumed but completes nothing
+        self.assertTrue(self.rpc.handle_line(
+            f"rpc:{self.writer.written[0].id}:0,20"))
+        self.assertFalse(self.rpc.handle_line("volume.up"))
+
+    def test_bus_query(self):
+        bus = FakeBus()
+        rpc = HeadRpc(self.writer, bus)
+        bus.handlers["enclosure.head.query"](
+            Message("enclosure.head.query", {"method": "eyes.lids"}))
+        rpc.handle_line(f"rpc:{self.writer.written[0].id}:1")
+        self.assertEqual(bus.emitted[0].msg_type,
+                         "enclosure.head.query.response")
+        self.assertEqual(bus.emitted[0].data,
+                         {"method": "eyes.lids", "result": "1"})
+
+
+class TestEmulatedHead(unittest.TestCase):
+    def setUp(self):
+        self.emulator = HeadEmulator(0, url="loop://", rpc=True)
+        port = self.emulator.connect(timeout=0.1)
+        bus = FakeBus()
+        self.writer = EnclosureWriter(port, bus, {"trajectory": False})
+        self.rpc = HeadRpc(self.writer, timeout=2.0)
+        self.reader = EnclosureReader(port, bus, rpc=self.rpc)
+
+    def tearDown(self):
+        self.writer.stop()
+        self.reader.stop()
+        self.emulator.stop()
+
+    def test_queries(self):
+        self.writer.write(MoveHead(-12, 20))
+        self.writer.write(SetColor(1, 2, 3))
+        self.assertEqual(self.rpc.version(), VERSION)
+        self.assertEqual(self.rpc.head_position(), (-12, 20))
+        self.assertEqual(self.rpc.eye_colours(), ((1, 2, 3), (1, 2, 3)))
@@ -0,0 +1,46 @@
+import unittest
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.shadow import HOME_POSE, DeviceShadow
+
+
+class TestDeviceShadow(unittest.TestCase):
+    def setUp(self):
+        self.shadow = DeviceShadow()
+
+    def test_unknown_until_written(self):
+        self.assertIsNone(self.shadow.pixels())
+        self.assertIsNone(self.shadow.head)
+        self.assertTrue(self.shadow.update(codec.lids(False)))
+        self.assertFalse(self.shadow.update(codec.lids(False)))
+        self.assertTrue(self.shadow.update(codec.lids(True)))
+
+    def test_preset_and_colour_compare_by_rgb(self):
+        self.assertTrue(self.shadow.update(codec.preset('YELLOW')))
+        self.assertFalse(self.shadow.update(codec.colour((200, 200, 0))))
+        self.assertTrue(self.shadow.update(codec.colour((200, 200, 0),
+                                                        (100, 100, 0))))
+        self.assertEqual(self.shadow.pixels(),
+                         [(200, 200, 0), (100, 100, 0)])
+        self.assertEqual(self.shadow.suppressed['eyes'], 1)
+
+    def test_head_pose(self):
+        for x, y in ((3, 4), (-3, -4), (0, 0), (-127, 127)):
+            self.shadow.update(codec.move(x, y))
+            self.assertEqual(self.shadow.head, (x, y))
+        self.shadow.update(codec.HOME_FRAME)
+        self.assertEqual(self.shadow.head, HOME_POSE)
+        # HOME is always sent after a move, even to the home pose
+        self.assertTrue(self.shadow.update(codec.move(*HOME_POSE)))
+        self.assertTrue(self.shadow.update(codec.HOME_FRAME))
+        self.assertFalse(self.shadow.update(codec.HOME_FRAME))
+
+    def test_unknown_frames_always_sent(self):
+        self.assertTrue(self.shadow.update(b'Px'))
+        self.assertTrue(self.shadow.update(b'Px'))
+
+    def test_invalidate(self):
+        self.shadow.update(codec.move(1, 1))
+        self.shadow.invalidate()
+        self.assertIsNone(self.shadow.head)
+        self.assertTrue(self.shadow.update(codec.move(1, 1)))
@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.arduino import EnclosureWriter
+from ovos_PHAL_tama.commands import PRESETS, Eyelids, Home, MoveHead, \
+    SetColor
+from ovos_PHAL_tama.shadow import DeviceShadow
+from ovos_PHAL_tama.snapshot import load_state, save_state
+
+from fakes import FakeBus, FakeSerial
+
+
+class TestSnapshotFile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tama", "state.json")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        save_state({"av": "L"}, self.path)
+        self.assertEqual(load_state(self.path)["av"], "L")
+        self.assertEqual(os.listdir(os.path.dirname(self.path)),
+                         ["state.json"])
+
+    def test_failed_save_leaves_no_temp_file(self):
+        save_state({"av": "L"}, self.path)
+        with self.assertRaises(TypeError):
+            save_state({"av": object()}, self.path)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)),
+                         ["state.json"])
+        self.assertEqual(load_state(self.path)["av"], "L")
+
+    def test_missing_or_other_version(self):
+        self.assertIsNone(load_state(self.path))
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as f:
+            json.dump({"version": 0}, f)
+        self.assertIsNone(load_state(self.path))
+
+    def test_shadow_state(self):
+        shadow = DeviceShadow()
+        shadow.update(codec.colour((1, 2, 3), (4, 5, 6)))
+        shadow.update(codec.move(-10, 20))
+        restored = DeviceShadow()
+        restored.restore(json.loads(json.dumps(shadow.state())))
+        self.assertEqual(restored.eyes, shadow.eyes)
+        self.assertIsNone(restored.lids)
+        self.assertEqual(restored.head, (-10, 20))
+
+
+class TestWarmRestart(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.config = {"trajectory": False,
+                       "snapshot": {"path": os.path.join(self.dir.name,
+                                                         "state.json"),
+                                    "interval": 0.05, "restore": True}}
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def writer(self):
+        serial = FakeSerial()
+        return EnclosureWriter(serial, FakeBus(), self.config), serial
+
+    def send(self, writer, *commands):
+        for command in commands:
+            writer.write(command)
+            writer.commands.join()
+
+    def test_restart_sends_only_changes(self):
+        writer, _ = self.writer()
+        self.assertFalse(writer.restored)
+        self.send(writer, Eyelids(True), MoveHead(-10, 20),
+                  SetColor(255, 0, 0))
+        writer.stop()
+
+        writer, serial = self.writer()
+        self.assertTrue(writer.restored)
+        self.assertEqual(writer.current_pos, [-10, 20])
+        # the start up reset: lids and colour are already right
+        self.send(writer, Eyelids(True), Home(), SetColor(255, 0, 0),
+                  PRESETS["YELLOW"])
+        writer.stop()
+        self.assertEqual(serial.frames, [codec.HOME_FRAME,
+                                         codec.preset("YELLOW")])
+
+    def test_malformed_state_is_a_cold_start(self):
+        writer, _ = self.writer()
+        self.send(writer, Eyelids(True), MoveHead(-10, 20))
+        good = writer.snapshot()
+        writer.stop()
+        for bad in ({"pos": [1]}, {"eye_cols": "red"}, {"av": None},
+                    {"shadow": {"eyes": [[1, 2, 3], 5]}},
+                    {"shadow": {"head": [1, 2]}}):
+            save_state(dict(good, **bad), self.config["snapshot"]["path"])
+            writer, _ = self.writer()
+            writer.stop()
+            self.assertFalse(writer.restored, bad)
+            self.assertEqual(writer.current_pos, [0, 20])
+            self.assertIsNone(writer.shadow.head)
+
+    def test_restore_is_opt_in(self):
+        writer, _ = self.writer()
+        self.send(writer, MoveHead(-10, 20))
+        writer.stop()
+        del self.config["snapshot"]["restore"]
+        writer, serial = self.writer()
+        self.send(writer, Home())
+        writer.stop()
+        self.assertFalse(writer.restored)
+        self.assertEqual(serial.frames, [codec.HOME_FRAME])
+
+    def test_saved_after_writes(self):
+        writer, _ = self.writer()
+        self.send(writer, MoveHead(5, 20))
+        end = time.monotonic() + 2
+        state = None
+        while time.monotonic() < end:
+            state = load_state(self.config["snapshot"]["path"])
+            if state:
+                break
+            time.sleep(0.01)
+        writer.stop()
+        self.assertEqual(state["pos"], [5, 20])
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import time
+import unittest
+
+from serial import SerialException
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.arduino import EnclosureWriter
+from ovos_PHAL_tama.commands import Eyelids, MoveHead, SetColor
+from ovos_PHAL_tama.supervisor import SerialSupervisor
+
+from fakes import FakeBus, FakeSerial
+
+
+class FlakySerial(FakeSerial):
+    def __init__(self):
+        super().__init__()
+        self.broken = False
+        self.closed = False
+
+    def write(self, data):
+        if self.broken:
+            raise SerialException("device disconnected")
+        return super().write(data)
+
+    def readline(self):
+        if self.broken:
+            raise SerialException("device reports readiness to read but "
+                                  "returned no data")
+        time.sleep(0.01)
+        return b''
+
+    def read(self, size=1):
+        return self.readline()
+
+    @property
+    def in_waiting(self):
+        if self.broken:
+            raise OSError(5, "Input/output error")
+        return 0
+
+    def close(self):
+        self.closed = True
+
+
+class Opener:
+    """Opens a new ``FlakySerial`` every time, failing ``failures`` times
+    after the first."""
+
+    def __init__(self, failures=0):
+        self.ports = []
+        self.failures = failures
+
+    def __call__(self):
+        if self.ports and self.failures:
+            self.failures -= 1
+            raise SerialException("could not open port")
+        self.ports.append(FlakySerial())
+        return self.ports[-1]
+
+
+def wait_for(predicate, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < end:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestSerialSupervisor(unittest.TestCase):
+    def test_reconnects_with_backoff(self):
+        opener = Opener(failures=2)
+        link = SerialSupervisor(opener, backoff=0.01, max_backoff=0.02)
+        opener.ports[0].broken = True
+        with self.assertRaises(SerialException):
+            link.write(b'T\x01')
+        self.assertFalse(link.connected)
+        self.assertTrue(opener.ports[0].closed)
+        self.assertTrue(link.wait_connected(2))
+        self.assertEqual(link.generation, 1)
+        self.assertIs(link.serial, opener.ports[1])
+        stats = link.stats()
+        self.assertEqual(stats["outages"], 1)
+        self.assertEqual(stats["reconnect_attempts"], 3)
+        self.assertGreater(stats["last_outage"], 0)
+        link.close()
+
+    def test_read_error_is_one_outage(self):
+        opener = Opener()
+        link = SerialSupervisor(opener, backoff=0.05)
+        opener.ports[0].broken = True
+        self.assertEqual(link.readline(), b'')
+        self.assertEqual(link.readline(), b'')
+        self.assertTrue(link.wait_connected(2))
+        self.assertEqual(link.stats()["outages"], 1)
+        link.close()
+
+    def test_in_waiting_error(self):
+        opener = Opener()
+        link = SerialSupervisor(opener, backoff=0.05)
+        opener.ports[0].broken = True
+        self.assertEqual(link.in_waiting, 0)
+        self.assertEqual(link.read(), b'')
+        self.assertTrue(link.wait_connected(2))
+        self.assertEqual(link.stats()["outages"], 1)
+        link.close()
+
+    def test_disappearing_device(self):
+        with tempfile.NamedTemporaryFile(delete=False) as node:
+            path = node.name
+        link = SerialSupervisor(Opener(), path, backoff=10)
+        link.readline()
+        self.assertTrue(link.connected)
+        os.unlink(path)
+        link.readline()
+        self.assertFalse(link.connected)
+        link.close()
+
+
+class TestWriterReconnect(unittest.TestCase):
+    def test_replays_state_and_keeps_queued_commands(self):
+        opener = Opener(failures=1)
+        link = SerialSupervisor(opener, backoff=0.05)
+        writer = EnclosureWriter(link, FakeBus(), {"trajectory": False})
+        for command in (Eyelids(True), MoveHead(-10, 20),
+                        SetColor(255, 0, 0)):
+            writer.write(command)
+            writer.commands.join()
+        opener.ports[0].broken = True
+        writer.write(SetColor(0, 0, 255))
+        writer.commands.join()
+        self.assertTrue(wait_for(lambda: not link.connected))
+        # queued while the link is down
+        writer.write(MoveHead(10, 20))
+        self.assertTrue(wait_for(lambda: len(opener.ports) == 2 and
+                                 len(opener.ports[1].frames) == 4))
+        writer.stop()
+        link.close()
+        self.assertEqual(opener.ports[1].frames,
+                         [codec.colour((0, 0, 255)), codec.OPEN_FRAME,
+                          codec.move(-10, 20), codec.move(10, 20)])
+        self.assertEqual(link.stats()["outages"], 1)
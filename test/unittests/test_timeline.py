@@ -0,0 +1,61 @@
+import unittest
+
+from ovos_PHAL_tama.timeline import Timeline
+
+from fakes import FakeClock
+
+
+class TestTimeline(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.timeline = Timeline(self.clock)
+
+    def test_keyframes_due_in_order(self):
+        self.timeline.play('head', [(0, lambda: 'a'), (0.2, lambda: 'b'),
+                                    (0.2, lambda: 'c')])
+        self.assertEqual([a() for a in self.timeline.pop_due()], ['a'])
+        self.assertAlmostEqual(self.timeline.next_due(), 0.2)
+        self.clock.now = 0.45
+        self.assertEqual([a() for a in self.timeline.pop_due()], ['b', 'c'])
+        self.assertFalse(self.timeline.busy('head'))
+        self.assertIsNone(self.timeline.next_due())
+
+    def test_priority_preemption(self):
+        self.timeline.play('head', [(0.1, lambda: 'low')], priority=1)
+        self.assertFalse(self.timeline.play('head', [(0, lambda: 'x')]))
+        self.assertTrue(self.timeline.play('head', [(0, lambda: 'high')],
+                                           priority=2))
+        self.clock.now = 1
+        self.assertEqual([a() for a in self.timeline.pop_due()], ['high'])
+
+    def test_cancel(self):
+        self.timeline.play('head', [(0.1, lambda: 'a')], priority=1)
+        self.assertFalse(self.timeline.cancel('head', priority=0))
+        self.assertTrue(self.timeline.cancel('head'))
+        self.assertFalse(self.timeline.busy('head'))
+
+    def test_defer_keeps_latest(self):
+        self.assertFalse(self.timeline.defer('head', lambda: 'idle'))
+        self.timeline.play('head', [(0.1, lambda: 'g')])
+        self.timeline.defer('head', lambda: 'old')
+        self.timeline.defer('head', lambda: 'new')
+        self.assertEqual(self.timeline.pop_due(), [])
+        self.clock.now = 0.1
+        self.assertEqual([a() for a in self.timeline.pop_due()], ['g', 'new'])
+
+    def test_deferred_survives_preemption(self):
+        self.timeline.play('head', [(0.1, lambda: 'shake')])
+        self.timeline.defer('head', lambda: 'home')
+        self.clock.now = 0.05
+        self.timeline.play('head', [(0.1, lambda: 'avert')])
+        self.assertEqual(self.timeline.pop_due(), [])
+        self.clock.now = 0.2
+        self.assertEqual([a() for a in self.timeline.pop_due()],
+                         ['avert', 'home'])
+
+    def test_channels_independent(self):
+        self.timeline.play('head', [(0.3, lambda: 'head')])
+        self.timeline.play('eyes', [(0.1, lambda: 'eyes')])
+        self.clock.now = 0.1
+        self.assertEqual([a() for a in self.timeline.pop_due()], ['eyes'])
+        self.assertTrue(self.timeline.busy('head'))
@@ -0,0 +1,64 @@
+import unittest
+
+from ovos_PHAL_tama.trajectory import AxisLimits, TrajectoryPlanner, max_rate
+
+
+def run(planner, limit=1000):
+    setpoints = []
+    for _ in range(limit):
+        if not planner.active:
+            break
+        setpoint = planner.update()
+        if setpoint:
+            setpoints.append(setpoint)
+    return setpoints
+
+
+class TestTrajectoryPlanner(unittest.TestCase):
+    def test_reaches_target_monotonically(self):
+        planner = TrajectoryPlanner(rate=25)
+        planner.reset(0, 20)
+        planner.set_target(40, 0)
+        setpoints = run(planner)
+        self.assertEqual(setpoints[-1], (40, 0))
+        xs = [x for x, _ in setpoints]
+        self.assertEqual(xs, sorted(xs))
+        self.assertFalse(planner.active)
+
+    def test_velocity_limit(self):
+        planner = TrajectoryPlanner((AxisLimits(vmax=50, amax=1000),
+                                     AxisLimits(vmax=50, amax=1000)), rate=10)
+        planner.reset(0, 0)
+        planner.set_target(100, 0)
+        setpoints = run(planner)
+        steps = [b[0] - a[0] for a, b in zip(setpoints, setpoints[1:])]
+        self.assertLessEqual(max(steps), 5)
+        self.assertEqual(setpoints[-1], (100, 0))
+
+    def test_acceleration_limit(self):
+        planner = TrajectoryPlanner((AxisLimits(vmax=1000, amax=100),
+                                     AxisLimits()), rate=10)
+        planner.reset(0, 0)
+        planner.set_target(100, 0)
+        self.assertEqual(planner.update(), (1, 0))
+
+    def test_range_clamped(self):
+        planner = TrajectoryPlanner((AxisLimits(low=-10, high=10),
+                                     AxisLimits(low=0, high=30)))
+        planner.set_target(50, -5)
+        self.assertEqual(planner.target, (10.0, 0.0))
+
+    def test_replan_mid_motion(self):
+        planner = TrajectoryPlanner()
+        planner.reset(0, 0)
+        planner.set_target(100, 0)
+        for _ in range(5):
+            planner.update()
+        planner.set_target(-20, 10)
+        self.assertEqual(run(planner)[-1], (-20, 10))
+
+    def test_rate_capped_by_link(self):
+        self.assertAlmostEqual(max_rate(9600), 9600 / 2 / 70)
+        self.assertEqual(TrajectoryPlanner(rate=200, baudrate=9600).rate,
+                         max_rate(9600))
+        self.assertEqual(TrajectoryPlanner(rate=25, baudrate=115200).rate, 25)
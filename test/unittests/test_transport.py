@@ -0,0 +1,70 @@
+import os
+import select
+import time
+import unittest
+
+import serial
+
+from ovos_PHAL_tama.transport import AsyncSerialTransport
+
+
+@unittest.skipUnless(hasattr(os, "openpty"), "needs a pseudo-terminal")
+class TestAsyncSerialTransport(unittest.TestCase):
+    def setUp(self):
+        self.master, slave = os.openpty()
+        self.port = serial.Serial(os.ttyname(slave), 9600)
+        os.close(slave)
+        self.lines = []
+        self.transport = AsyncSerialTransport(self.port, self.lines.append)
+
+    def tearDown(self):
+        self.transport.stop()
+        self.transport.join(1)
+        self.port.close()
+        os.close(self.master)
+
+    def read_master(self, n):
+        data = b''
+        deadline = time.monotonic() + 2
+        while len(data) < n and time.monotonic() < deadline:
+            # a frame that never arrives fails the test instead of hanging
+            if select.select([self.master], [], [], 0.1)[0]:
+                data += os.read(self.master, n - len(data))
+        return data
+
+    def test_write_from_thread(self):
+        self.transport.write(b'M\x01\x00\x01\x00\x00\x00')
+        self.transport.write(b'T\x01')
+        self.assertEqual(self.read_master(9), b'M\x01\x00\x01\x00\x00\x00T\x01')
+
+    def test_send_coroutine(self):
+        import asyncio
+        future = asyncio.run_coroutine_threadsafe(
+            self.transport.send(b'EY\x01\x00'), self.transport.loop)
+        future.result(2)
+        self.assertEqual(self.read_master(4), b'EY\x01\x00')
+
+    def test_line_framing(self):
+        os.write(self.master, b'Command: system.version\r\nunit.')
+        os.write(self.master, b'reboot\n')
+        deadline = time.monotonic() + 2
+        while len(self.lines) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.lines, ['Command: system.version', 'unit.reboot'])
+
+    def test_backpressure_keeps_every_frame(self):
+        import asyncio
+        # far more than the pty buffers, so most frames wait in the
+        # transport until the other end reads
+        frames = [bytes([i % 256]) * 7 for i in range(10000)]
+
+        async def send_all():
+            await asyncio.gather(*(self.transport.send(frame)
+                                   for frame in frames))
+
+        future = asyncio.run_coroutine_threadsafe(send_all(),
+                                                  self.transport.loop)
+        time.sleep(0.1)
+        self.assertFalse(future.done())
+        self.assertEqual(self.read_master(70000), b''.join(frames))
+        future.result(2)
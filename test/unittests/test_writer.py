@@ -0,0 +1,187 @@
+import time
+import unittest
+
+from ovos_bus_client import Message
+
+from ovos_PHAL_tama import codec
+from ovos_PHAL_tama.arduino import ROUTES, EnclosureWriter
+from ovos_PHAL_tama.commandqueue import CommandQueue, DEFAULT_LEVELS
+from ovos_PHAL_tama.commands import Blink, Brightness, Command, Home, \
+    MoveHead, SetColor, Spin
+
+from fakes import FakeBus, FakeSerial
+
+
+class TestEnclosureWriter(unittest.TestCase):
+    def setUp(self):
+        self.serial = FakeSerial()
+        self.bus = FakeBus()
+        self.writer = EnclosureWriter(self.serial, self.bus,
+                                      {"trajectory": False})
+
+    def tearDown(self):
+        self.writer.stop()
+
+    def send(self, *commands):
+        for command in commands:
+            self.writer.write(command)
+        self.writer.commands.join()
+        return self.serial.frames
+
+    def test_one_frame_per_command(self):
+        frames = self.send("YELLOW", "OPEN", "MOVE:0:10:0:5:\n")
+        self.assertCountEqual(frames, [codec.preset('YELLOW'),
+                                       codec.lids(True), codec.move(10, 5)])
+        self.assertEqual(self.send("COL:1:2:3")[-1], codec.colour((1, 2, 3)))
+
+    def test_unknown_command_ignored(self):
+        self.assertEqual(self.send("eyes.wink", "COLOUR", "HOME"),
+                         [codec.HOME_FRAME])
+
+    def test_malformed_command_dropped(self):
+        self.assertEqual(self.send("COL:abc", "eyes.fill=", "MOVE:0:x:0:5",
+                                   "HOME"), [codec.HOME_FRAME])
+
+    def test_gesture_does_not_block_queue(self):
+        self.send("SHAKE", "COL:1:2:3")
+        frames = self.serial.frames
+        self.assertIn(codec.colour((1, 2, 3)), frames)
+        self.assertLess(len(frames), 8)
+        time.sleep(1)
+        # 5 head keyframes, PINK and GREEN around them, and the colour
+        self.assertEqual(len(self.serial.frames), 8)
+        self.assertEqual(self.writer.current_pos, [0, 20])
+
+    def test_home_waits_for_gesture(self):
+        self.send("NOD", "HOME")
+        self.assertNotIn(codec.HOME_FRAME, self.serial.frames)
+        time.sleep(1.1)
+        self.assertEqual(len(self.serial.frames), 5)
+        self.assertEqual(self.serial.frames[-1], codec.HOME_FRAME)
+
+    def test_look_target_keeps_pending_home(self):
+        queue = CommandQueue(DEFAULT_LEVELS)
+        for command in (Home(), MoveHead(4, 20), MoveHead(5, 20)):
+            level, channel, key = ROUTES[command.opcode]
+            queue.put(command, level, key, channel)
+        self.assertEqual([queue.get(timeout=0).command for _ in range(2)],
+                         [Home(), MoveHead(5, 20)])
+
+    def test_home_survives_preempting_gesture(self):
+        self.send("SHAKE", "HOME")
+        time.sleep(0.1)
+        self.send("AVR")
+        time.sleep(1.2)
+        self.assertEqual(self.serial.frames[-1], codec.HOME_FRAME)
+
+    def test_stop_cancels_gesture(self):
+        self.send("NOD", "STOP", "HOME")
+        time.sleep(0.4)
+        self.assertEqual(self.serial.frames[-1], codec.HOME_FRAME)
+        self.assertEqual(len(self.serial.frames), 2)
+
+    def test_stats_request(self):
+        self.send("HOME")
+        message = Message("enclosure.writer.stats.get")
+        self.bus.handlers["enclosure.writer.stats.get"](message)
+        reply = self.bus.emitted[-1]
+        self.assertEqual(reply.msg_type, "enclosure.writer.stats")
+        self.assertEqual(reply.data["safety"]["queued"], 1)
+
+    def test_recorder_dump(self):
+        self.send("OPEN", "NOD")
+        time.sleep(1.1)
+        self.bus.handlers["enclosure.recorder.dump"](
+            Message("enclosure.recorder.dump"))
+        entries = self.bus.emitted[-1].data["entries"]
+        self.assertEqual([e["opcode"] for e in entries],
+                         ["OPEN", "NOD", "NOD", "NOD", "NOD"])
+        self.assertEqual(entries[0]["frame"], "5401")
+
+    def test_typed_commands(self):
+        frames = self.send(MoveHead(-3, 4))
+        self.assertEqual(frames, [codec.move(-3, 4)])
+        self.assertEqual(self.send(SetColor(9, 8, 7))[-1],
+                         codec.colour((9, 8, 7)))
+
+    def test_trajectory(self):
+        writer = EnclosureWriter(self.serial, self.bus,
+                                 {"trajectory": {"rate": 50}})
+        writer.write(MoveHead(30, 20))
+        time.sleep(1)
+        frames = self.serial.frames
+        self.assertGreater(len(frames), 3)
+        self.assertEqual(frames[-1], codec.move(30, 20))
+        self.assertEqual(writer.current_pos, [30, 20])
+        writer.stop()
+
+    def test_redundant_frames_suppressed(self):
+        for command in ("YELLOW", MoveHead(5, 5), "OPEN", "YELLOW",
+                        MoveHead(5, 5), "OPEN", "COL:200:200:0"):
+            self.send(command)
+        self.assertEqual(self.serial.frames, [codec.preset('YELLOW'),
+                                              codec.move(5, 5),
+                                              codec.lids(True)])
+        self.assertEqual(self.writer.shadow.suppressed,
+                         {'eyes': 2, 'lids': 1, 'head': 1})
+
+    def test_pose_request(self):
+        self.send(MoveHead(-7, 12))
+        message = Message("enclosure.head.pose.get")
+        self.bus.handlers["enclosure.head.pose.get"](message)
+        reply = self.bus.emitted[-1]
+        self.assertEqual(reply.msg_type, "enclosure.head.pose")
+        self.assertEqual(reply.data, {"x": -7, "y": 12, "moving": False})
+
+    def test_spin_cancelled_by_colour(self):
+        self.send(SetColor(200, 0, 0), Spin())
+        time.sleep(0.3)
+        self.send(SetColor(0, 0, 200))
+        frames = len(self.serial.frames)
+        time.sleep(0.2)
+        self.assertEqual(len(self.serial.frames), frames)
+        self.assertEqual(self.serial.frames[-1], codec.colour((0, 0, 200)))
+
+    def test_timed_spin_restores_colour(self):
+        self.send(SetColor(200, 0, 0), Spin(300))
+        time.sleep(0.6)
+        self.assertGreater(len(self.serial.frames), 3)
+        self.assertEqual(self.serial.frames[-1], codec.colour((200, 0, 0)))
+
+    def test_blink_with_lids(self):
+        self.send("OPEN", Blink('b'))
+        time.sleep(0.5)
+        self.assertEqual(self.serial.frames, [codec.OPEN_FRAME,
+                                              codec.CLOSE_FRAME,
+                                              codec.OPEN_FRAME])
+
+    def test_brightness_fade(self):
+        self.send(SetColor(200, 100, 0), Brightness(15))
+        time.sleep(0.4)
+        self.assertEqual(self.serial.frames[-1], codec.colour((100, 50, 0)))
+        self.assertEqual(self.writer.eye_alphas, [0.5, 0.5])
+
+    def test_burst_batched(self):
+        self.writer.commands.put(SetColor(1, 1, 1), 'eyes')
+        self.writer.commands.put(SetColor(2, 2, 2), 'eyes')
+        self.send("OPEN", "YELLOW", MoveHead(3, 3), "CLOSE")
+        self.assertEqual(len(self.serial.frames), 6)
+        self.assertLess(len(self.serial.writes), 6)
+        self.assertEqual(self.serial.flushes, len(self.serial.writes))
+        message = Message("enclosure.writer.stats.get")
+        self.bus.handlers["enclosure.writer.stats.get"](message)
+        batch = self.bus.emitted[-1].data["batch"]
+        self.assertEqual(batch["frames"], 6)
+        self.assertGreater(batch["max_size"], 1)
+        self.assertLess(batch["added_latency_max_ms"], 100)
+
+    def test_register_handler(self):
+        class Ping(Command):
+            __slots__ = ('payload',)
+            opcode = 'PING'
+
+            def __init__(self, payload):
+                self.payload = payload
+
+        self.writer.register_handler(Ping, lambda cmd: b'P' + cmd.payload)
+        self.assertEqual(self.send(Ping(b'x')), [b'Px'])